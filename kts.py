@@ -2,26 +2,34 @@ import sys
 from datetime import datetime, timedelta
 import json
 import os
+import importlib.util
 import platform
 import subprocess
 import hashlib  # For password hashing
 import random  # For OTP generation
 import time    # For simulating OTP delay
+from functools import lru_cache
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
     QFrame, QMessageBox, QSizePolicy, QPushButton, QScrollArea, QGridLayout,
     QLineEdit, QGroupBox, QInputDialog, QTableWidget, QTableWidgetItem,
     QDialog, QHeaderView, QComboBox, QAbstractItemView, QFileDialog, QMenu,
-    QDateEdit, QFormLayout, QStackedWidget
+    QDateEdit, QFormLayout, QStackedWidget, QListWidget, QListWidgetItem, QCompleter,
+    QStyledItemDelegate
 )
 from PyQt6.QtGui import QFont, QPixmap, QImageReader, QAction
-from PyQt6.QtCore import Qt, QDate, QTimer
+from PyQt6.QtCore import Qt, QDate, QTimer, QObject, QEvent, QStringListModel, pyqtSignal
 
 # ======== DB SECTION =========
 import sqlite3
 import os
+import re
+import calendar
 import hashlib
+import heapq
+import secrets
+from bisect import bisect_left
 from typing import List, Dict, Any, Self
 
 def _safefloat(v):
@@ -30,31 +38,442 @@ def _safefloat(v):
     except Exception:
         return 0.0
 
+def _detail_field_sql(field: str, column: str = "detail_json") -> str:
+    """SQL expression pulling one field out of a trip's detail JSON (NULL if the JSON is bad)."""
+    return f"CASE WHEN json_valid({column}) THEN json_extract({column}, '$.\"{field}\"') END"
+
+def _amount_sql(expr: str) -> str:
+    """SQL reading `expr` as a number the way _safefloat does ('1,500' -> 1500, '' or NULL -> 0)."""
+    return f"CAST(REPLACE(TRIM(IFNULL({expr}, '')), ',', '') AS REAL)"
+
+def _detail_amount_sql(field: str, column: str = "detail_json") -> str:
+    """Like _detail_field_sql but read as a number."""
+    return _amount_sql(_detail_field_sql(field, column))
+
+# Source tables of the full-text search index, keyed to the kind number
+# stored in the low bits of each index rowid (source id * 4 + kind).
+SEARCH_KINDS = {"trips": 1, "vehicle_expenses": 2, "vehicle_driver_details": 3}
+
+def _search_columns_sql(table: str, row: str) -> tuple:
+    """SQL for the (vehicle, party, details) text indexed for one row of `table`."""
+    def joined(*parts):
+        return " || ' ' || ".join(f"IFNULL({row}.{p}, '')" if p.isidentifier() else p for p in parts)
+    if table == "trips":
+        detail = f"CASE WHEN json_valid({row}.detail_json) THEN {row}.detail_json ELSE '{{}}' END"
+        detail_values = (f"IFNULL((SELECT group_concat(j.value, ' ') FROM json_each({detail}) AS j "
+                         f"WHERE j.type NOT IN ('object', 'array')), '')")
+        driver = f"IFNULL({_detail_field_sql('Driver Name', f'{row}.detail_json')}, '')"
+        return (f"{row}.vehicle_no",
+                joined("broker_office", driver),
+                joined("location_from_to", "status", "date", detail_values))
+    if table == "vehicle_expenses":
+        return (f"{row}.vehicle_no", "''",
+                joined("tyre_type", "tax_type", "spare_type", "remarks", "date"))
+    return (f"{row}.vehicle_no", f"{row}.driver_name",
+            joined("driver_contact", "driver_alt_contact", "driver_bank_account"))
+
+def _vehicle_id_sql(value: str) -> str:
+    """SQL for the vehicle_driver_details id of vehicle number `value` (NULL if not registered)."""
+    return f"(SELECT MIN(id) FROM vehicle_driver_details WHERE vehicle_no = trim({value}) COLLATE NOCASE)"
+
+# Free-text columns interned in value_dictionary: table -> (kind, column)
+VALUE_SOURCES = {
+    "trips": (("vehicle", "vehicle_no"), ("broker", "broker_office"), ("location", "location_from_to")),
+    "vehicle_expenses": (("vehicle", "vehicle_no"),),
+    "vehicle_driver_details": (("vehicle", "vehicle_no"),),
+}
+
+# Trip filter boxes -> the SQL value each one matches by prefix, ignoring
+# case and surrounding spaces. idx_trips_<name>_prefix indexes
+# (lower(value), value), so a filter is an index range scan and suggestions
+# never touch the table (see _migration_filter_indexes).
+TRIP_FILTER_SQL = {
+    "vehicle": "trim(vehicle_no)",
+    "broker": "trim(broker_office)",
+    "driver": f"trim({_detail_field_sql('Driver Name')})",
+}
+
+# Sortable grid columns -> (record attribute, SQL value it is sorted by).
+# Each SQL value equals the attribute as the record classes store it (NULL
+# read as ''/0, blank status as 'Unpaid'), so the last record of a page gives
+# the key the next page seeks past. Rows tie-break by date, then id, and
+# _migration_sort_indexes gives every value an index in that order.
+TRIP_SORT_COLUMNS = {
+    "date": ("date", "date"),
+    "vehicle": ("vehicle_no", "IFNULL(vehicle_no, '') COLLATE NOCASE"),
+    "broker": ("broker_office", "IFNULL(broker_office, '') COLLATE NOCASE"),
+    "amount": ("total", "IFNULL(total, 0)"),
+    "status": ("status", "IFNULL(NULLIF(status, ''), 'Unpaid') COLLATE NOCASE"),
+}
+VEHICLE_EXPENSE_SORT_COLUMNS = {
+    "date": ("date", "date"),
+    "vehicle": ("vehicle_no", "IFNULL(vehicle_no, '') COLLATE NOCASE"),
+    "amount": ("total", "IFNULL(total, 0)"),
+}
+
+def _sort_key(record, columns: Dict[str, tuple], sort: str) -> tuple:
+    """Seek key of `record` for sorting by `sort` (see TRIP_SORT_COLUMNS)."""
+    key = (record.date, record.id)
+    if sort != "date":
+        key = (getattr(record, columns[sort][0]),) + key
+    return key
+
+def _trip_unpaid_sql(row: str = "trips") -> str:
+    """SQL twin of TripRecord.unpaid for the trip row named `row` (a table, NEW or OLD)."""
+    collected = " - ".join(
+        _detail_amount_sql(f, f"{row}.detail_json")
+        for f in ("Trip Advance", "Broker Amount", "Return Balance")
+    )
+    return (f"CASE WHEN lower(IFNULL({row}.status, '')) = 'paid' THEN 0 "
+            f"ELSE MAX(0, IFNULL({row}.total, 0) - {collected}) END")
+
+# Month names for office period keys: 'january'/'jan' -> 1 ... (full names first)
+_MONTH_NUMBERS = {
+    **{name.lower(): i for i, name in enumerate(calendar.month_name) if name},
+    **{name.lower(): i for i, name in enumerate(calendar.month_abbr) if name},
+    "sept": 9,
+}
+
+def _iso_date(value) -> str:
+    """Canonical yyyy-mm-dd text for a stored date; accepts dd-mm-yyyy too. Unrecognised text is returned as is."""
+    text = str(value or "").strip()
+    m = re.fullmatch(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})", text)
+    if m:
+        day, month, year = (int(g) for g in m.groups())
+        try:
+            return datetime(year, month, day).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return text
+
+def _office_period(month_text) -> str | None:
+    """'yyyy-mm' key for an office month label like 'Month 3 - 2025', 'March 2025' or '03-2025'."""
+    text = str(month_text or "").lower()
+    year = re.search(r"(?<!\d)(\d{4})(?!\d)", text)
+    if not year:
+        return None
+    rest = text[:year.start()] + " " + text[year.end():]
+    month = next((num for name, num in _MONTH_NUMBERS.items()
+                  if re.search(rf"\b{name}\b", rest)), None)
+    if month is None:
+        digits = re.search(r"(?<!\d)(\d{1,2})(?!\d)", rest)
+        month = int(digits.group(1)) if digits else None
+    if not month or not 1 <= month <= 12:
+        return None
+    return f"{year.group(1)}-{month:02d}"
+
+def _trip_outstanding(total, status, detail_json) -> float:
+    """Balance still to collect on a trip, as stored in trips.outstanding (see TripRecord.unpaid)."""
+    if str(status or "").lower() == "paid":
+        return 0.0
+    try:
+        detail = json.loads(detail_json) if detail_json else {}
+    except (TypeError, ValueError):
+        detail = {}
+    if not isinstance(detail, dict):
+        detail = {}
+    collected = sum(_safefloat(detail.get(f, 0)) for f in ("Trip Advance", "Broker Amount", "Return Balance"))
+    return max(0.0, _safefloat(total) - collected)
+
+def _amount_text(v) -> str:
+    """Editable text for a stored amount: '1500' rather than '1500.0'."""
+    v = _safefloat(v)
+    return str(int(v)) if v.is_integer() else str(v)
+
+
+# ---------------- In-memory record types ----------------
+# Compact __slots__ records shared by the DB loaders, the pages and the
+# exporters. Amounts are parsed to float once, when the record is built.
+
+class TripRecord:
+    __slots__ = (
+        'id', 'date', 'vehicle_no', 'location_from_to', 'broker_office',
+        'driver_amount', 'profit', 'expense', 'total', 'status',
+        'driver_name', 'trip_advance', 'return_balance', 'broker_amount', 'outstanding', 'detail',
+    )
+
+    def __init__(self, id, date="", vehicle_no="", location_from_to="", broker_office="",
+                 driver_amount=0.0, profit=0.0, expense=0.0, total=0.0, status="Unpaid",
+                 driver_name="", trip_advance=0.0, return_balance=0.0, broker_amount=0.0,
+                 outstanding=None, detail=None):
+        self.id = id
+        self.date = date or ""
+        self.vehicle_no = vehicle_no or ""
+        self.location_from_to = location_from_to or ""
+        self.broker_office = broker_office or ""
+        self.driver_amount = _safefloat(driver_amount)
+        self.profit = _safefloat(profit)
+        self.expense = _safefloat(expense)
+        self.total = _safefloat(total)
+        self.status = status or "Unpaid"
+        self.driver_name = driver_name or ""
+        self.trip_advance = _safefloat(trip_advance)
+        self.return_balance = _safefloat(return_balance)
+        self.broker_amount = _safefloat(broker_amount)
+        # Stored trips.outstanding; None for trips that have not been through the DB
+        self.outstanding = None if outstanding is None else _safefloat(outstanding)
+        self.detail = detail  # full detail_json dict, None until loaded
+
+    @classmethod
+    def from_list_row(cls, row: tuple) -> Self:
+        """Build from a DBManager.TRIP_LIST_SQL row."""
+        return cls(*row)
+
+    @property
+    def is_paid(self) -> bool:
+        return self.status.lower() == "paid"
+
+    @property
+    def unpaid(self) -> float:
+        """Amount still to be collected for this trip (0 once paid)."""
+        if self.outstanding is not None:
+            return self.outstanding
+        if self.is_paid:
+            return 0.0
+        return max(0.0, self.total - self.trip_advance - self.broker_amount - self.return_balance)
+
+
+class VehicleExpenseRecord:
+    __slots__ = (
+        'id', 'date', 'vehicle_no', 'fc_expense', 'tyre_amount', 'tyre_type', 'tax', 'tax_type',
+        'spare_work', 'spare_type', 'loan', 'insurance', 'others', 'remarks',
+    )
+    AMOUNT_FIELDS = ('fc_expense', 'tyre_amount', 'tax', 'spare_work', 'loan', 'insurance', 'others')
+
+    def __init__(self, id, date="", vehicle_no="", fc_expense=0.0, tyre_amount=0.0, tyre_type="",
+                 tax=0.0, tax_type="", spare_work=0.0, spare_type="", loan=0.0, insurance=0.0,
+                 others=0.0, remarks=""):
+        self.id = id
+        self.date = date or ""
+        self.vehicle_no = vehicle_no or ""
+        self.fc_expense = _safefloat(fc_expense)
+        self.tyre_amount = _safefloat(tyre_amount)
+        self.tyre_type = tyre_type or ""
+        self.tax = _safefloat(tax)
+        self.tax_type = tax_type or ""
+        self.spare_work = _safefloat(spare_work)
+        self.spare_type = spare_type or ""
+        self.loan = _safefloat(loan)
+        self.insurance = _safefloat(insurance)
+        self.others = _safefloat(others)
+        self.remarks = remarks or ""
+
+    @classmethod
+    def from_form_values(cls, values: List[Any], id=None) -> Self:
+        """Build from ExpenseDialog.data() (13 values, same order as the table)."""
+        return cls(id, *values[:13])
+
+    @property
+    def total(self) -> float:
+        return (self.fc_expense + self.tyre_amount + self.tax + self.spare_work
+                + self.loan + self.insurance + self.others)
+
+    def form_values(self) -> List[str]:
+        """The 13 editable values as text, in ExpenseDialog / table column order."""
+        return [
+            self.date, self.vehicle_no, _amount_text(self.fc_expense),
+            _amount_text(self.tyre_amount), self.tyre_type, _amount_text(self.tax),
+            self.tax_type, _amount_text(self.spare_work), self.spare_type,
+            _amount_text(self.loan), _amount_text(self.insurance),
+            _amount_text(self.others), self.remarks,
+        ]
+
+
+class OfficeMonthRecord:
+    __slots__ = ('id', 'month', 'current_bill', 'manager_salary', 'office_rent', 'others', 'period')
+
+    def __init__(self, id, month="", current_bill=0.0, manager_salary=0.0, office_rent=0.0, others=0.0,
+                 period=None):
+        self.id = id
+        self.month = month or ""
+        # 'yyyy-mm'; the month it was saved in when the label has no recognisable
+        # month (None only on rows migrated from before period existed)
+        self.period = period
+        self.current_bill = _safefloat(current_bill)
+        self.manager_salary = _safefloat(manager_salary)
+        self.office_rent = _safefloat(office_rent)
+        self.others = _safefloat(others)
+
+    @property
+    def total(self) -> float:
+        return self.current_bill + self.manager_salary + self.office_rent + self.others
+
+
+class VehicleMonthRecord:
+    """One vehicle's rolled-up trip and expense figures for one month (yyyy-mm)."""
+    __slots__ = ('vehicle_no', 'month', 'trips', 'revenue', 'trip_expense', 'maintenance', 'loan', 'net')
+
+    def __init__(self, vehicle_no, month, trips=0, revenue=0.0, trip_expense=0.0,
+                 maintenance=0.0, loan=0.0, net=0.0):
+        self.vehicle_no = vehicle_no or ""
+        self.month = month or ""
+        self.trips = int(trips or 0)
+        self.revenue = _safefloat(revenue)
+        self.trip_expense = _safefloat(trip_expense)
+        self.maintenance = _safefloat(maintenance)
+        self.loan = _safefloat(loan)
+        self.net = _safefloat(net)
+
+
+class ReceivableAgingRecord:
+    """Outstanding trip balance of one broker office, split by age in days."""
+    __slots__ = ('broker_office', 'trips', 'days_0_30', 'days_31_60', 'days_61_90', 'days_over_90', 'total')
+
+    def __init__(self, broker_office, trips=0, days_0_30=0.0, days_31_60=0.0, days_61_90=0.0,
+                 days_over_90=0.0, total=0.0):
+        self.broker_office = broker_office or ""
+        self.trips = int(trips or 0)
+        self.days_0_30 = _safefloat(days_0_30)
+        self.days_31_60 = _safefloat(days_31_60)
+        self.days_61_90 = _safefloat(days_61_90)
+        self.days_over_90 = _safefloat(days_over_90)
+        self.total = _safefloat(total)
+
+    @property
+    def buckets(self) -> tuple:
+        return (self.days_0_30, self.days_31_60, self.days_61_90, self.days_over_90)
+
+
+class SearchHit:
+    """One full-text search match: source table, its row id and a highlighted excerpt."""
+    __slots__ = ('table', 'row_id', 'vehicle_no', 'snippet', 'rank')
+
+    def __init__(self, table, row_id, vehicle_no, snippet, rank=0.0):
+        self.table = table
+        self.row_id = int(row_id)
+        self.vehicle_no = vehicle_no or ""
+        self.snippet = snippet or ""
+        self.rank = _safefloat(rank)
+
+
+class ChangeEvent:
+    """One committed row change. op is 'insert', 'update' or 'delete'; 'reload'
+    (row_id None) means the whole table should be read again."""
+    __slots__ = ('table', 'row_id', 'op')
+
+    def __init__(self, table, row_id, op):
+        self.table = table
+        self.row_id = row_id
+        self.op = op
+
+
+class ChangeBus:
+    """Publish/subscribe for ChangeEvents. Subscribers run synchronously on the
+    publishing thread, right after the change is committed."""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call `callback(event)` for every change; returns a function that unsubscribes."""
+        self._subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, table: str, row_id, op: str):
+        event = ChangeEvent(table, row_id, op)
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                # A broken view must not turn a committed save into an error
+                print(f"Change subscriber failed on {table} {op}: {e}", file=sys.stderr)
+
+
+class ValueDictionary:
+    """In-memory copy of the value_dictionary table for autocomplete. Each kind
+    is kept as parallel lists sorted by case-folded value, so a prefix lookup
+    is two bisects. The copy is read lazily and again after any change to a
+    source table (see VALUE_SOURCES)."""
+
+    def __init__(self, db):
+        self.db = db
+        self._kinds = {}
+        self._stale = True
+        db.changes.subscribe(self._on_change)
+
+    def _on_change(self, event):
+        if event.table in VALUE_SOURCES:
+            self._stale = True
+
+    def _load(self):
+        entries = {}
+        for kind, value, uses in self.db.load_value_dictionary():
+            entries.setdefault(kind, []).append((value.lower(), value, uses))
+        self._kinds = {}
+        for kind, rows in entries.items():
+            rows.sort()
+            self._kinds[kind] = ([r[0] for r in rows], rows)
+        self._stale = False
+
+    def complete(self, kind: str, prefix: str = "", limit: int = 15) -> List[str]:
+        """Values of `kind` starting with `prefix` (ignoring case), most used first."""
+        if self._stale:
+            self._load()
+        keys, rows = self._kinds.get(kind, ((), ()))
+        prefix = prefix.strip().lower()
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+        best = heapq.nsmallest(limit, rows[lo:hi], key=lambda r: (-r[2], r[0]))
+        return [r[1] for r in best]
+
+
 class DBManager:
+    # Enough room for every distinct statement the pages issue, so each one is
+    # prepared once per connection and reused afterwards.
+    STATEMENT_CACHE_SIZE = 256
+    # Connection tuning: page cache in KiB, memory-mapped reads, temp b-trees in RAM
+    CACHE_SIZE_KIB = 32 * 1024
+    MMAP_SIZE = 256 * 1024 * 1024
+    # run_maintenance(): rows sampled per index by ANALYZE, and the free page
+    # count worth an incremental vacuum
+    ANALYSIS_LIMIT = 1000
+    VACUUM_MIN_FREE_PAGES = 256
+
     def __init__(self, dbpath=None):
         if dbpath is None:
-            # Detect if running as PyInstaller executable
-            if getattr(sys, 'frozen', False):
-                base_dir = os.path.dirname(sys.executable)
-            else:
-                base_dir = os.path.dirname(__file__)
-
-            dbpath = os.path.join(base_dir, "ktsdatabase.db")
+            dbpath = self.default_path()
 
         self.dbpath = dbpath
+        # Row-level change events for open views, published after each commit
+        self.changes = ChangeBus()
+        # Autocomplete values, re-read after changes
+        self.values = ValueDictionary(self)
         new_db = not os.path.exists(dbpath)
-        self.conn = sqlite3.connect(self.dbpath, check_same_thread=False)
+        self.conn = sqlite3.connect(
+            self.dbpath, check_same_thread=False,
+            cached_statements=self.STATEMENT_CACHE_SIZE
+        )
 
         self.conn.row_factory = sqlite3.Row
+        if new_db:
+            # Must be chosen before the first table exists
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
         self._configure()
         if new_db:
             self.create_tables()
+        self._migrate()
+
+    @staticmethod
+    def default_path() -> str:
+        """ktsdatabase.db next to the program (or the PyInstaller executable)."""
+        if getattr(sys, 'frozen', False):
+            base_dir = os.path.dirname(sys.executable)
+        else:
+            base_dir = os.path.dirname(__file__)
+        return os.path.join(base_dir, "ktsdatabase.db")
 
     def _configure(self):
         c = self.conn.cursor()
         c.execute("PRAGMA foreign_keys = ON;")
         c.execute("PRAGMA journal_mode = WAL;")
         c.execute("PRAGMA synchronous = NORMAL;")
+        c.execute(f"PRAGMA cache_size = -{self.CACHE_SIZE_KIB};")
+        c.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE};")
+        c.execute("PRAGMA temp_store = MEMORY;")
         self.conn.commit()
 
     def create_tables(self):
@@ -145,7 +564,491 @@ class DBManager:
         # UPDATED: Add a default user if none exist
         self._add_default_user_if_needed()
 
-    
+    # ---------------- SCHEMA MIGRATIONS ----------------
+    # create_tables() only runs for a brand new file, so anything added to the
+    # schema later goes through a migration step instead. Steps run in order
+    # and PRAGMA user_version records how many have been applied. Each step is
+    # a plain function taking a cursor, listed in MIGRATIONS below.
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in range(version, len(self.MIGRATIONS)):
+            c = self.conn.cursor()
+            c.execute("BEGIN")
+            try:
+                self.MIGRATIONS[step](c)
+                c.execute(f"PRAGMA user_version = {step + 1}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _migration_vehicle_rollup(c):
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vehicle_month_rollup (
+                vehicle_no   TEXT NOT NULL,
+                month        TEXT NOT NULL,
+                trips        INTEGER NOT NULL DEFAULT 0,
+                revenue      REAL NOT NULL DEFAULT 0,
+                trip_expense REAL NOT NULL DEFAULT 0,
+                maintenance  REAL NOT NULL DEFAULT 0,
+                loan         REAL NOT NULL DEFAULT 0,
+                net          REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, vehicle_no)
+            )
+        ''')
+        # Cached tables are rebuilt lazily; writes to their source tables flag them stale.
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS cache_state (
+                name  TEXT PRIMARY KEY,
+                stale INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        c.execute("INSERT OR IGNORE INTO cache_state (name, stale) VALUES ('vehicle_month_rollup', 1)")
+        for table in ("trips", "vehicle_expenses"):
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                c.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_stale_rollup
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE cache_state SET stale = 1 WHERE name = 'vehicle_month_rollup';
+                    END
+                ''')
+
+    def _migration_summary_tables(c):
+        # Pre-aggregated totals kept current by triggers, so a summary over any
+        # period only has to add up a handful of month rows.
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS trip_month_summary (
+                month         TEXT NOT NULL,
+                vehicle_no    TEXT NOT NULL,
+                trips         INTEGER NOT NULL DEFAULT 0,
+                load_total    REAL NOT NULL DEFAULT 0,
+                driver_amount REAL NOT NULL DEFAULT 0,
+                expense       REAL NOT NULL DEFAULT 0,
+                profit        REAL NOT NULL DEFAULT 0,
+                unpaid        REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, vehicle_no)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vehicle_expense_month_summary (
+                month       TEXT NOT NULL,
+                vehicle_no  TEXT NOT NULL,
+                entries     INTEGER NOT NULL DEFAULT 0,
+                fc_expense  REAL NOT NULL DEFAULT 0,
+                tyre_amount REAL NOT NULL DEFAULT 0,
+                tax         REAL NOT NULL DEFAULT 0,
+                spare_work  REAL NOT NULL DEFAULT 0,
+                loan        REAL NOT NULL DEFAULT 0,
+                insurance   REAL NOT NULL DEFAULT 0,
+                others      REAL NOT NULL DEFAULT 0,
+                total       REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, vehicle_no)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS office_expense_summary (
+                id             INTEGER PRIMARY KEY CHECK (id = 1),
+                months         INTEGER NOT NULL DEFAULT 0,
+                current_bill   REAL NOT NULL DEFAULT 0,
+                manager_salary REAL NOT NULL DEFAULT 0,
+                office_rent    REAL NOT NULL DEFAULT 0,
+                others         REAL NOT NULL DEFAULT 0,
+                total          REAL NOT NULL DEFAULT 0
+            )
+        ''')
+
+        summaries = {
+            "trips": ("trip_month_summary", "trips", {
+                "load_total": "IFNULL({r}.total, 0)",
+                "driver_amount": "IFNULL({r}.driver_amount, 0)",
+                "expense": "IFNULL({r}.expense, 0)",
+                "profit": "IFNULL({r}.profit, 0)",
+                "unpaid": None,  # filled from _trip_unpaid_sql below
+            }),
+            "vehicle_expenses": ("vehicle_expense_month_summary", "entries", {
+                col: f"IFNULL({{r}}.{col}, 0)"
+                for col in ("fc_expense", "tyre_amount", "tax", "spare_work", "loan",
+                            "insurance", "others", "total")
+            }),
+        }
+
+        def month_delta(table, row, sign):
+            summary, counter, amounts = summaries[table]
+            values = [
+                (_trip_unpaid_sql(row) if expr is None else expr.format(r=row))
+                for expr in amounts.values()
+            ]
+            cols = ", ".join(amounts)
+            return f'''
+                INSERT INTO {summary} (month, vehicle_no, {counter}, {cols})
+                VALUES (IFNULL(substr({row}.date, 1, 7), ''), TRIM(IFNULL({row}.vehicle_no, '')), {sign},
+                        {", ".join(f"{sign} * ({v})" for v in values)})
+                ON CONFLICT (month, vehicle_no) DO UPDATE SET
+                    {counter} = {counter} + excluded.{counter},
+                    {", ".join(f"{col} = {col} + excluded.{col}" for col in amounts)};
+            '''
+
+        def month_cleanup(table):
+            summary, counter, _ = summaries[table]
+            return f"DELETE FROM {summary} WHERE {counter} <= 0;"
+
+        office_cols = ("current_bill", "manager_salary", "office_rent", "others", "total")
+
+        def office_delta(row, sign):
+            return f'''
+                UPDATE office_expense_summary SET
+                    months = months + {sign},
+                    {", ".join(f"{col} = {col} + {sign} * IFNULL({row}.{col}, 0)" for col in office_cols)}
+                WHERE id = 1;
+            '''
+
+        bodies = {}
+        for table in summaries:
+            bodies[(table, "INSERT")] = month_delta(table, "NEW", 1)
+            bodies[(table, "DELETE")] = month_delta(table, "OLD", -1) + month_cleanup(table)
+            bodies[(table, "UPDATE")] = (month_delta(table, "OLD", -1) + month_delta(table, "NEW", 1)
+                                         + month_cleanup(table))
+        bodies[("office_expenses", "INSERT")] = office_delta("NEW", 1)
+        bodies[("office_expenses", "DELETE")] = office_delta("OLD", -1)
+        bodies[("office_expenses", "UPDATE")] = office_delta("OLD", -1) + office_delta("NEW", 1)
+
+        for (table, event), body in bodies.items():
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_summary
+                AFTER {event} ON {table}
+                BEGIN
+                    {body}
+                END
+            ''')
+
+        # Backfill from the rows already in the database
+        for table, (summary, counter, amounts) in summaries.items():
+            values = [
+                (_trip_unpaid_sql(table) if expr is None else expr.format(r=table))
+                for expr in amounts.values()
+            ]
+            c.execute(f'''
+                INSERT OR REPLACE INTO {summary} (month, vehicle_no, {counter}, {", ".join(amounts)})
+                SELECT IFNULL(substr(date, 1, 7), ''), TRIM(IFNULL(vehicle_no, '')), COUNT(*),
+                       {", ".join(f"TOTAL({v})" for v in values)}
+                FROM {table}
+                GROUP BY 1, 2
+            ''')
+        c.execute(f'''
+            INSERT OR REPLACE INTO office_expense_summary (id, months, {", ".join(office_cols)})
+            SELECT 1, COUNT(*), {", ".join(f"TOTAL({col})" for col in office_cols)}
+            FROM office_expenses
+        ''')
+
+    def _migration_iso_dates(c):
+        # Dates are stored as yyyy-mm-dd text everywhere so they sort and range
+        # scan correctly; office months get a yyyy-mm period key.
+        for table in ("trips", "vehicle_expenses"):
+            rows = c.execute(f"SELECT id, date FROM {table}").fetchall()
+            c.executemany(
+                f"UPDATE {table} SET date = ? WHERE id = ?",
+                [(_iso_date(date), id_) for id_, date in rows if _iso_date(date) != date],
+            )
+        updates = []
+        for id_, detail_json in c.execute("SELECT id, detail_json FROM trips WHERE detail_json IS NOT NULL"):
+            try:
+                detail = json.loads(detail_json)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(detail, dict):
+                continue
+            changed = False
+            for field in ("Start Date", "End Date"):
+                if detail.get(field) and _iso_date(detail[field]) != detail[field]:
+                    detail[field] = _iso_date(detail[field])
+                    changed = True
+            if changed:
+                updates.append((json.dumps(detail), id_))
+        c.executemany("UPDATE trips SET detail_json = ? WHERE id = ?", updates)
+
+        c.execute("ALTER TABLE office_expenses ADD COLUMN period TEXT")
+        rows = c.execute("SELECT id, month FROM office_expenses").fetchall()
+        c.executemany("UPDATE office_expenses SET period = ? WHERE id = ?",
+                      [(_office_period(month), id_) for id_, month in rows])
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_trips_date ON trips (date, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_trips_vehicle_date ON trips (vehicle_no, date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_vehicle_expenses_date ON vehicle_expenses (date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_vehicle_expenses_vehicle_date ON vehicle_expenses (vehicle_no, date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_office_expenses_period ON office_expenses (period)")
+
+    def _migration_outstanding(c):
+        # Receivables: the balance still to collect is stored per trip (kept
+        # current by save_trip/update_trip) so aging and statements are queries.
+        c.execute("ALTER TABLE trips ADD COLUMN outstanding REAL NOT NULL DEFAULT 0")
+        rows = c.execute("SELECT id, total, status, detail_json FROM trips").fetchall()
+        c.executemany("UPDATE trips SET outstanding = ? WHERE id = ?",
+                      [(_trip_outstanding(total, status, detail), id_)
+                       for id_, total, status, detail in rows])
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_trips_broker_outstanding
+            ON trips (broker_office, date) WHERE outstanding > 0
+        ''')
+
+    def _migration_broker_date_index(c):
+        # Broker statements read every trip in (broker_office, date) order
+        c.execute("CREATE INDEX IF NOT EXISTS idx_trips_broker_date ON trips (broker_office, date)")
+
+    def _migration_search_index(c):
+        # Full-text index over trips (detail JSON values included), vehicle
+        # expenses and vehicle/driver details. rowid = source id * 4 + kind
+        # (see SEARCH_KINDS), so the triggers replace an entry by rowid.
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                vehicle, party, details,
+                tokenize = "unicode61 remove_diacritics 2", prefix = "2 3"
+            )
+        ''')
+        for table, kind in SEARCH_KINDS.items():
+            columns = ", ".join(_search_columns_sql(table, "NEW"))
+            add = (f"INSERT INTO search_index (rowid, vehicle, party, details) "
+                   f"VALUES (NEW.id * 4 + {kind}, {columns});")
+            remove = f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {kind};"
+            for event, body in (("INSERT", add), ("UPDATE", remove + add), ("DELETE", remove)):
+                c.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_search
+                    AFTER {event} ON {table}
+                    BEGIN
+                        {body}
+                    END
+                ''')
+            c.execute(f'''
+                INSERT INTO search_index (rowid, vehicle, party, details)
+                SELECT id * 4 + {kind}, {", ".join(_search_columns_sql(table, table))}
+                FROM {table}
+            ''')
+
+    def _migration_filter_indexes(c):
+        # Case-insensitive prefix lookups for the trip filter boxes
+        for name, expr in TRIP_FILTER_SQL.items():
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_trips_{name}_prefix ON trips (lower({expr}), {expr})")
+
+    def _migration_value_dictionary(c):
+        # Interned spellings of vehicle numbers, broker offices and locations
+        # with how many rows use each; the source of the autocomplete lists
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS value_dictionary (
+                kind  TEXT NOT NULL,
+                value TEXT NOT NULL COLLATE NOCASE,
+                uses  INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, value)
+            ) WITHOUT ROWID
+        ''')
+        for table, fields in VALUE_SOURCES.items():
+            for kind, column in fields:
+                add = (f"INSERT INTO value_dictionary (kind, value, uses) "
+                       f"SELECT '{kind}', trim(NEW.{column}), 1 WHERE trim(IFNULL(NEW.{column}, '')) <> '' "
+                       f"ON CONFLICT (kind, value) DO UPDATE SET uses = uses + 1;")
+                remove = (f"UPDATE value_dictionary SET uses = uses - 1 "
+                          f"WHERE kind = '{kind}' AND value = trim(OLD.{column}); "
+                          f"DELETE FROM value_dictionary "
+                          f"WHERE kind = '{kind}' AND value = trim(OLD.{column}) AND uses <= 0;")
+                for event, when, body in (("INSERT", "", add),
+                                          (f"UPDATE OF {column}", f"WHEN OLD.{column} IS NOT NEW.{column}", remove + add),
+                                          ("DELETE", "", remove)):
+                    c.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS {table}_{column}_{event.split()[0].lower()}_dictionary
+                        AFTER {event} ON {table} {when}
+                        BEGIN
+                            {body}
+                        END
+                    ''')
+                c.execute(f'''
+                    INSERT INTO value_dictionary (kind, value, uses)
+                    SELECT '{kind}', trim({column}), COUNT(*) FROM {table}
+                    WHERE trim(IFNULL({column}, '')) <> ''
+                    GROUP BY trim({column}) COLLATE NOCASE
+                    ON CONFLICT (kind, value) DO UPDATE SET uses = uses + excluded.uses
+                ''')
+
+    def _migration_vehicle_ids(c):
+        # Trips and vehicle expenses point at their registered vehicle by id.
+        # vehicle_no stays as the displayed text; renaming the vehicle
+        # rewrites it through the linked ids, and rows of vehicles not (yet)
+        # registered keep vehicle_id NULL until one is added.
+        for table in ("trips", "vehicle_expenses"):
+            c.execute(f"ALTER TABLE {table} ADD COLUMN vehicle_id INTEGER "
+                      f"REFERENCES vehicle_driver_details (id) ON DELETE SET NULL")
+            c.execute(f"UPDATE {table} SET vehicle_id = {_vehicle_id_sql(f'{table}.vehicle_no')}")
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_vehicle_id ON {table} (vehicle_id, date)")
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS vehicle_driver_details_insert_link
+            AFTER INSERT ON vehicle_driver_details
+            BEGIN
+                UPDATE trips SET vehicle_id = NEW.id
+                WHERE vehicle_id IS NULL AND trim(vehicle_no) = NEW.vehicle_no COLLATE NOCASE;
+                UPDATE vehicle_expenses SET vehicle_id = NEW.id
+                WHERE vehicle_id IS NULL AND trim(vehicle_no) = NEW.vehicle_no COLLATE NOCASE;
+            END
+        ''')
+        c.execute('''
+            CREATE TRIGGER IF NOT EXISTS vehicle_driver_details_rename_link
+            AFTER UPDATE OF vehicle_no ON vehicle_driver_details
+            WHEN OLD.vehicle_no IS NOT NEW.vehicle_no
+            BEGIN
+                UPDATE trips SET vehicle_no = NEW.vehicle_no WHERE vehicle_id = NEW.id;
+                UPDATE vehicle_expenses SET vehicle_no = NEW.vehicle_no WHERE vehicle_id = NEW.id;
+            END
+        ''')
+
+    def _migration_sort_indexes(c):
+        # Header-click sorting of the trip and vehicle expense grids walks
+        # one of these indexes (value, date, id) in either direction
+        for table, columns in (("trips", TRIP_SORT_COLUMNS),
+                               ("vehicle_expenses", VEHICLE_EXPENSE_SORT_COLUMNS)):
+            for name, (_, expr) in columns.items():
+                if name != "date":
+                    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{name}_sort ON {table} ({expr}, date)")
+
+    def _migration_sessions(c):
+        # Login sessions. The token itself is only in the client's session
+        # file (see SessionStore); the table keeps its hash, its expiry and
+        # the page the app reopens on
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                token_hash TEXT PRIMARY KEY,
+                username   TEXT NOT NULL REFERENCES users (username) ON DELETE CASCADE,
+                expires_at REAL NOT NULL,
+                last_page  TEXT,
+                page_state TEXT
+            )
+        ''')
+
+    def _migration_vehicle_summary_ids(c):
+        # The per-vehicle month summaries and the rollup built from them are
+        # keyed by vehicle id. A registered vehicle's rows are (vehicle_id, '')
+        # and read its number from vehicle_driver_details, so renaming it
+        # changes no summary row. Unregistered numbers stay (0, trimmed number).
+        summaries = {
+            "trips": ("trip_month_summary", "trips", {
+                "load_total": "IFNULL({r}.total, 0)",
+                "driver_amount": "IFNULL({r}.driver_amount, 0)",
+                "expense": "IFNULL({r}.expense, 0)",
+                "profit": "IFNULL({r}.profit, 0)",
+                # The stored balance, so the totals agree with receivables
+                "unpaid": "IFNULL({r}.outstanding, 0)",
+            }, ("total", "driver_amount", "expense", "profit", "outstanding")),
+            "vehicle_expenses": ("vehicle_expense_month_summary", "entries", {
+                col: f"IFNULL({{r}}.{col}, 0)"
+                for col in ("fc_expense", "tyre_amount", "tax", "spare_work", "loan",
+                            "insurance", "others", "total")
+            }, ("fc_expense", "tyre_amount", "tax", "spare_work", "loan",
+                "insurance", "others", "total")),
+        }
+
+        def key(row):
+            return (f"IFNULL(substr({row}.date, 1, 7), ''), IFNULL({row}.vehicle_id, 0), "
+                    f"CASE WHEN {row}.vehicle_id IS NULL THEN TRIM(IFNULL({row}.vehicle_no, '')) ELSE '' END")
+
+        def amounts_sql(table, row):
+            _, _, amounts, _ = summaries[table]
+            return [expr.format(r=row) for expr in amounts.values()]
+
+        def month_delta(table, row, sign):
+            summary, counter, amounts, _ = summaries[table]
+            return f'''
+                INSERT INTO {summary} (month, vehicle_id, vehicle_no, {counter}, {", ".join(amounts)})
+                VALUES ({key(row)}, {sign},
+                        {", ".join(f"{sign} * ({v})" for v in amounts_sql(table, row))})
+                ON CONFLICT (month, vehicle_id, vehicle_no) DO UPDATE SET
+                    {counter} = {counter} + excluded.{counter},
+                    {", ".join(f"{col} = {col} + excluded.{col}" for col in amounts)};
+            '''
+
+        for table, (summary, counter, amounts, sources) in summaries.items():
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                c.execute(f"DROP TRIGGER IF EXISTS {table}_{event.lower()}_summary")
+                c.execute(f"DROP TRIGGER IF EXISTS {table}_{event.lower()}_stale_rollup")
+            c.execute(f"DROP TABLE IF EXISTS {summary}")
+            c.execute(f'''
+                CREATE TABLE {summary} (
+                    month      TEXT NOT NULL,
+                    vehicle_id INTEGER NOT NULL DEFAULT 0,
+                    vehicle_no TEXT NOT NULL DEFAULT '',
+                    {counter} INTEGER NOT NULL DEFAULT 0,
+                    {", ".join(f"{col} REAL NOT NULL DEFAULT 0" for col in amounts)},
+                    PRIMARY KEY (month, vehicle_id, vehicle_no)
+                )
+            ''')
+            cleanup = f"DELETE FROM {summary} WHERE {counter} <= 0;"
+            # Skip updates that only carry a rename to a linked row
+            renamed_only = " AND ".join(["NEW.vehicle_id IS NOT NULL", "OLD.vehicle_id IS NEW.vehicle_id"]
+                                        + [f"OLD.{col} IS NEW.{col}" for col in ("date",) + sources])
+            for event, when, body in (
+                ("INSERT", "", month_delta(table, "NEW", 1)),
+                ("UPDATE", f"WHEN NOT ({renamed_only})",
+                 month_delta(table, "OLD", -1) + month_delta(table, "NEW", 1) + cleanup),
+                ("DELETE", "", month_delta(table, "OLD", -1) + cleanup),
+            ):
+                c.execute(f'''
+                    CREATE TRIGGER {table}_{event.lower()}_summary
+                    AFTER {event} ON {table} {when}
+                    BEGIN
+                        {body}
+                    END
+                ''')
+            c.execute(f'''
+                INSERT INTO {summary} (month, vehicle_id, vehicle_no, {counter}, {", ".join(amounts)})
+                SELECT {key(table)}, COUNT(*), {", ".join(f"TOTAL({v})" for v in amounts_sql(table, table))}
+                FROM {table}
+                GROUP BY 1, 2, 3
+            ''')
+            # The rollup is built from the summaries, so it is stale when they change
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                c.execute(f'''
+                    CREATE TRIGGER {summary}_{event.lower()}_stale_rollup
+                    AFTER {event} ON {summary}
+                    BEGIN
+                        UPDATE cache_state SET stale = 1 WHERE name = 'vehicle_month_rollup';
+                    END
+                ''')
+
+        c.execute("DROP TABLE IF EXISTS vehicle_month_rollup")
+        c.execute('''
+            CREATE TABLE vehicle_month_rollup (
+                vehicle_id   INTEGER NOT NULL DEFAULT 0,
+                vehicle_no   TEXT NOT NULL DEFAULT '',
+                month        TEXT NOT NULL,
+                trips        INTEGER NOT NULL DEFAULT 0,
+                revenue      REAL NOT NULL DEFAULT 0,
+                trip_expense REAL NOT NULL DEFAULT 0,
+                maintenance  REAL NOT NULL DEFAULT 0,
+                loan         REAL NOT NULL DEFAULT 0,
+                net          REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, vehicle_id, vehicle_no)
+            )
+        ''')
+        c.execute("UPDATE cache_state SET stale = 1 WHERE name = 'vehicle_month_rollup'")
+
+    def _migration_trimmed_filter_indexes(c):
+        # The filter values are trimmed now (see TRIP_FILTER_SQL); rebuild
+        # the prefix indexes over the new expressions
+        for name in TRIP_FILTER_SQL:
+            c.execute(f"DROP INDEX IF EXISTS idx_trips_{name}_prefix")
+        DBManager._migration_filter_indexes(c)
+
+    MIGRATIONS = (
+        _migration_vehicle_rollup,
+        _migration_summary_tables,
+        _migration_iso_dates,
+        _migration_outstanding,
+        _migration_broker_date_index,
+        _migration_search_index,
+        _migration_filter_indexes,
+        _migration_value_dictionary,
+        _migration_vehicle_ids,
+        _migration_sort_indexes,
+        _migration_sessions,
+        _migration_vehicle_summary_ids,
+        _migration_trimmed_filter_indexes,
+    )
+
     def _add_default_user_if_needed(self):
         c = self.conn.cursor()
         c.execute("SELECT COUNT(*) FROM users")
@@ -169,12 +1072,53 @@ class DBManager:
             return False
         return self.hash_password(password) == row["password_hash"]
 
+    def user_exists(self, username) -> bool:
+        return bool(self._select_tuples("SELECT 1 FROM users WHERE username=?", (username,)))
+
     def update_password(self, username, new_password):
         c = self.conn.cursor()
         hashed = self.hash_password(new_password)
         c.execute("UPDATE users SET password_hash=? WHERE username=?", (hashed, username))
+        updated = c.rowcount
+        # A new password signs the user out everywhere
+        c.execute("DELETE FROM sessions WHERE username=?", (username,))
+        self.conn.commit()
+        return updated
+
+    # ---------------- SESSIONS ----------------
+    SESSION_HOURS = 12
+
+    def create_session(self, username: str) -> tuple:
+        """Start a session for `username` after a successful login; returns
+        (token, expires_at) with expires_at in epoch seconds."""
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        expires_at = now + self.SESSION_HOURS * 3600
+        self.conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        self.conn.execute("INSERT INTO sessions (token_hash, username, expires_at) VALUES (?, ?, ?)",
+                          (self.hash_password(token), username, expires_at))
+        self.conn.commit()
+        return token, expires_at
+
+    def resume_session(self, token: str) -> Dict[str, Any] | None:
+        """{'username', 'page', 'page_state'} of the unexpired session `token`, else None."""
+        rows = self._select_tuples(
+            "SELECT username, last_page, page_state FROM sessions WHERE token_hash = ? AND expires_at > ?",
+            (self.hash_password(token), time.time()))
+        if not rows:
+            return None
+        username, page, state = rows[0]
+        try:
+            state = json.loads(state) if state else None
+        except ValueError:
+            state = None
+        return {"username": username, "page": page or "home", "page_state": state}
+
+    def save_session_page(self, token: str, page: str, page_state: Dict[str, Any] = None):
+        """Remember the page (a MainWindow.PAGES name) and its state to reopen for `token`."""
+        self.conn.execute("UPDATE sessions SET last_page = ?, page_state = ? WHERE token_hash = ?",
+                          (page, json.dumps(page_state) if page_state else None, self.hash_password(token)))
         self.conn.commit()
-        return c.rowcount
 
     def reset_password(self):
         newpass = self.newpasswordinput.text()
@@ -198,31 +1142,174 @@ class DBManager:
 
     # ---------------- TRIPS ----------------
 
+    # Detail fields the trip grid needs without parsing the whole detail_json blob
+    TRIP_LIST_DETAIL_FIELDS = ("Driver Name", "Trip Advance", "Return Balance", "Broker Amount")
+
+    TRIP_LIST_SQL = f"""
+        SELECT id, date, vehicle_no, location_from_to, broker_office,
+               driver_amount, profit, expense, total, status,
+               {", ".join(_detail_field_sql(f) for f in TRIP_LIST_DETAIL_FIELDS)},
+               outstanding
+        FROM trips
+    """
+
     def load_trips(self) -> List[sqlite3.Row]:
         return self.conn.execute("SELECT * FROM trips ORDER BY date ASC").fetchall()
 
+    @staticmethod
+    def _date_filter(start_date=None, end_date=None, column="date") -> tuple:
+        """WHERE clause and params for inclusive yyyy-mm-dd (or yyyy-mm) bounds on `column`."""
+        sql, params = " WHERE 1=1", []
+        if start_date:
+            sql += f" AND {column} >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += f" AND {column} <= ?"
+            params.append(end_date)
+        return sql, params
+
+    def load_trip_list(self, start_date: str = None, end_date: str = None) -> List[TripRecord]:
+        """Projected trips for list views (no detail_json blob), optionally within a date range."""
+        where, params = self._date_filter(start_date, end_date)
+        rows = self._select_tuples(self.TRIP_LIST_SQL + where + " ORDER BY date ASC, id ASC", params)
+        return [TripRecord.from_list_row(r) for r in rows]
+
+    def iter_trip_list(self, start_date: str = None, end_date: str = None, ids=None,
+                       newest_first: bool = False):
+        """Stream TripRecords by date (optionally only the given ids) for exports."""
+        where, params = self._date_filter(start_date, end_date)
+        if ids is not None:
+            where += " AND id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(ids)))
+        order = " ORDER BY date DESC, id DESC" if newest_first else " ORDER BY date ASC, id ASC"
+        for r in self._iter_tuples(self.TRIP_LIST_SQL + where + order, params):
+            yield TripRecord.from_list_row(r)
+
+    def load_trip_list_row(self, trip_id: int, filters: Dict[str, Any] = None) -> TripRecord | None:
+        """One trip for list views; None if it is missing or does not match
+        `filters` (see _trip_filter_where)."""
+        where, params = self._trip_filter_where(filters)
+        rows = self._select_tuples(self.TRIP_LIST_SQL + where + " AND id = ?", params + [trip_id])
+        return TripRecord.from_list_row(rows[0]) if rows else None
+
+    def load_trip_detail(self, trip_id: int) -> Dict[str, Any]:
+        """Parsed detail_json of one trip ({} if missing or invalid)."""
+        row = self._select_tuples("SELECT detail_json FROM trips WHERE id = ?", (trip_id,))
+        try:
+            return json.loads(row[0][0]) if row and row[0][0] else {}
+        except ValueError:
+            return {}
+
+    def trip_ids_between(self, start_date: str, end_date: str) -> set:
+        """Ids of trips dated start_date..end_date inclusive (yyyy-mm-dd); an index range scan."""
+        rows = self._select_tuples("SELECT id FROM trips WHERE date BETWEEN ? AND ?",
+                                   (start_date, end_date))
+        return {r[0] for r in rows}
+
+    @staticmethod
+    def _prefix_where(fields: Dict[str, str]) -> tuple:
+        """WHERE clause and params matching each TRIP_FILTER_SQL field by prefix."""
+        sql, params = " WHERE 1=1", []
+        for name, prefix in fields.items():
+            expr = f"lower({TRIP_FILTER_SQL[name]})"
+            # lower(?) so both sides are folded the same way; char(1114111) sorts after any text
+            sql += f" AND {expr} >= lower(?) AND {expr} < lower(?) || char(1114111)"
+            params += [prefix, prefix]
+        return sql, params
+
+    def _trip_filter_where(self, filters: Dict[str, Any] = None) -> tuple:
+        """WHERE clause and params for the trip grid filters: 'vehicle', 'broker'
+        and 'driver' prefixes (see TRIP_FILTER_SQL), 'status' ('Paid'/'Unpaid')
+        and inclusive yyyy-mm-dd 'start_date' / 'end_date'."""
+        filters = filters or {}
+        sql, params = self._prefix_where({name: filters[name].strip() for name in TRIP_FILTER_SQL
+                                          if (filters.get(name) or "").strip()})
+        if filters.get("status"):
+            sql += " AND lower(IFNULL(NULLIF(status, ''), 'Unpaid')) = lower(?)"
+            params.append(filters["status"])
+        date_sql, date_params = self._date_filter(filters.get("start_date"), filters.get("end_date"))
+        return sql + date_sql.replace(" WHERE 1=1", ""), params + date_params
+
+    @staticmethod
+    def _seek_sql(columns: Dict[str, tuple], sort: str, descending: bool, after=None) -> tuple:
+        """(AND-clause, ORDER BY, params) for rows sorted by `sort` (a key of
+        `columns`, e.g. TRIP_SORT_COLUMNS) then date and id, starting after the
+        _sort_key `after` (None = from the first row)."""
+        keys = [columns[sort][1]] if sort != "date" else []
+        keys += ["date", "id"]
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        order = " ORDER BY " + ", ".join(f"{k} {direction}" for k in keys)
+        if not after:
+            return "", order, []
+        # The row-value test alone is not used to seek; the bound on the
+        # leading value is, and starts the index scan at the key
+        seek = f" AND {keys[0]} {op}= ? AND ({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})"
+        return seek, order, [after[0], *after]
+
+    # Trip grid pages: each page seeks past the sort key of the last trip of
+    # the previous one, so any page costs the same index range scan
+    TRIP_PAGE_SIZE = 200
+
+    def load_trip_page(self, filters: Dict[str, Any] = None, after=None,
+                       limit: int = TRIP_PAGE_SIZE, sort: str = "date",
+                       descending: bool = True) -> List[TripRecord]:
+        """Up to `limit` trips matching `filters` (see _trip_filter_where), sorted
+        by the TRIP_SORT_COLUMNS column `sort`, starting after the key `after`
+        (see trip_page_key; None = from the first trip)."""
+        where, params = self._trip_filter_where(filters)
+        seek, order, seek_params = self._seek_sql(TRIP_SORT_COLUMNS, sort, descending, after)
+        rows = self._select_tuples(self.TRIP_LIST_SQL + where + seek + order + " LIMIT ?",
+                                   params + seek_params + [limit])
+        return [TripRecord.from_list_row(r) for r in rows]
+
+    @staticmethod
+    def trip_page_key(trip: TripRecord, sort: str = "date") -> tuple:
+        """The `after` key for load_trip_page continuing past `trip`."""
+        return _sort_key(trip, TRIP_SORT_COLUMNS, sort)
+
+    def trip_filter_suggestions(self, field: str, prefix: str = "", limit: int = 15) -> List[str]:
+        """Distinct values of one trip filter field starting with `prefix`, in order."""
+        value = TRIP_FILTER_SQL[field]
+        expr = f"lower({value})"
+        sql, params = self._prefix_where({field: prefix.strip()})
+        # One spelling per case-folded, trimmed group
+        rows = self._select_tuples(f"SELECT min({value}) FROM trips{sql} AND {expr} <> '' "
+                                   f"GROUP BY {expr} ORDER BY {expr} LIMIT ?", params + [limit])
+        return [r[0] for r in rows]
+
+    def load_value_dictionary(self) -> List[tuple]:
+        """(kind, value, uses) rows of the autocomplete dictionary."""
+        return self._select_tuples("SELECT kind, value, uses FROM value_dictionary")
+
+    def trip_totals(self) -> tuple:
+        """(total expense, total profit) over all trips."""
+        totals = self.trip_summary()
+        return totals["expense"], totals["profit"]
+
     def loadtrips(self):  # legacy name alias
         return self.load_trips()
 
     def save_trip(self, data: tuple) -> int:
+        data = (_iso_date(data[0]), *data[1:])
         cur = self.conn.cursor()
         if len(data) == 9:   # legacy call – no detail_json
-            cur.execute('''
+            cur.execute(f'''
                 INSERT INTO trips
                 (date, vehicle_no, location_from_to, broker_office,
-                 driver_amount, profit, expense, total, status)
-                VALUES (?,?,?,?,?,?,?,?,?)
-            ''', data)
+                 driver_amount, profit, expense, total, status, outstanding, vehicle_id)
+                VALUES (?,?,?,?,?,?,?,?,?,?,{_vehicle_id_sql("?2")})
+            ''', (*data, _trip_outstanding(data[7], data[8], None)))
         elif len(data) == 10:            # new call – with detail_json
-            cur.execute('''
+            cur.execute(f'''
                 INSERT INTO trips
                 (date, vehicle_no, location_from_to, broker_office,
-                 driver_amount, profit, expense, total, status, detail_json)
-                VALUES (?,?,?,?,?,?,?,?,?,?)
-            ''', data)
+                 driver_amount, profit, expense, total, status, detail_json, outstanding, vehicle_id)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,{_vehicle_id_sql("?2")})
+            ''', (*data, _trip_outstanding(data[7], data[8], data[9])))
         else:
             raise ValueError("save_trip expected 9 or 10 fields")
         self.conn.commit()
+        self.changes.publish("trips", cur.lastrowid, "insert")
         return cur.lastrowid
 
     def savetrip(self, data: tuple) -> int:
@@ -230,24 +1317,29 @@ class DBManager:
 
     def update_trip(self, tripid: int, data: tuple):
         if len(data) == 9:
-            sql = '''
+            sql = f'''
                 UPDATE trips SET
                 date=?, vehicle_no=?, location_from_to=?, broker_office=?,
-                driver_amount=?, profit=?, expense=?, total=?, status=?
+                driver_amount=?, profit=?, expense=?, total=?, status=?,
+                outstanding=?, vehicle_id={_vehicle_id_sql("?2")}
                 WHERE id=?
             '''
+            detail = self._select_tuples("SELECT detail_json FROM trips WHERE id = ?", (tripid,))
+            outstanding = _trip_outstanding(data[7], data[8], detail[0][0] if detail else None)
         elif len(data) == 10:
-            sql = '''
+            sql = f'''
                 UPDATE trips SET
                 date=?, vehicle_no=?, location_from_to=?, broker_office=?,
                 driver_amount=?, profit=?, expense=?, total=?, status=?,
-                detail_json=?
+                detail_json=?, outstanding=?, vehicle_id={_vehicle_id_sql("?2")}
                 WHERE id=?
             '''
+            outstanding = _trip_outstanding(data[7], data[8], data[9])
         else:
             raise ValueError("update_trip expected 9 or 10 fields")
-        self.conn.execute(sql, (*data, tripid))
+        self.conn.execute(sql, (_iso_date(data[0]), *data[1:], outstanding, tripid))
         self.conn.commit()
+        self.changes.publish("trips", tripid, "update")
 
     def updatetrip(self, tripid: int, data: tuple):
         return self.update_trip(tripid, data)
@@ -256,10 +1348,12 @@ class DBManager:
         """Delete a trip by its id."""
         self.conn.execute("DELETE FROM trips WHERE id=?", (trip_id,))
         self.conn.commit()
+        self.changes.publish("trips", trip_id, "delete")
 
     def delete_office_expense(self, expid: int):
         self.conn.execute("DELETE FROM office_expenses WHERE id=?", (expid,))
         self.conn.commit()
+        self.changes.publish("office_expenses", expid, "delete")
 
     def deleteofficeexpense(self, expid):
         return self.delete_office_expense(expid)
@@ -268,6 +1362,41 @@ class DBManager:
     def load_vehicle_expenses(self) -> List[sqlite3.Row]:
         return self.conn.execute("SELECT * FROM vehicle_expenses ORDER BY date DESC").fetchall()
 
+    # Projected columns of VehicleExpenseRecord
+    VEHICLE_EXPENSE_LIST_SQL = """
+        SELECT id, date, vehicle_no, fc_expense, tyre_amount, tyre_type, tax, tax_type,
+               spare_work, spare_type, loan, insurance, others, remarks
+        FROM vehicle_expenses
+    """
+
+    def load_vehicle_expense_list(self, start_date: str = None, end_date: str = None,
+                                  sort: str = "date", descending: bool = True) -> List[VehicleExpenseRecord]:
+        """Vehicle expenses dated start_date..end_date, sorted by the
+        VEHICLE_EXPENSE_SORT_COLUMNS column `sort`."""
+        where, params = self._date_filter(start_date, end_date)
+        _, order, _ = self._seek_sql(VEHICLE_EXPENSE_SORT_COLUMNS, sort, descending)
+        rows = self._select_tuples(self.VEHICLE_EXPENSE_LIST_SQL + where + order, params)
+        return [VehicleExpenseRecord(*r) for r in rows]
+
+    def load_vehicle_expense_row(self, expid: int) -> VehicleExpenseRecord | None:
+        rows = self._select_tuples(self.VEHICLE_EXPENSE_LIST_SQL + " WHERE id = ?", (expid,))
+        return VehicleExpenseRecord(*rows[0]) if rows else None
+
+    def iter_vehicle_expense_list(self, start_date: str = None, end_date: str = None):
+        """Stream VehicleExpenseRecords, newest first, for exports."""
+        where, params = self._date_filter(start_date, end_date)
+        for r in self._iter_tuples(self.VEHICLE_EXPENSE_LIST_SQL + where + " ORDER BY date DESC", params):
+            yield VehicleExpenseRecord(*r)
+
+    def vehicle_expense_ids_between(self, start_date: str, end_date: str) -> set:
+        """Ids of vehicle expenses dated start_date..end_date inclusive (yyyy-mm-dd)."""
+        rows = self._select_tuples("SELECT id FROM vehicle_expenses WHERE date BETWEEN ? AND ?",
+                                   (start_date, end_date))
+        return {r[0] for r in rows}
+
+    def vehicle_expense_total(self) -> float:
+        return self.vehicle_expense_summary()["total"]
+
     def loadvehicleexpenses(self):
         return self.load_vehicle_expenses()
 
@@ -279,15 +1408,17 @@ class DBManager:
         - or 14 fields (same plus total)
         """
         d = list(data)
+        d[0] = _iso_date(d[0])
         if len(d) == 13:
             total = sum(_safefloat(d[i]) for i in (2, 3, 5, 7, 9, 10, 11))
             d.append(total)
         cur = self.conn.cursor()
-        cur.execute('''
-            INSERT INTO vehicle_expenses (date,vehicle_no,fc_expense,tyre_amount,tyre_type,tax,tax_type,spare_work,spare_type,loan,insurance,others,remarks,total)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        cur.execute(f'''
+            INSERT INTO vehicle_expenses (date,vehicle_no,fc_expense,tyre_amount,tyre_type,tax,tax_type,spare_work,spare_type,loan,insurance,others,remarks,total,vehicle_id)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,{_vehicle_id_sql("?2")})
         ''', tuple(d))
         self.conn.commit()
+        self.changes.publish("vehicle_expenses", cur.lastrowid, "insert")
         return cur.lastrowid
 
     def savevehicleexpense(self, data):
@@ -295,16 +1426,19 @@ class DBManager:
 
     def update_vehicle_expense(self, expid: int, data: List[Any]):
         d = list(data)
+        d[0] = _iso_date(d[0])
         if len(d) == 13:
             total = sum(_safefloat(d[i]) for i in (2, 3, 5, 7, 9, 10, 11))
             d.append(total)
-        self.conn.execute('''
+        self.conn.execute(f'''
             UPDATE vehicle_expenses SET
                 date=?, vehicle_no=?, fc_expense=?, tyre_amount=?, tyre_type=?, tax=?, tax_type=?,
-                spare_work=?, spare_type=?, loan=?, insurance=?, others=?, remarks=?, total=?
+                spare_work=?, spare_type=?, loan=?, insurance=?, others=?, remarks=?, total=?,
+                vehicle_id={_vehicle_id_sql("?2")}
             WHERE id=?
         ''', tuple(d) + (expid,))
         self.conn.commit()
+        self.changes.publish("vehicle_expenses", expid, "update")
 
     def updatevehicleexpense(self, expid, data):
         return self.update_vehicle_expense(expid, data)
@@ -312,28 +1446,49 @@ class DBManager:
     def delete_vehicle_expense(self, expid: int):
         self.conn.execute("DELETE FROM vehicle_expenses WHERE id=?", (expid,))
         self.conn.commit()
+        self.changes.publish("vehicle_expenses", expid, "delete")
 
     def deletevehicleexpense(self, expid):
         return self.delete_vehicle_expense(expid)
 
     # ---------------- OFFICE EXPENSES ----------------
     def load_office_expenses(self) -> List[sqlite3.Row]:
-        return self.conn.execute("SELECT * FROM office_expenses ORDER BY month DESC").fetchall()
+        return self.conn.execute("SELECT * FROM office_expenses ORDER BY period DESC, month DESC").fetchall()
+
+    # Projected columns of OfficeMonthRecord
+    OFFICE_LIST_SQL = """
+        SELECT id, month, current_bill, manager_salary, office_rent, others, period
+        FROM office_expenses
+    """
+
+    def load_office_expense_list(self, start_period: str = None, end_period: str = None) -> List[OfficeMonthRecord]:
+        """Office months, optionally only those whose yyyy-mm period is within the bounds."""
+        where, params = self._date_filter(start_period, end_period, "period")
+        rows = self._select_tuples(self.OFFICE_LIST_SQL + where + " ORDER BY period DESC, month DESC", params)
+        return [OfficeMonthRecord(*r) for r in rows]
+
+    def load_office_expense_row(self, expid: int) -> OfficeMonthRecord | None:
+        rows = self._select_tuples(self.OFFICE_LIST_SQL + " WHERE id = ?", (expid,))
+        return OfficeMonthRecord(*rows[0]) if rows else None
 
     def loadofficeexpenses(self):
         return self.load_office_expenses()
 
+    # Period of an office month whose label names none: the month it is saved in
+    SAVED_PERIOD_SQL = "strftime('%Y-%m', 'now', 'localtime')"
+
     def save_office_expense(self, data: tuple) -> int:
         """
         data: (month, current_bill, manager_salary, office_rent, others)
         """
         total = sum(_safefloat(x) for x in data[1:])  # Automatically calculate total
         cur = self.conn.cursor()
-        cur.execute('''
-            INSERT INTO office_expenses (month, current_bill, manager_salary, office_rent, others, total)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (*data, total))
+        cur.execute(f'''
+            INSERT INTO office_expenses (month, current_bill, manager_salary, office_rent, others, total, period)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, {self.SAVED_PERIOD_SQL}))
+        ''', (*data, total, _office_period(data[0])))
         self.conn.commit()
+        self.changes.publish("office_expenses", cur.lastrowid, "insert")
         return cur.lastrowid
 
 
@@ -342,71 +1497,82 @@ class DBManager:
 
     def update_office_expense(self, expid: int, data: tuple):
         total = sum(_safefloat(x) for x in data[1:])  # Recalculate total
-        self.conn.execute('''
+        # A label without a month keeps the period the row already has
+        self.conn.execute(f'''
             UPDATE office_expenses
-            SET month=?, current_bill=?, manager_salary=?, office_rent=?, others=?, total=?
+            SET month=?, current_bill=?, manager_salary=?, office_rent=?, others=?, total=?,
+                period=COALESCE(?, period, {self.SAVED_PERIOD_SQL})
             WHERE id=?
-        ''', (*data, total, expid))
+        ''', (*data, total, _office_period(data[0]), expid))
         self.conn.commit()
+        self.changes.publish("office_expenses", expid, "update")
 
     def updateofficeexpense(self, expid, data):
         return self.update_office_expense(expid, data)
 
     # ---------------- VEHICLE DRIVER DETAILS ----------------
+    VEHICLE_DRIVER_FIELDS = (
+        'vehicle_no', 'registration_date', 'fitness_upto', 'tax_upto', 'insurance_upto',
+        'pucc_upto', 'permit_upto', 'national_permit_upto', 'driver_name', 'driver_contact',
+        'driver_alt_contact', 'driver_experience', 'driver_adhar', 'driver_license_path',
+        'loan_total', 'loan_paid', 'loan_remaining', 'driver_date_of_joining', 'driver_bank_account',
+    )
+
     def save_vehicle_driver_details(self, data: Dict[str, Any]) -> int:
-        cur = self.conn.cursor()
-        # Check if vehicle_no already exists
-        existing_vehicle = self.conn.execute(
-            "SELECT id FROM vehicle_driver_details WHERE vehicle_no = ?", (data['vehicle_no'],)
+        """
+        Insert or update the details of one vehicle in one transaction.
+        Only the columns present in `data` are written, so a partial dict
+        (e.g. just the loan fields) leaves the other columns untouched.
+        """
+        cols = [k for k in self.VEHICLE_DRIVER_FIELDS if k in data]
+        if 'vehicle_no' not in cols:
+            raise ValueError("save_vehicle_driver_details requires vehicle_no")
+        updates = [c for c in cols if c != 'vehicle_no'] or ['vehicle_no']
+        params = {c: data[c] for c in cols}
+        # The insert returns a row only when the vehicle is new; otherwise the
+        # update runs in the same transaction, so subscribers get the right op
+        inserted = self.conn.execute(
+            f"INSERT INTO vehicle_driver_details ({', '.join(cols)}) "
+            f"VALUES ({', '.join(':' + c for c in cols)}) "
+            f"ON CONFLICT(vehicle_no) DO NOTHING RETURNING id", params
         ).fetchone()
-
-        if existing_vehicle:
-            # Update existing record
-            self.update_vehicle_driver_details(existing_vehicle['id'], data)
-            return existing_vehicle['id']
+        if inserted:
+            record_id, op = inserted[0], "insert"
         else:
-            # Insert new record
-            cur.execute('''
-                INSERT INTO vehicle_driver_details (
-                    vehicle_no, registration_date, fitness_upto, tax_upto, insurance_upto,
-                    pucc_upto, permit_upto, national_permit_upto, driver_name, driver_contact,
-                    driver_alt_contact, driver_experience, driver_adhar, driver_license_path,
-                    loan_total, loan_paid, loan_remaining, driver_date_of_joining, driver_bank_account
-                ) VALUES (
-                    :vehicle_no, :registration_date, :fitness_upto, :tax_upto, :insurance_upto,
-                    :pucc_upto, :permit_upto, :national_permit_upto, :driver_name, :driver_contact,
-                    :driver_alt_contact, :driver_experience, :driver_adhar, :driver_license_path,
-                    :loan_total, :loan_paid, :loan_remaining, :driver_date_of_joining, :driver_bank_account
-                )
-            ''', data)
-            self.conn.commit()
-            return cur.lastrowid
+            record_id, op = self.conn.execute(
+                f"UPDATE vehicle_driver_details SET {', '.join(f'{c} = :{c}' for c in updates)} "
+                f"WHERE vehicle_no = :vehicle_no RETURNING id", params
+            ).fetchone()[0], "update"
+        self.conn.commit()
+        self.changes.publish("vehicle_driver_details", record_id, op)
+        return record_id
 
     def update_vehicle_driver_details(self, record_id: int, data: Dict[str, Any]):
-        self.conn.execute('''
-            UPDATE vehicle_driver_details SET
-                vehicle_no = :vehicle_no,
-                registration_date = :registration_date,
-                fitness_upto = :fitness_upto,
-                tax_upto = :tax_upto,
-                insurance_upto = :insurance_upto,
-                pucc_upto = :pucc_upto,
-                permit_upto = :permit_upto,
-                national_permit_upto = :national_permit_upto,
-                driver_name = :driver_name,
-                driver_contact = :driver_contact,
-                driver_alt_contact = :driver_alt_contact,
-                driver_experience = :driver_experience,
-                driver_adhar = :driver_adhar,
-                driver_license_path = :driver_license_path,
-                loan_total = :loan_total,
-                loan_paid = :loan_paid,
-                loan_remaining = :loan_remaining,
-                driver_date_of_joining = :driver_date_of_joining,
-                driver_bank_account = :driver_bank_account
-            WHERE id = :id
-        ''', {**data, 'id': record_id})
+        cols = [k for k in self.VEHICLE_DRIVER_FIELDS if k in data]
+        if not cols:
+            return
+        sql = (
+            f"UPDATE vehicle_driver_details SET "
+            f"{', '.join(f'{c} = :{c}' for c in cols)} WHERE id = :id"
+        )
+        self.conn.execute(sql, {**{c: data[c] for c in cols}, 'id': record_id})
         self.conn.commit()
+        self.changes.publish("vehicle_driver_details", record_id, "update")
+
+    def rename_vehicle(self, old_vehicle_no: str, new_vehicle_no: str) -> int:
+        """Rename a vehicle in place, keeping its row id. Returns rows changed.
+        Its trips and expenses follow through vehicle_id (see _migration_vehicle_ids)."""
+        ids = self.conn.execute(
+            "UPDATE vehicle_driver_details SET vehicle_no = ? WHERE vehicle_no = ? RETURNING id",
+            (new_vehicle_no, old_vehicle_no)
+        ).fetchall()
+        self.conn.commit()
+        for (record_id,) in ids:
+            self.changes.publish("vehicle_driver_details", record_id, "update")
+            for table in ("trips", "vehicle_expenses"):
+                if self._select_tuples(f"SELECT 1 FROM {table} WHERE vehicle_id = ? LIMIT 1", (record_id,)):
+                    self.changes.publish(table, None, "reload")
+        return len(ids)
 
     def load_vehicle_driver_details(self, vehicle_no: str) -> Dict[str, Any] | None:
         row = self.conn.execute(
@@ -418,11 +1584,342 @@ class DBManager:
         rows = self.conn.execute("SELECT * FROM vehicle_driver_details").fetchall()
         return [dict(row) for row in rows]
 
+    def vehicle_trip_activity(self) -> List[tuple]:
+        """(vehicle_driver_details id, trip count, last trip date) of each vehicle with trips.
+
+        Rows rather than a dict keyed by id: JSON would turn the ids into strings over RPC.
+        """
+        return self._select_tuples('''
+            SELECT vehicle_id, COUNT(*), MAX(date) FROM trips
+            WHERE vehicle_id IS NOT NULL GROUP BY vehicle_id
+        ''')
+
     def delete_vehicle_driver_details(self, vehicle_no: str):
-        self.conn.execute("DELETE FROM vehicle_driver_details WHERE vehicle_no = ?", (vehicle_no,))
+        ids = self.conn.execute("DELETE FROM vehicle_driver_details WHERE vehicle_no = ? RETURNING id",
+                                (vehicle_no,)).fetchall()
+        self.conn.commit()
+        for (record_id,) in ids:
+            self.changes.publish("vehicle_driver_details", record_id, "delete")
+
+    # ---------------- RECEIVABLES ----------------
+    # (label, first day, last day) of each aging bucket; None = no upper bound.
+    # Trips whose date cannot be read are counted in the oldest bucket.
+    AGING_BUCKETS = (("0-30", 0, 30), ("31-60", 31, 60), ("61-90", 61, 90), ("90+", 91, None))
+
+    def load_outstanding_trips(self, broker_office: str = None) -> List[TripRecord]:
+        """Trips with a balance still to collect, by broker office then date."""
+        sql = self.TRIP_LIST_SQL + " WHERE outstanding > 0"
+        params = ()
+        if broker_office is not None:
+            sql += " AND broker_office = ?"
+            params = (broker_office,)
+        rows = self._select_tuples(sql + " ORDER BY broker_office, date, id", params)
+        return [TripRecord.from_list_row(r) for r in rows]
+
+    def load_broker_statement_trips(self, start_date: str = None, end_date: str = None,
+                                    outstanding_only: bool = False) -> List[TripRecord]:
+        """Trips for broker statements, grouped by broker office then date (yyyy-mm-dd bounds, inclusive)."""
+        sql = self.TRIP_LIST_SQL + " WHERE 1=1"
+        params = []
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        if outstanding_only:
+            sql += " AND outstanding > 0"
+        rows = self._select_tuples(sql + " ORDER BY broker_office, date, id", params)
+        return [TripRecord.from_list_row(r) for r in rows]
+
+    def receivables_aging(self, as_of: str = None) -> List[ReceivableAgingRecord]:
+        """Outstanding balance per broker office split into AGING_BUCKETS, largest first."""
+        as_of = _iso_date(as_of) if as_of else datetime.now().strftime("%Y-%m-%d")
+        buckets = []
+        for _, lo, hi in self.AGING_BUCKETS:
+            if hi is None:
+                cond = f"age IS NULL OR age >= {lo}"
+            elif lo == 0:
+                cond = f"age <= {hi}"  # future-dated trips count as current
+            else:
+                cond = f"age BETWEEN {lo} AND {hi}"
+            buckets.append(f"TOTAL(CASE WHEN {cond} THEN outstanding END)")
+        rows = self._select_tuples(f'''
+            SELECT broker_office, COUNT(*), {", ".join(buckets)}, TOTAL(outstanding)
+            FROM (
+                SELECT IFNULL(broker_office, '') AS broker_office, outstanding,
+                       CAST(julianday(?) - julianday(date) AS INTEGER) AS age
+                FROM trips WHERE outstanding > 0
+            )
+            GROUP BY broker_office
+            ORDER BY TOTAL(outstanding) DESC
+        ''', (as_of,))
+        return [ReceivableAgingRecord(*r) for r in rows]
+
+    # ---------------- FULL-TEXT SEARCH ----------------
+    # search_index is kept in step with its source tables by triggers
+    # (see _migration_search_index); matches on the vehicle number weigh most,
+    # then broker/driver, then everything else.
+    SEARCH_WEIGHTS = (5.0, 3.0, 1.0)
+
+    def search(self, text: str, limit: int = 50) -> List[SearchHit]:
+        """Best matches for every word of `text` (each taken as a prefix), best first."""
+        words = re.findall(r"\w+", text or "")
+        if not words:
+            return []
+        query = " ".join(f'"{w}"*' for w in words)
+        tables = {kind: table for table, kind in SEARCH_KINDS.items()}
+        weights = ", ".join(str(w) for w in self.SEARCH_WEIGHTS)
+        rows = self._select_tuples(f'''
+            SELECT rowid, vehicle,
+                   snippet(search_index, -1, '[', ']', '…', 8),
+                   bm25(search_index, {weights}) AS score
+            FROM search_index WHERE search_index MATCH ?
+            ORDER BY score LIMIT ?
+        ''', (query, limit))
+        return [SearchHit(tables[rowid % 4], rowid // 4, vehicle, snippet, score)
+                for rowid, vehicle, snippet, score in rows]
+
+    # ---------------- SUMMARIES ----------------
+    # Read from the trigger-maintained *_summary tables (see _migration_summary_tables).
+    # Per-vehicle rows (alias s) name registered vehicles through vehicle_id
+    # (see _migration_vehicle_summary_ids).
+    VEHICLE_NAME_SQL = "IFNULL(v.vehicle_no, s.vehicle_no)"
+    VEHICLE_JOIN_SQL = "LEFT JOIN vehicle_driver_details AS v ON v.id = s.vehicle_id"
+
+    @classmethod
+    def _month_filter(cls, start_month=None, end_month=None, vehicle=None) -> tuple:
+        """WHERE clause and params for inclusive 'yyyy-mm' bounds and a vehicle substring."""
+        sql, params = " WHERE 1=1", []
+        if start_month:
+            sql += " AND s.month >= ?"
+            params.append(start_month)
+        if end_month:
+            sql += " AND s.month <= ?"
+            params.append(end_month)
+        if vehicle and vehicle.strip():
+            sql += f" AND instr(lower({cls.VEHICLE_NAME_SQL}), lower(?)) > 0"
+            params.append(vehicle.strip())
+        return sql, params
+
+    def trip_summary(self, start_month=None, end_month=None, vehicle=None) -> Dict[str, float]:
+        """Trip totals (same keys as summarize_trips) over a month range."""
+        where, params = self._month_filter(start_month, end_month, vehicle)
+        row = self._select_tuples(f'''
+            SELECT ROUND(TOTAL(load_total), 2), ROUND(TOTAL(driver_amount), 2),
+                   ROUND(TOTAL(expense), 2), ROUND(TOTAL(profit), 2), ROUND(TOTAL(unpaid), 2)
+            FROM trip_month_summary AS s {self.VEHICLE_JOIN_SQL} {where}
+        ''', params)[0]
+        return dict(zip(("total", "driver_amount", "expense", "profit", "unpaid"), row))
+
+    VEHICLE_EXPENSE_SUMMARY_COLUMNS = ("fc_expense", "tyre_amount", "tax", "spare_work", "loan",
+                                       "insurance", "others", "total")
+
+    def vehicle_expense_summary(self, start_month=None, end_month=None, vehicle=None) -> Dict[str, float]:
+        """Vehicle expense totals per category (plus 'total') over a month range."""
+        where, params = self._month_filter(start_month, end_month, vehicle)
+        cols = self.VEHICLE_EXPENSE_SUMMARY_COLUMNS
+        row = self._select_tuples(
+            f"SELECT {', '.join(f'ROUND(TOTAL({c}), 2)' for c in cols)} "
+            f"FROM vehicle_expense_month_summary AS s {self.VEHICLE_JOIN_SQL} {where}", params)[0]
+        return dict(zip(cols, row))
+
+    def office_expense_totals(self) -> Dict[str, float]:
+        """Saved office expense totals across all months."""
+        cur = self.conn.execute('''
+            SELECT months, current_bill, manager_salary, office_rent, others, total
+            FROM office_expense_summary WHERE id = 1
+        ''')
+        row = cur.fetchone()
+        return dict(row) if row else {}
+
+    # ---------------- VEHICLE PROFITABILITY ----------------
+    # The per-month trip and vehicle expense summaries are stacked with UNION ALL
+    # and grouped, rather than joined, so a month with trips but no bills (or the
+    # other way round) still shows up.
+    VEHICLE_ROLLUP_SQL = '''
+        INSERT INTO vehicle_month_rollup
+            (vehicle_id, vehicle_no, month, trips, revenue, trip_expense, maintenance, loan, net)
+        SELECT vehicle_id, vehicle_no, month, SUM(trips), TOTAL(revenue), TOTAL(trip_expense),
+               TOTAL(maintenance), TOTAL(loan),
+               TOTAL(revenue) - TOTAL(trip_expense) - TOTAL(maintenance) - TOTAL(loan)
+        FROM (
+            SELECT vehicle_id, vehicle_no, month, trips, load_total AS revenue, expense AS trip_expense,
+                   0 AS maintenance, 0 AS loan
+            FROM trip_month_summary
+            UNION ALL
+            SELECT vehicle_id, vehicle_no, month, 0, 0, 0, total - loan, loan
+            FROM vehicle_expense_month_summary
+        )
+        WHERE month != ''
+        GROUP BY vehicle_id, vehicle_no, month
+    '''
+
+    def refresh_vehicle_rollup(self, force: bool = False):
+        """Rebuild vehicle_month_rollup if trips or vehicle expenses changed since the last build."""
+        stale = self._select_tuples(
+            "SELECT stale FROM cache_state WHERE name = 'vehicle_month_rollup'")
+        if not force and stale and not stale[0][0]:
+            return
+        c = self.conn.cursor()
+        c.execute("DELETE FROM vehicle_month_rollup")
+        c.execute(self.VEHICLE_ROLLUP_SQL)
+        c.execute("UPDATE cache_state SET stale = 0 WHERE name = 'vehicle_month_rollup'")
+        self.conn.commit()
+
+    def load_vehicle_rollup(self, start_month: str = None, end_month: str = None,
+                            vehicle: str = None) -> List[VehicleMonthRecord]:
+        """
+        Per-vehicle, per-month profitability, newest month first.
+        start_month / end_month are inclusive 'yyyy-mm' keys; vehicle is a substring match.
+        """
+        self.refresh_vehicle_rollup()
+        where, params = self._month_filter(start_month, end_month, vehicle)
+        rows = self._select_tuples(f'''
+            SELECT {self.VEHICLE_NAME_SQL} AS vehicle, s.month, s.trips, s.revenue, s.trip_expense,
+                   s.maintenance, s.loan, s.net
+            FROM vehicle_month_rollup AS s {self.VEHICLE_JOIN_SQL} {where}
+            ORDER BY s.month DESC, vehicle ASC
+        ''', params)
+        return [VehicleMonthRecord(*r) for r in rows]
+
+    # ---------------- EXTRACTS ----------------
+    # Full-table extracts for analysis: every stored column, with the trip
+    # detail JSON spread into one detail_* column per key.
+    EXTRACT_TABLES = {
+        "trips": ("trips", "date"),
+        "vehicle-expenses": ("vehicle_expenses", "date"),
+        "office-expenses": ("office_expenses", "period"),
+    }
+
+    def trip_detail_keys(self) -> List[str]:
+        """Every key used in trips.detail_json, in first-seen order."""
+        rows = self._select_tuples('''
+            SELECT j.key FROM trips, json_each(trips.detail_json) AS j
+            WHERE json_valid(trips.detail_json) AND json_type(trips.detail_json) = 'object'
+            GROUP BY j.key ORDER BY MIN(trips.id), MIN(j.id)
+        ''')
+        return [r[0] for r in rows]
+
+    def _extract_fields(self, name: str, detail_keys) -> tuple:
+        """(columns, types, select expressions, select params) of an extract."""
+        table, _ = self.EXTRACT_TABLES[name]
+        kinds = {"INTEGER": "int", "REAL": "float"}
+        columns, types, select, params = [], [], [], []
+        for _, col, decl, *_ in self._select_tuples(f"PRAGMA table_info({table})"):
+            if col == "detail_json":
+                continue
+            columns.append(col)
+            types.append(kinds.get(decl.upper(), "str"))
+            # REAL affinity keeps blank amounts ('') as text; read them as numbers
+            select.append(_amount_sql(col) if types[-1] == "float" else col)
+        if table == "trips":
+            for key in detail_keys:
+                col = "detail_" + (re.sub(r"[^0-9a-z]+", "_", key.lower()).strip("_") or "field")
+                while col in columns:
+                    col += "_"
+                columns.append(col)
+                types.append("str")
+                # The key is bound, not spliced into the SQL. A JSON path cannot
+                # quote a key holding '"', so those are looked up with json_each.
+                if '"' in key:
+                    select.append("CAST(CASE WHEN json_valid(detail_json) THEN (SELECT value FROM "
+                                  "json_each(detail_json) WHERE key = ?) END AS TEXT)")
+                    params.append(key)
+                else:
+                    select.append("CAST(CASE WHEN json_valid(detail_json) THEN json_extract(detail_json, ?) END AS TEXT)")
+                    params.append(f'$."{key}"')
+        return columns, types, select, params
+
+    def extract_columns(self, name: str) -> tuple:
+        """(columns, column types, detail keys) of an EXTRACT_TABLES extract; types are
+        'int'/'float'/'str'. Pass the detail keys back to extract_page."""
+        keys = self.trip_detail_keys() if name == "trips" else []
+        columns, types, _, _ = self._extract_fields(name, keys)
+        return columns, types, keys
+
+    def extract_page(self, name: str, detail_keys=(), start_date: str = None, end_date: str = None,
+                     after=None, limit: int = -1) -> List[tuple]:
+        """Up to `limit` rows (-1 = all) of an extract, in (date, id) order, starting after
+        the (date, id) key `after`. Columns are as extract_columns gives them."""
+        table, date_col = self.EXTRACT_TABLES[name]
+        if date_col == "period":
+            start_date, end_date = start_date and start_date[:7], end_date and end_date[:7]
+        _, _, select, params = self._extract_fields(name, detail_keys)
+        where, where_params = self._date_filter(start_date, end_date, date_col)
+        params += where_params
+        if after:
+            # NULL dates sort first and never compare, so seek past them by id alone
+            if after[0] is None:
+                where += f" AND (({date_col} IS NULL AND id > ?) OR {date_col} IS NOT NULL)"
+                params.append(after[1])
+            else:
+                where += f" AND ({date_col}, id) > (?, ?)"
+                params += list(after)
+        sql = f"SELECT {', '.join(select)} FROM {table} {where} ORDER BY {date_col}, id LIMIT ?"
+        return self._select_tuples(sql, params + [limit])
+
+    # ---------------- MAINTENANCE ----------------
+    def backup_to(self, path: str):
+        """Consistent copy of the live database into `path` (overwritten)."""
+        dest = sqlite3.connect(path)
+        try:
+            self.conn.backup(dest)
+        finally:
+            dest.close()
+
+    def vacuum(self):
+        self.conn.commit()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        # Older files were created without auto_vacuum; VACUUM applies the switch
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("VACUUM")
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """Idle-time upkeep: fold the WAL back into the file, refresh planner
+        statistics and hand free pages back to the filesystem."""
+        self.conn.commit()
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Files from before auto_vacuum was set get switched to INCREMENTAL once
+            self.vacuum()
+        self.conn.execute(f"PRAGMA analysis_limit = {self.ANALYSIS_LIMIT}")
+        self.conn.execute("ANALYZE")
+        self.conn.execute("PRAGMA optimize")
+        free_pages = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages < self.VACUUM_MIN_FREE_PAGES:
+            free_pages = 0
+        else:
+            # executescript steps the pragma to completion; execute() frees one page.
+            self.conn.executescript(f"PRAGMA incremental_vacuum({free_pages});")
         self.conn.commit()
+        wal_path = self.dbpath + "-wal"
+        wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        # Last, so the pages written above are folded in too
+        busy = self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+        return {"checkpoint_busy": busy, "wal_bytes": wal_bytes, "freed_pages": free_pages}
+
+    def integrity_check(self) -> List[str]:
+        """Problems reported by SQLite's integrity and foreign key checks ([] when healthy)."""
+        problems = [r[0] for r in self._select_tuples("PRAGMA integrity_check") if r[0] != "ok"]
+        problems += [f"foreign key: {r[0]} row {r[1]} -> {r[2]}"
+                     for r in self._select_tuples("PRAGMA foreign_key_check")]
+        return problems
 
     # ---------------- Helpers ----------------
+    def _select_tuples(self, sql: str, params=()) -> List[tuple]:
+        """Run a projected query returning plain tuples instead of sqlite3.Row."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return cur.execute(sql, params).fetchall()
+
+    def _iter_tuples(self, sql: str, params=(), chunk: int = 500):
+        """Like _select_tuples but streams rows from the cursor chunk by chunk."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        cur.execute(sql, params)
+        while rows := cur.fetchmany(chunk):
+            yield from rows
+
     def row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         return dict(row) if row is not None else {}
 
@@ -438,20 +1935,884 @@ class DBManager:
 # ======== END OF DB SECTION ==================================================
 
 
-# Optional PDF / Excel export dependencies
-try:
-    from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.pdfgen import canvas
+# ======== BACKUP SECTION =====================================================
+# Point-in-time snapshots of the live database taken with SQLite's online
+# backup API. Pages are copied in small steps from a separate read
+# connection, so the app keeps reading and writing while a snapshot runs.
+import threading
+
+BACKUP_DIR_NAME = "backups"
+BACKUP_INTERVAL_MINUTES = 60
+BACKUP_KEEP = 24
+BACKUP_PAGES_PER_STEP = 256
+
+
+class BackupService:
+    """Timestamped snapshots of one database file, rotated to the newest `keep`."""
+
+    def __init__(self, dbpath: str, backup_dir: str = None, keep: int = BACKUP_KEEP):
+        self.dbpath = os.path.abspath(dbpath)
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(self.dbpath), BACKUP_DIR_NAME)
+        self.keep = keep
+        self.prefix = os.path.splitext(os.path.basename(self.dbpath))[0] + "-"
+        self.last_error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def list_backups(self) -> List[str]:
+        """Snapshot files, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = [n for n in os.listdir(self.backup_dir) if n.startswith(self.prefix) and n.endswith(".db")]
+        return [os.path.join(self.backup_dir, n) for n in sorted(names, reverse=True)]
+
+    def backup_now(self) -> str:
+        """Write a new snapshot and prune old ones; returns the snapshot path."""
+        with self._lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.backup_dir, f"{self.prefix}{stamp}.db")
+            n = 2
+            while os.path.exists(path):
+                path = os.path.join(self.backup_dir, f"{self.prefix}{stamp}_{n}.db")
+                n += 1
+            partial = path + ".part"
+            source = sqlite3.connect(f"file:{self.dbpath}?mode=ro", uri=True)
+            dest = sqlite3.connect(partial)
+            try:
+                # Hold one WAL read snapshot for the whole copy: writers carry on,
+                # and their commits don't restart the backup half way through.
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                source.backup(dest, pages=BACKUP_PAGES_PER_STEP, sleep=0.05)
+                source.rollback()
+                # Snapshots are single self-contained files, not WAL databases
+                dest.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                dest.close()
+                source.close()
+            os.replace(partial, path)
+            self.prune()
+            return path
+
+    def prune(self) -> List[str]:
+        """Delete snapshots beyond the newest `keep`; returns the removed paths."""
+        removed = self.list_backups()[self.keep:] if self.keep > 0 else []
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def start(self) -> bool:
+        """Take a snapshot on a background thread; False if one is already running."""
+        if self.running():
+            return False
+        self._thread = threading.Thread(target=self._run, name="kts-backup", daemon=True)
+        self._thread.start()
+        return True
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.backup_now()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            print(f"Backup failed: {e}", file=sys.stderr)
+
+    @staticmethod
+    def restore(backup_path: str, dbpath: str, safety_copy: bool = True) -> str | None:
+        """Copy a snapshot back over `dbpath` after checking it; returns where the replaced
+        database was moved (None if it was empty or safety_copy is off). Run with the app closed."""
+        if not os.path.isfile(backup_path):
+            raise FileNotFoundError(f"Backup not found: {backup_path}")
+        source = sqlite3.connect(f"file:{os.path.abspath(backup_path)}?mode=ro", uri=True)
+        try:
+            result = source.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise ValueError(f"{backup_path} failed integrity check: {result}")
+            # The database being replaced may be corrupt, so it is not opened:
+            # the file and its -wal/-shm move aside whole and the snapshot is
+            # copied into a fresh file. Kept outside the snapshot folder so
+            # rotation never removes it; without safety_copy it is deleted.
+            aside = f"{dbpath}.{datetime.now():%Y%m%d-%H%M%S}.before-restore"
+            moved = []
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(dbpath + suffix):
+                    os.replace(dbpath + suffix, aside + suffix)
+                    moved.append(suffix)
+            try:
+                dest = sqlite3.connect(dbpath)
+                try:
+                    source.backup(dest)
+                    dest.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                finally:
+                    dest.close()
+            except Exception:
+                # Put the original back rather than leave a half-written file
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(dbpath + suffix):
+                        os.remove(dbpath + suffix)
+                for suffix in moved:
+                    os.replace(aside + suffix, dbpath + suffix)
+                raise
+            saved = aside if "" in moved and os.path.getsize(aside) else None
+            if not safety_copy or saved is None:
+                for suffix in moved:
+                    os.remove(aside + suffix)
+                saved = None
+        finally:
+            source.close()
+        return saved
+
+# ======== END OF BACKUP SECTION ==============================================
+
+
+# ======== DATA SERVICE SECTION ===============================================
+# Lets several desktops share one database. `kts.py serve` wraps a pool of
+# DBManager connections in a small HTTP/JSON service; the desktop app started
+# with --server URL talks to it through RemoteDBManager, which mirrors the
+# DBManager methods listed in RPC_METHODS.
+#
+#   POST /rpc      {"method": "save_trip", "params": [...]}  or a list of
+#                  such calls (one round trip, run in order on one connection)
+#   GET  /changes?since=N&timeout=S
+#                  long-poll; answers with the ChangeEvents (as [table, id, op])
+#                  published after version N
+import queue
+import socket
+import hmac
+import ipaddress
+import http.client
+import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICE_PORT = 8765
+SERVICE_POOL_SIZE = 4
+SERVICE_POLL_SECONDS = 25
+SERVICE_TOKEN_ENV = "KTS_SERVICE_TOKEN"
+
+# DBManager methods callable over the service
+RPC_METHODS = frozenset({
+    "verify_login", "update_password", "user_exists",
+    "create_session", "resume_session", "save_session_page",
+    "load_trip_list", "iter_trip_list", "load_trip_list_row", "load_trip_detail",
+    "trip_ids_between", "load_trip_page", "extract_columns", "extract_page", "trip_filter_suggestions", "load_value_dictionary", "trip_totals", "save_trip", "update_trip", "delete_trip",
+    "load_vehicle_expense_list", "iter_vehicle_expense_list", "vehicle_expense_ids_between",
+    "vehicle_expense_total", "load_vehicle_expense_row", "save_vehicle_expense", "update_vehicle_expense", "delete_vehicle_expense",
+    "load_office_expense_list", "load_office_expense_row", "save_office_expense", "update_office_expense", "delete_office_expense",
+    "save_vehicle_driver_details", "update_vehicle_driver_details", "rename_vehicle",
+    "load_vehicle_driver_details", "load_all_vehicle_driver_details", "delete_vehicle_driver_details",
+    "vehicle_trip_activity",
+    "load_outstanding_trips", "load_broker_statement_trips", "receivables_aging",
+    "trip_summary", "vehicle_expense_summary", "office_expense_totals",
+    "refresh_vehicle_rollup", "load_vehicle_rollup", "integrity_check", "search",
+})
+
+# Tables whose ChangeEvents views follow; clients that fall behind the feed get
+# a 'reload' event for each
+CHANGE_TABLES = ("trips", "vehicle_expenses", "office_expenses", "vehicle_driver_details")
+
+RPC_RECORDS = {cls.__name__: cls for cls in (
+    TripRecord, VehicleExpenseRecord, OfficeMonthRecord, VehicleMonthRecord, ReceivableAgingRecord,
+    SearchHit)}
+
+
+class DataServiceError(RuntimeError):
+    """A call the data service rejected or could not run."""
+
+
+def _rpc_encode(value):
+    """JSON-ready form of a DBManager argument or result (records, rows, sets, generators)."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if type(value).__name__ in RPC_RECORDS:
+        return {"__record__": type(value).__name__,
+                "values": [_rpc_encode(getattr(value, s)) for s in value.__slots__]}
+    if isinstance(value, sqlite3.Row):
+        return {k: _rpc_encode(value[k]) for k in value.keys()}
+    if isinstance(value, dict):
+        return {k: _rpc_encode(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": [_rpc_encode(v) for v in value]}
+    return [_rpc_encode(v) for v in value]   # lists, tuples, generators
+
+
+def _rpc_decode(value):
+    if isinstance(value, list):
+        return [_rpc_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "__record__" in value:
+        cls = RPC_RECORDS[value["__record__"]]
+        record = cls.__new__(cls)
+        for slot, v in zip(cls.__slots__, value["values"]):
+            setattr(record, slot, _rpc_decode(v))
+        return record
+    if "__set__" in value:
+        return set(_rpc_decode(value["__set__"]))
+    return {k: _rpc_decode(v) for k, v in value.items()}
+
+
+class DBManagerPool:
+    """Fixed set of DBManager connections handed out one request at a time."""
+
+    def __init__(self, dbpath: str, size: int = SERVICE_POOL_SIZE):
+        self._idle = queue.Queue()
+        self._all = [DBManager(dbpath) for _ in range(max(1, size))]
+        for db in self._all:
+            self._idle.put(db)
+
+    @contextmanager
+    def connection(self):
+        db = self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put(db)
+
+    def close(self):
+        for db in self._all:
+            db.conn.close()
+
+
+class ChangeFeed:
+    """Version counter plus the recent (version, [table, row id, op]) entries for long-polling clients."""
+
+    def __init__(self, history: int = 256):
+        self.version = 0
+        self._recent = deque(maxlen=history)
+        self._cond = threading.Condition()
+
+    def publish(self, events: List[ChangeEvent]):
+        with self._cond:
+            for event in events:
+                self.version += 1
+                self._recent.append((self.version, [event.table, event.row_id, event.op]))
+            self._cond.notify_all()
+
+    def wait(self, since: int, timeout: float) -> tuple:
+        """(current version, events after `since`); waits up to `timeout` for one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since, timeout)
+            oldest = self._recent[0][0] if self._recent else self.version + 1
+            if since + 1 < oldest and self.version > since:
+                events = [[table, None, "reload"] for table in CHANGE_TABLES]
+            else:
+                events = [e for v, e in self._recent if v > since]
+            return self.version, events
+
+
+class DataServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so clients reuse one socket
+    timeout = 300                   # drop sockets idle for longer than this
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_POST(self):
+        if not self._accept():
+            return
+        if self.path != "/rpc":
+            return self._send(404, {"error": "not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON"})
+        service = self.server.service
+        if isinstance(body, list):
+            self._send(200, service.call_many(body))
+        else:
+            self._send(200, service.call_many([body])[0])
+
+    def do_GET(self):
+        if not self._accept():
+            return
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/changes":
+            return self._send(404, {"error": "not found"})
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            since = int(query.get("since", ["0"])[0])
+            timeout = min(float(query.get("timeout", [SERVICE_POLL_SECONDS])[0]), SERVICE_POLL_SECONDS)
+        except ValueError:
+            return self._send(400, {"error": "bad since/timeout"})
+        version, events = self.server.service.changes.wait(since, timeout)
+        self._send(200, {"version": version, "events": events})
+
+    def _accept(self) -> bool:
+        service = self.server.service
+        if service.stopped:
+            # Hang up without answering; the client reconnects to the next server
+            self.close_connection = True
+            return False
+        token = service.token
+        if token and not hmac.compare_digest(self.headers.get("X-KTS-Token", "").encode(), token.encode()):
+            self._send(403, {"error": "bad token"})
+            return False
+        return True
+
+    def _send(self, status: int, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DataService:
+    """HTTP/JSON front for a database file; one pooled DBManager per request."""
+
+    def __init__(self, dbpath: str, host: str = "127.0.0.1", port: int = SERVICE_PORT,
+                 pool_size: int = SERVICE_POOL_SIZE, token: str = None):
+        if not token and not self.is_loopback(host):
+            # Any machine that can reach the port could reset passwords
+            raise ValueError(f"Set {SERVICE_TOKEN_ENV} (or --token) before serving on {host or 'all addresses'}")
+        self.pool = DBManagerPool(dbpath, pool_size)
+        self.changes = ChangeFeed()
+        self.token = token
+        self.stopped = False
+        self.httpd = ThreadingHTTPServer((host, port), DataServiceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+
+    @staticmethod
+    def is_loopback(host: str) -> bool:
+        if host == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def call_many(self, calls: List[dict]) -> List[dict]:
+        """Run calls in order on one pooled connection; one {"result"} or {"error"} each."""
+        results, events = [], []
+        with self.pool.connection() as db:
+            unsubscribe = db.changes.subscribe(events.append)
+            for call in calls:
+                method = call.get("method") if isinstance(call, dict) else None
+                if method not in RPC_METHODS:
+                    results.append({"error": {"type": "DataServiceError",
+                                              "message": f"unknown method {method!r}"}})
+                    continue
+                try:
+                    value = getattr(db, method)(*_rpc_decode(call.get("params", [])))
+                    results.append({"result": _rpc_encode(value)})
+                except Exception as e:
+                    db.conn.rollback()
+                    results.append({"error": {"type": type(e).__name__, "message": str(e)}})
+            unsubscribe()
+        if events:
+            self.changes.publish(events)
+        return results
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.stopped = True
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.pool.close()
+
+
+class RemoteDBManager:
+    """Client for DataService with the same method names as DBManager (see RPC_METHODS)."""
+
+    def __init__(self, url: str, token: str = None, timeout: float = 30):
+        parts = urllib.parse.urlsplit(url if "://" in url else "http://" + url)
+        self.host, self.port = parts.hostname, parts.port or SERVICE_PORT
+        self.dbpath = f"http://{self.host}:{self.port}"
+        self.token = token if token is not None else os.environ.get(SERVICE_TOKEN_ENV)
+        self.timeout = timeout
+        self._local = threading.local()
+        # Fed from the service's change feed by ChangeWatcher
+        self.changes = ChangeBus()
+        self.values = ValueDictionary(self)
+
+    def __getattr__(self, name):
+        if name not in RPC_METHODS:
+            raise AttributeError(f"{name} is not available through the data service")
+        return lambda *params: self.call(name, *params)
+
+    def call(self, method: str, *params):
+        return self._unwrap(self._request("POST", "/rpc", {"method": method, "params": _rpc_encode(params)}))
+
+    def call_many(self, calls) -> list:
+        """Send [(method, params), ...] in one round trip; raises on the first failed call."""
+        payload = [{"method": m, "params": _rpc_encode(p)} for m, p in calls]
+        return [self._unwrap(r) for r in self._request("POST", "/rpc", payload)]
+
+    def wait_for_changes(self, since: int, timeout: float = SERVICE_POLL_SECONDS) -> tuple:
+        """(version, [[table, row id, op], ...]) from the service's change feed; see ChangeFeed.wait."""
+        reply = self._request("GET", f"/changes?since={since}&timeout={timeout}",
+                              read_timeout=timeout + 10)
+        return reply["version"], reply["events"]
+
+    def _unwrap(self, reply: dict):
+        if "error" in reply:
+            err = reply["error"]
+            raise DataServiceError(f"{err['type']}: {err['message']}")
+        return _rpc_decode(reply["result"])
+
+    def _request(self, verb: str, path: str, payload=None, read_timeout: float = None):
+        body = None if payload is None else json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-KTS-Token"] = self.token
+        for attempt in (1, 2):
+            # One keep-alive connection per thread; reconnect once if the server dropped it
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                conn.connect()
+                conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.timeout = read_timeout or self.timeout
+            reused = conn.sock is not None
+            if reused:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(verb, path, body, headers)
+                response = conn.getresponse()
+                data = json.loads(response.read())
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                if not reused or attempt == 2:
+                    raise
+                continue
+            if response.status != 200:
+                raise DataServiceError(data.get("error", f"HTTP {response.status}"))
+            return data
+
+# ======== END OF DATA SERVICE SECTION ========================================
+
+
+# ======== ANALYTICS SECTION ==================================================
+# Trip totals for record lists that are not in the database. Saved trips are
+# totalled from the trigger-maintained summary tables (DBManager.trip_summary).
+
+def summarize_trips(records) -> Dict[str, float]:
+    """Rupee totals (total, driver_amount, expense, profit, unpaid) of TripRecords."""
+    records = list(records)
+    return {
+        "total": sum(r.total for r in records),
+        "driver_amount": sum(r.driver_amount for r in records),
+        "expense": sum(r.expense for r in records),
+        "profit": sum(r.profit for r in records),
+        "unpaid": sum(r.unpaid for r in records),
+    }
+
+# ======== END OF ANALYTICS SECTION ===========================================
+
+
+# ======== BROKER STATEMENTS SECTION ==========================================
+# Month-end statements: one PDF per broker office, built from a single query
+# ordered by (broker_office, date) and written by a pool of worker threads.
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import attrgetter
+
+STATEMENT_WORKERS = min(8, os.cpu_count() or 1)
+
+STATEMENT_HEADERS = ["Date", "Vehicle No", "From - To", "Load Amount", "Advance",
+                     "Broker Amt", "Return", "Balance"]
+
+
+def _statement_filename(broker_office: str) -> str:
+    """Filesystem-safe PDF name for a broker office."""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", broker_office.strip()).strip("._")
+    return f"statement_{name or 'no_broker'}.pdf"
+
+
+def write_broker_statement(path: str, broker_office: str, trips: List[TripRecord], period: str = "") -> str:
+    """Write one broker's statement PDF (trips, amounts, advances, balance) and return its path."""
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib import colors
-    from reportlab.platypus import Table, TableStyle
-    import pandas as pd
-    try:
-        from openpyxl import Workbook
+    from reportlab.lib.units import inch
+
+    data = [STATEMENT_HEADERS]
+    for t in trips:
+        data.append([
+            format_date_for_display(t.date), t.vehicle_no, t.location_from_to,
+            show_int_amount(t.total), show_int_amount(t.trip_advance),
+            show_int_amount(t.broker_amount), show_int_amount(t.return_balance),
+            show_int_amount(t.unpaid),
+        ])
+    data.append([
+        "TOTAL", "", "",
+        show_int_amount(sum(t.total for t in trips)),
+        show_int_amount(sum(t.trip_advance for t in trips)),
+        show_int_amount(sum(t.broker_amount for t in trips)),
+        show_int_amount(sum(t.return_balance for t in trips)),
+        show_int_amount(sum(t.unpaid for t in trips)),
+    ])
+
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph("KTS TRANSPORT", styles["Title"]),
+        Paragraph(f"Statement for {broker_office or 'No Broker Office'}", styles["Heading2"]),
+        Paragraph(f"{period + ' · ' if period else ''}Generated {datetime.now().strftime('%d-%m-%Y')}",
+                  styles["Normal"]),
+        Spacer(1, 0.2 * inch),
+    ]
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(table)
+
+    doc = SimpleDocTemplate(path, pagesize=landscape(letter),
+                            rightMargin=0.5 * inch, leftMargin=0.5 * inch,
+                            topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+    doc.build(story)
+    return path
+
+
+def generate_broker_statements(db, out_dir: str, start_date: str = None, end_date: str = None,
+                               outstanding_only: bool = False, workers: int = None) -> List[str]:
+    """
+    Write a statement PDF for every broker office with trips in the period into out_dir.
+    Dates are yyyy-mm-dd (inclusive, optional). Returns the written paths.
+    """
+    trips = db.load_broker_statement_trips(start_date, end_date, outstanding_only)
+    period = " to ".join(format_date_for_display(d) for d in (start_date, end_date) if d)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs, used = [], set()
+    for broker, group in groupby(trips, key=attrgetter("broker_office")):
+        name = _statement_filename(broker)
+        n = 1
+        # Brokers that only differ in punctuation or case (one file on Windows/macOS)
+        while name.lower() in used:
+            n += 1
+            name = _statement_filename(f"{broker}_{n}")
+        used.add(name.lower())
+        jobs.append((os.path.join(out_dir, name), broker, list(group)))
+    with ThreadPoolExecutor(max_workers=workers or STATEMENT_WORKERS) as pool:
+        futures = [pool.submit(write_broker_statement, path, broker, group, period)
+                   for path, broker, group in jobs]
+        return [f.result() for f in futures]
+
+# ======== END OF BROKER STATEMENTS SECTION ===================================
+
+
+# ======== REPORT PIPELINE SECTION ============================================
+# Exports run as   source (records from a DB iterator) -> row transform
+#                  -> column totals -> sink (csv / xlsx / pdf)
+# so every format gets the same rows, independent of what a page shows.
+
+EXPORT_FORMATS = ("xlsx", "pdf", "csv")
+
+
+class ReportSpec:
+    """What a report contains: title, column headers, record -> row transform, summed columns."""
+    __slots__ = ('title', 'headers', 'row', 'total_columns')
+
+    def __init__(self, title, headers, row, total_columns):
+        self.title = title
+        self.headers = headers
+        self.row = row
+        self.total_columns = total_columns
+
+
+TRIP_REPORT = ReportSpec(
+    "Trip Data",
+    ["Load Date", "Location From - To", "Vehicle No", "Broker Office",
+     "Load Amt", "Driver Amt", "Expenses", "Profit", "Status"],
+    lambda t: [format_date_for_display(t.date), t.location_from_to, t.vehicle_no, t.broker_office,
+               t.total, t.driver_amount, t.expense, t.profit, t.unpaid],
+    (4, 5, 6, 7, 8),
+)
+
+VEHICLE_EXPENSE_REPORT = ReportSpec(
+    "Vehicle Expenses",
+    ["Date", "Vehicle", "FC", "Tyre Amt", "Tyre Type", "Tax", "Tax Type",
+     "Spare", "Type", "Loan", "Insurance", "Others", "Remarks", "Total"],
+    lambda r: [r.date, r.vehicle_no, r.fc_expense, r.tyre_amount, r.tyre_type,
+               r.tax, r.tax_type, r.spare_work, r.spare_type, r.loan,
+               r.insurance, r.others, r.remarks, r.total],
+    (2, 3, 5, 7, 9, 10, 11, 13),
+)
+
+OFFICE_EXPENSE_REPORT = ReportSpec(
+    "Office Expenses",
+    ["Month", "Current Bill", "Manager Salary", "Office Expenses", "Other Expenses", "Total"],
+    lambda r: [r.month, r.current_bill, r.manager_salary, r.office_rent, r.others, r.total],
+    (1, 2, 3, 4, 5),
+)
+
+
+class ColumnTotals:
+    """Running sums of a report's total_columns."""
+
+    def __init__(self, spec: ReportSpec):
+        self.width = len(spec.headers)
+        self.sums = dict.fromkeys(spec.total_columns, 0.0)
+        self.count = 0
+
+    def add(self, row: list):
+        self.count += 1
+        for col in self.sums:
+            self.sums[col] += row[col]
+
+    def row(self) -> list:
+        return ["TOTAL"] + [self.sums.get(col, "") for col in range(1, self.width)]
+
+
+def _pdf_cell(value) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value == int(value) else f"{value:.2f}"
+    return str(value)
+
+
+class CsvSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self, title: str, headers: List[str]):
+        import csv
+        self.file = open(self.path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(headers)
+
+    def write(self, row: list):
+        self.writer.writerow(row)
+
+    def close(self, totals: list = None):
+        if totals:
+            self.writer.writerow(totals)
+        self.file.close()
+
+
+class XlsxSink:
+    """Streams rows into a write-only openpyxl workbook (pandas if openpyxl is missing)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self, title: str, headers: List[str]):
+        self.title = title[:31]
+        self.headers = headers
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            self.wb, self.rows = None, []
+            return
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(self.title)
+        self.ws.append(self._bold(headers, center=True))
+
+    def _bold(self, values: list, center: bool = False) -> list:
+        from openpyxl.cell import WriteOnlyCell
         from openpyxl.styles import Font, Alignment
-    except ImportError:
-        print("openpyxl not found – Excel export will use pandas.")
-except ImportError:
+        cells = []
+        for v in values:
+            cell = WriteOnlyCell(self.ws, value=v)
+            cell.font = Font(bold=True)
+            if center:
+                cell.alignment = Alignment(horizontal="center")
+            cells.append(cell)
+        return cells
+
+    def write(self, row: list):
+        if self.wb is None:
+            self.rows.append(row)
+        else:
+            self.ws.append(row)
+
+    def close(self, totals: list = None):
+        if self.wb is None:
+            import pandas as pd
+            pd.DataFrame(self.rows + ([totals] if totals else []), columns=self.headers).to_excel(
+                self.path, index=False, sheet_name=self.title)
+            return
+        if totals:
+            self.ws.append(self._bold(totals))
+        self.wb.save(self.path)
+
+
+class PdfSink:
+    """Landscape reportlab table; rows are buffered because the table is laid out at the end."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self, title: str, headers: List[str]):
+        if importlib.util.find_spec("reportlab") is None:  # fail before any row is read
+            raise ImportError("No module named 'reportlab'")
+        self.data = [headers]
+
+    def write(self, row: list):
+        self.data.append([_pdf_cell(v) for v in row])
+
+    def close(self, totals: list = None):
+        from reportlab.lib.pagesizes import landscape, letter
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+        style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]
+        if totals:
+            self.data.append([_pdf_cell(v) for v in totals])
+            style += [
+                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, -1), (-1, -1), 11),
+            ]
+        table = Table(self.data, repeatRows=1)
+        table.setStyle(TableStyle(style))
+        SimpleDocTemplate(self.path, pagesize=landscape(letter),
+                          rightMargin=0.5 * inch, leftMargin=0.5 * inch,
+                          topMargin=0.5 * inch, bottomMargin=0.5 * inch).build([table])
+
+
+SINKS = {"csv": CsvSink, "xlsx": XlsxSink, "pdf": PdfSink}
+
+
+def run_report(spec: ReportSpec, records, sink) -> int:
+    """Feed records through spec's transform and totals into sink; returns the row count."""
+    totals = ColumnTotals(spec)
+    sink.open(spec.title, spec.headers)
+    for record in records:
+        row = spec.row(record)
+        totals.add(row)
+        sink.write(row)
+    sink.close(totals.row())
+    return totals.count
+
+
+def _export_format(path: str, fmt: str = None) -> str:
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Export format must be one of {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+
+def export_report(spec: ReportSpec, records, path: str, fmt: str = None) -> int:
+    """Write records to path in fmt (taken from the extension when not given)."""
+    return run_report(spec, records, SINKS[_export_format(path, fmt)](path))
+
+
+def export_trips(db, path: str, fmt: str = None, start_date: str = None, end_date: str = None) -> int:
+    """Export trips dated start_date..end_date (yyyy-mm-dd, inclusive); returns the row count."""
+    return export_report(TRIP_REPORT, db.iter_trip_list(start_date, end_date), path, fmt)
+
+
+def export_vehicle_expenses(db, path: str, fmt: str = None, start_date: str = None, end_date: str = None) -> int:
+    """Export vehicle expenses dated start_date..end_date; returns the row count."""
+    return export_report(VEHICLE_EXPENSE_REPORT, db.iter_vehicle_expense_list(start_date, end_date), path, fmt)
+
+
+def export_office_expenses(db, path: str, fmt: str = None, start_date: str = None, end_date: str = None) -> int:
+    """Export office months whose period falls in the date range (all months if no range)."""
+    records = db.load_office_expense_list(start_date and start_date[:7], end_date and end_date[:7])
+    return export_report(OFFICE_EXPENSE_REPORT, records, path, fmt)
+
+# ---------------- Bulk extracts (csv / parquet / arrow) ----------------
+EXTRACT_FORMATS = ("csv", "parquet", "arrow")
+EXTRACT_CHUNK = 10000
+
+
+class ArrowSink:
+    """Columnar Parquet or Arrow IPC file, written one record batch per chunk (needs pyarrow)."""
+
+    def __init__(self, path: str, types: List[str], fmt: str = "parquet"):
+        import pyarrow as pa
+        self.pa = pa
+        self.path = path
+        self.fmt = fmt
+        self.arrow_types = [{"int": pa.int64(), "float": pa.float64()}.get(t, pa.string()) for t in types]
+
+    def open(self, title: str, headers: List[str]):
+        pa = self.pa
+        self.schema = pa.schema(list(zip(headers, self.arrow_types)))
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(self.path, self.schema)
+
+    def write_many(self, rows: List[tuple]):
+        if not rows:
+            return
+        columns = [self.pa.array(col, type=t) for col, t in zip(zip(*rows), self.arrow_types)]
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+
+    def close(self, totals: list = None):
+        self.writer.close()
+
+
+def extract_table(db, name: str, path: str, fmt: str = None, start_date: str = None,
+                  end_date: str = None, chunk: int = EXTRACT_CHUNK) -> int:
+    """Stream one of DBManager.EXTRACT_TABLES to csv/parquet/arrow in chunks; returns the row count."""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt == "feather":
+        fmt = "arrow"
+    if fmt not in EXTRACT_FORMATS:
+        raise ValueError(f"Extract format must be one of {', '.join(EXTRACT_FORMATS)}")
+    columns, types, detail_keys = db.extract_columns(name)
+    date_at = columns.index(DBManager.EXTRACT_TABLES[name][1])
+    id_at = columns.index("id")
+    if fmt == "csv":
+        sink = CsvSink(path)
+        write_many = lambda rows: sink.writer.writerows(rows)
+    else:
+        sink = ArrowSink(path, types, fmt)
+        write_many = sink.write_many
+    # Paged by (date, id) so the data service can serve it a chunk per call
+    count, after = 0, None
+    sink.open(name, columns)
+    try:
+        while rows := db.extract_page(name, detail_keys, start_date, end_date, after, chunk):
+            write_many(rows)
+            count += len(rows)
+            if len(rows) < chunk:
+                break
+            after = (rows[-1][date_at], rows[-1][id_at])
+    finally:
+        sink.close()
+    return count
+
+# ======== END OF REPORT PIPELINE SECTION =====================================
+
+
+# Optional PDF / Excel export dependencies, imported where they are used
+if importlib.util.find_spec("reportlab") is None or importlib.util.find_spec("pandas") is None:
     print("ReportLab/pandas not found – PDF & Excel export disabled.")
+elif importlib.util.find_spec("openpyxl") is None:
+    print("openpyxl not found – Excel export will use pandas.")
 
 
 # ----------------------------------------------------------------------
@@ -481,30 +2842,142 @@ def show_int_amount(value: str | float) -> str:
 
 
 
-def parse_date_from_display(date_str):
-    """Parse date from dd-mm-yyyy format to datetime object"""
+# Date codec shared by the pages and exporters. Tables repeat the same few
+# hundred dates, so results are memoised; the fixed-width layouts are sliced
+# directly and strptime is only the fallback for anything else.
+DATE_CACHE_SIZE = 4096
+
+def _fixed_width_date(text):
+    """'dd-mm-yyyy' or 'yyyy-mm-dd' to a date without strptime; None if the layout does not match."""
+    if len(text) != 10:
+        return None
     try:
-        return datetime.strptime(date_str, "%d-%m-%Y").date()
-    except:
+        if text[2] == "-" and text[5] == "-":
+            return datetime(int(text[6:]), int(text[3:5]), int(text[:2])).date()
+        if text[4] == "-" and text[7] == "-":
+            return datetime(int(text[:4]), int(text[5:7]), int(text[8:])).date()
+    except ValueError:
+        pass
+    return None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_from_display(date_str):
+    """Parse dd-mm-yyyy (or stored yyyy-mm-dd) text to a date; None if it is neither."""
+    text = str(date_str or "").strip()
+    parsed = _fixed_width_date(text)
+    if parsed:
+        return parsed
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):  # non-padded forms like 5-3-2025
         try:
-            # Fallback for yyyy-mm-dd format (for backward compatibility)
-            return datetime.strptime(date_str, "%Y-%m-%d").date()
-        except:
-            return None
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _display_date_text(date_str):
+    parsed = parse_date_from_display(date_str)
+    if parsed:
+        return f"{parsed.day:02d}-{parsed.month:02d}-{parsed.year:04d}"
+    return date_str
 
 def format_date_for_display(date_obj):
     """Format date object to dd-mm-yyyy string"""
     if isinstance(date_obj, str):
         # If it's already a string, try to parse and reformat
-        parsed_date = parse_date_from_display(date_obj)
-        if parsed_date:
-            return parsed_date.strftime("%d-%m-%Y")
-        return date_obj
+        return _display_date_text(date_obj)
     elif hasattr(date_obj, 'strftime'):
         return date_obj.strftime("%d-%m-%Y")
     else:
         return str(date_obj)
 
+def watch_changes(widget, db, handler):
+    """Subscribe `handler` to db.changes (see ChangeBus) for as long as `widget` exists."""
+    unsubscribe = db.changes.subscribe(handler)
+    widget.destroyed.connect(lambda *_: unsubscribe())
+
+# Quiet time after the last keystroke before a type-ahead query runs
+TYPEAHEAD_DELAY_MS = 150
+
+
+class DebouncedQuery(QObject):
+    """Runs query(*args) once requests have been quiet for delay_ms and hands
+    the result to on_result on the GUI thread. A newer request makes any
+    query still in flight stale, and stale results are dropped. With
+    threaded=True (remote databases) queries run on a worker thread."""
+
+    finished = pyqtSignal(int, object)
+
+    def __init__(self, query, on_result, delay_ms=TYPEAHEAD_DELAY_MS, threaded=False, parent=None):
+        super().__init__(parent)
+        self.query = query
+        self.on_result = on_result
+        self.threaded = threaded
+        self._args = ()
+        self._generation = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._run)
+        self.finished.connect(self._deliver)
+
+    def request(self, *args):
+        self._args = args
+        self._generation += 1
+        self._timer.start()
+
+    def run_now(self, *args):
+        self.request(*args)
+        self._timer.stop()
+        self._run()
+
+    def _run(self):
+        if self.threaded:
+            threading.Thread(target=self._work, args=(self._generation, self._args), daemon=True).start()
+        else:
+            self._work(self._generation, self._args)
+
+    def _work(self, generation, args):
+        try:
+            result = self.query(*args)
+        except Exception as e:
+            print(f"Query failed: {e}", file=sys.stderr)
+            return
+        try:
+            self.finished.emit(generation, result)
+        except RuntimeError:
+            pass  # owner closed while the query ran
+
+    def _deliver(self, generation, result):
+        if generation == self._generation:
+            self.on_result(result)
+
+
+def attach_value_completer(edit, db, kind):
+    """Autocomplete the QLineEdit `edit` from db.values (see ValueDictionary)."""
+    model = QStringListModel(edit)
+    completer = QCompleter(model, edit)
+    completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+    edit.setCompleter(completer)
+    # textEdited reaches this slot before the line edit asks the completer to pop up
+    edit.textEdited.connect(lambda text: model.setStringList(db.values.complete(kind, text)))
+    return completer
+
+
+class ValueCompleterDelegate(QStyledItemDelegate):
+    """Table cell editor that autocompletes one value dictionary kind."""
+
+    def __init__(self, db, kind, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.kind = kind
+
+    def createEditor(self, parent, option, index):
+        editor = super().createEditor(parent, option, index)
+        if isinstance(editor, QLineEdit):
+            attach_value_completer(editor, self.db, self.kind)
+        return editor
+
 # ----------------------------------------------------------------------
 # Global stylesheets
 # ----------------------------------------------------------------------
@@ -554,10 +3027,46 @@ QScrollArea { border: none; background-color: #f0f4f8; }
 # ======================================================================
 
 
+SESSION_FILE_NAME = ".kts_session"
+
+
+class SessionStore:
+    """This PC's session token: a small JSON file next to the program,
+    readable only by the current user. A token is only offered back for
+    the database it was issued by and until it expires."""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.path.dirname(DBManager.default_path()), SESSION_FILE_NAME)
+
+    def load(self, database: str) -> str | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("database") != database or data.get("expires_at", 0) <= time.time():
+            return None
+        return data.get("token")
+
+    def save(self, database: str, token: str, expires_at: float):
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"database": database, "token": token, "expires_at": expires_at}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
 class LoginDialog(QDialog):
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db = db_manager
+        self.username = ""
         self.setWindowTitle("Login")
         self.setFixedSize(400, 350)
         self.setStyleSheet(BLUE_WHITE_STYLESHEET)
@@ -594,6 +3103,7 @@ class LoginDialog(QDialog):
         username = self.username_input.text().strip()
         password = self.password_input.text().strip()
         if self.db.verify_login(username, password):
+            self.username = username
             self.accept()
         else:
             QMessageBox.warning(self, "Login Failed", "Invalid username or password.")
@@ -608,35 +3118,103 @@ class LoginDialog(QDialog):
 
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+import mailbox
 import smtplib
 
-class EmailOTP:
-    def __init__(self):
-        self.otp = None
+OTP_SENDER_EMAIL = "p.sathishkts@gmail.com"  # Replace with your Gmail
+OTP_SMTP_TIMEOUT = 10       # seconds to connect / wait on the mail server
+OTP_SEND_ATTEMPTS = 3
+OTP_RETRY_SECONDS = 2       # first retry delay, doubled after each failure
+# Set to a folder to drop OTP mails into a local maildir instead of sending them
+OTP_OUTBOX_ENV = "KTS_OTP_OUTBOX"
+
+
+class SmtpTransport:
+    """Sends mail through an SMTP server with STARTTLS and a login."""
+
+    def __init__(self, host="smtp.gmail.com", port=587, username=OTP_SENDER_EMAIL,
+                 password="mslb wfth dkjp dozq", timeout=OTP_SMTP_TIMEOUT):  # Your Gmail app password
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def send(self, msg):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as server:
+            server.starttls()
+            server.login(self.username, self.password)
+            server.send_message(msg)
+
 
-    def send_otp(self, receiver_email):  # ✅ must accept receiver_email
-        sender_email = "p.sathishkts@gmail.com"  # Replace with your Gmail
-        sender_password = "mslb wfth dkjp dozq"   # Your Gmail app password
+class FileTransport:
+    """Stand-in transport: stores each mail in the maildir `directory`."""
 
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, msg):
+        # Maildir(create=True) skips the subfolders when the folder already exists
+        for sub in ("tmp", "new", "cur"):
+            os.makedirs(os.path.join(self.directory, sub), exist_ok=True)
+        mailbox.Maildir(self.directory).add(msg)
+
+
+def default_mail_transport():
+    outbox = os.environ.get(OTP_OUTBOX_ENV)
+    return FileTransport(outbox) if outbox else SmtpTransport()
+
+
+def _permanent_mail_error(e) -> bool:
+    """True for failures a retry cannot fix (bad login, refused address)."""
+    if isinstance(e, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused)):
+        return True
+    return getattr(e, "smtp_code", 0) >= 500
+
+
+class EmailOTP(QObject):
+    """Generates an OTP and mails it from a background thread, retrying
+    transient failures. Reports the outcome through `sent` / `failed`."""
+
+    sent = pyqtSignal(str)      # receiver address
+    failed = pyqtSignal(str)    # error text
+
+    def __init__(self, transport=None, parent=None):
+        super().__init__(parent)
+        self.transport = transport or default_mail_transport()
+        self.otp = None
+
+    def send_otp(self, receiver_email):
+        """Start sending a new OTP to receiver_email; returns at once."""
         self.otp = str(random.randint(100000, 999999))
 
         subject = "Your OTP Code"
         body = f"Your One-Time Password (OTP) is: {self.otp}\nThis code will expire in 5 minutes."
         msg = MIMEMultipart()
-        msg["From"] = sender_email
+        msg["From"] = OTP_SENDER_EMAIL
         msg["To"] = receiver_email
         msg["Subject"] = subject
         msg.attach(MIMEText(body, "plain"))
 
+        threading.Thread(target=self._deliver, args=(msg, receiver_email), daemon=True).start()
+
+    def _deliver(self, msg, receiver_email):
+        delay = OTP_RETRY_SECONDS
+        for attempt in range(1, OTP_SEND_ATTEMPTS + 1):
+            try:
+                self.transport.send(msg)
+                signal, value = self.sent, receiver_email
+                break
+            except Exception as e:
+                if attempt == OTP_SEND_ATTEMPTS or _permanent_mail_error(e):
+                    signal, value = self.failed, str(e)
+                    break
+                time.sleep(delay)
+                delay *= 2
         try:
-            server = smtplib.SMTP("smtp.gmail.com", 587)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-            server.quit()
-            QMessageBox.information(None, "OTP Sent", f"OTP sent to {receiver_email}")
-        except Exception as e:
-            QMessageBox.warning(None, "Error", f"Failed to send email: {e}")
+            signal.emit(value)
+        except RuntimeError:
+            pass  # dialog closed while the mail was going out
 
 
 # Main dialog for reset password flow with email OTP
@@ -646,9 +3224,11 @@ class ForgotPasswordDialog(QDialog):
         super().__init__(parent)
         self.db = db
         self.setWindowTitle("Forgot Password (OTP)")
-        self.setFixedSize(500, 270)
+        self.setFixedSize(500, 310)
         self.setStyleSheet(BLUE_WHITE_STYLESHEET)
-        self.emailotp = EmailOTP()
+        self.emailotp = EmailOTP(parent=self)
+        self.emailotp.sent.connect(self._otp_sent)
+        self.emailotp.failed.connect(self._otp_failed)
         self.generatedotp = None
         self.otpexpiry = 0
         self.username = ""
@@ -672,6 +3252,10 @@ class ForgotPasswordDialog(QDialog):
         username_row.addWidget(self.send_otp_btn)
         layout.addLayout(username_row)
 
+        # Delivery progress; the mail goes out in the background
+        self.otp_status = QLabel("")
+        layout.addWidget(self.otp_status)
+
         # OTP row with Verify button
         otp_row = QHBoxLayout()
         otp_label = QLabel("Enter OTP:")
@@ -731,22 +3315,31 @@ class ForgotPasswordDialog(QDialog):
             QMessageBox.warning(self, "Error", "Enter username.")
             return
         # Check for username existence in DB
-        c = self.db.conn.cursor()
-        c.execute("SELECT id FROM users WHERE username=?", (self.username,))
-        if not c.fetchone():
+        if not self.db.user_exists(self.username):
             QMessageBox.warning(self, "Error", "Username not found.")
             return
         
         receiver = "p.sathishkts@gmail.com"
+        self.send_otp_btn.setEnabled(False)
+        self.otp_status.setText(f"Sending OTP to {receiver}...")
         self.emailotp.send_otp(receiver)
         self.generatedotp = self.emailotp.otp
-        import time
         self.otpexpiry = time.time() + 300
         self.otp_input.setEnabled(True)
         self.verify_otp_btn.setEnabled(True)
 
+    def _otp_sent(self, receiver):
+        self.otp_status.setText(f"OTP sent to {receiver}")
+        self.send_otp_btn.setEnabled(True)
+
+    def _otp_failed(self, error):
+        self.otp_status.setText(f"Failed to send email: {error}")
+        self.send_otp_btn.setEnabled(True)
+        self.generatedotp = None
+        self.otp_input.setEnabled(False)
+        self.verify_otp_btn.setEnabled(False)
+
     def verify_otp(self):
-        import time
         entered = self.otp_input.text().strip()
         if time.time() > self.otpexpiry:
             QMessageBox.warning(self, "Expired", "OTP expired. Send again.")
@@ -802,6 +3395,8 @@ class ExpenseDialog(QDialog):
         layout.addRow("Date:", self.date_edit)
 
         self.vehicle_no_edit = QLineEdit()
+        if getattr(parent, "db", None):
+            attach_value_completer(self.vehicle_no_edit, parent.db, "vehicle")
         layout.addRow("Vehicle No:", self.vehicle_no_edit)
 
         def _money_edit():
@@ -881,15 +3476,22 @@ class ExpenseDialog(QDialog):
 
 
 class VehicleExpensePage(QWidget):
-    def __init__(self, back_cb=None, db=None):
+    # Header columns that sort the grid -> VEHICLE_EXPENSE_SORT_COLUMNS name
+    SORT_COLUMNS = {0: "date", 1: "vehicle", 13: "amount"}
+
+    def __init__(self, back_cb=None, db=None, state=None):
         super().__init__()
         self.back_cb = back_cb
         self.db = db
         self.records = []
-        self.record_ids = []
+        self.sort = ("date", True)  # (VEHICLE_EXPENSE_SORT_COLUMNS name, descending)
         self.initui()
         if self.db:
-            self.load_from_db()
+            if state:
+                self.restore_state(state)
+            else:
+                self.load_from_db()
+            watch_changes(self, self.db, self._on_db_change)
         else:
             self.refresh()
 
@@ -958,6 +3560,8 @@ class VehicleExpensePage(QWidget):
         
         self.filt_vehicle = QLineEdit()
         self.filt_vehicle.setPlaceholderText("Vehicle No.")
+        if self.db:
+            attach_value_completer(self.filt_vehicle, self.db, "vehicle")
         self.filt_vehicle.setStyleSheet("""
             QLineEdit {
                 background-color: white;
@@ -1125,6 +3729,11 @@ class VehicleExpensePage(QWidget):
         h.setStretchLastSection(True)
         for i in range(len(headers)):
             h.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
+        # Sorted by the database (see sort_by_column), not by QTableWidget
+        h.setSectionsClickable(True)
+        h.setSortIndicatorShown(True)
+        h.setSortIndicator(0, Qt.SortOrder.DescendingOrder)
+        h.sectionClicked.connect(self.sort_by_column)
         vbox.addWidget(self.table)
 
         self.total_lbl = QLabel("Grand Total: ₹0")
@@ -1147,42 +3756,88 @@ class VehicleExpensePage(QWidget):
 
     def load_from_db(self):
         """
-        Load rows from DB into self.records (list-of-lists) and self.record_ids
+        Load rows from DB into self.records (list of VehicleExpenseRecord)
         """
-        rows = self.db.loadvehicleexpenses()
-        self.records = []
-        self.record_ids = []
-        for r in rows:
-            # keep columns consistent with table order in UI:
-            rec = [
-                r['date'] or "",
-                r['vehicle_no'] or "",
-                str(r['fc_expense'] or 0),
-                str(r['tyre_amount'] or 0),
-                r['tyre_type'] or "",
-                str(r['tax'] or 0),
-                r['tax_type'] or "",
-                str(r['spare_work'] or 0),
-                r['spare_type'] or "",
-                str(r['loan'] or 0),
-                str(r['insurance'] or 0),
-                str(r['others'] or 0),
-                r['remarks'] or ""
-            ]
-            self.records.append(rec)
-            self.record_ids.append(r['id'])
+        self.records = self.db.load_vehicle_expense_list(None, None, *self.sort)
+        self.refresh()
+
+    def sort_by_column(self, column):
+        """Header click: sort by that column, or flip the order if it already sorts."""
+        sort = self.SORT_COLUMNS.get(column)
+        if sort is None:
+            column = next(c for c, name in self.SORT_COLUMNS.items() if name == self.sort[0])
+        elif sort == self.sort[0]:
+            self.sort = (sort, not self.sort[1])
+        else:
+            # Newest / largest first; vehicles A to Z
+            self.sort = (sort, sort != "vehicle")
+        order = Qt.SortOrder.DescendingOrder if self.sort[1] else Qt.SortOrder.AscendingOrder
+        self.table.horizontalHeader().setSortIndicator(column, order)
+        if sort is not None and self.db:
+            self.records = self.db.load_vehicle_expense_list(None, None, *self.sort)
+            self.apply_filters()
+
+    def page_state(self):
+        """Sort and vehicle filter to reopen the page with (see MainWindow.save_session)."""
+        return {"sort": list(self.sort), "vehicle": self.filt_vehicle.text()}
+
+    def restore_state(self, state):
+        sort, descending = state.get("sort") or self.sort
+        if sort in self.SORT_COLUMNS.values():
+            self.sort = (sort, descending)
+            column = next(c for c, name in self.SORT_COLUMNS.items() if name == sort)
+            order = Qt.SortOrder.DescendingOrder if descending else Qt.SortOrder.AscendingOrder
+            self.table.horizontalHeader().setSortIndicator(column, order)
+        self.filt_vehicle.setText(state.get("vehicle", ""))
+        if self.db:
+            self.records = self.db.load_vehicle_expense_list(None, None, *self.sort)
+        self.apply_filters()
+
+    def _record_order(self, rec):
+        """rec's sort key under self.sort, text folded like the NOCASE sort columns."""
+        return tuple(v.lower() if isinstance(v, str) else v
+                     for v in _sort_key(rec, VEHICLE_EXPENSE_SORT_COLUMNS, self.sort[0]))
+
+    def _on_db_change(self, event):
+        """Patch self.records with one committed vehicle expense change."""
+        if event.table != "vehicle_expenses":
+            return
+        if event.op == "reload":
+            self.load_from_db()
+            return
+        self.records = [rec for rec in self.records if rec.id != event.row_id]
+        if event.op != "delete":
+            rec = self.db.load_vehicle_expense_row(event.row_id)
+            if rec:
+                # In the order load_vehicle_expense_list returns
+                key = self._record_order(rec)
+                if self.sort[1]:
+                    pos = next((i for i, r in enumerate(self.records) if self._record_order(r) < key),
+                               len(self.records))
+                else:
+                    pos = next((i for i, r in enumerate(self.records) if self._record_order(r) > key),
+                               len(self.records))
+                self.records.insert(pos, rec)
+        self.refresh()
+
+    def show_record(self, record_id):
+        """Show every record and select the one with this id."""
+        row = next((i for i, rec in enumerate(self.records) if rec.id == record_id), None)
+        if row is None:
+            return
         self.refresh()
+        self.table.selectRow(row)
+        self.table.scrollToItem(self.table.item(row, 0), QAbstractItemView.ScrollHint.PositionAtCenter)
 
     def new_record(self):
         dlg = ExpenseDialog(self)
         if dlg.exec():
             data = dlg.data()  # list of 13 fields (no total)
             if self.db:
-                self.db.save_vehicle_expense(data)   # DB computes total
-                self.load_from_db()
+                self.db.save_vehicle_expense(data)   # DB computes total; _on_db_change adds the row
             else:
                 # keep old in-memory behavior
-                self.records.insert(0, data)
+                self.records.insert(0, VehicleExpenseRecord.from_form_values(data))
                 self.refresh()
 
     def edit_record(self, idx):
@@ -1190,15 +3845,13 @@ class VehicleExpensePage(QWidget):
         if idx < 0 or idx >= len(self.records):
             return
         current = self.records[idx]
-        dlg = ExpenseDialog(self, current)
+        dlg = ExpenseDialog(self, current.form_values())
         if dlg.exec():
             newdata = dlg.data()
             if self.db:
-                expid = self.record_ids[idx]
-                self.db.update_vehicle_expense(expid, newdata)
-                self.load_from_db()
+                self.db.update_vehicle_expense(current.id, newdata)
             else:
-                self.records[idx] = newdata
+                self.records[idx] = VehicleExpenseRecord.from_form_values(newdata, current.id)
                 self.refresh()
 
     def del_record(self, idx):
@@ -1210,9 +3863,7 @@ class VehicleExpensePage(QWidget):
                                 ) != QMessageBox.StandardButton.Yes:
             return
         if self.db:
-            expid = self.record_ids[idx]
-            self.db.delete_vehicle_expense(expid)
-            self.load_from_db()
+            self.db.delete_vehicle_expense(self.records[idx].id)
         else:
             del self.records[idx]
             self.refresh()
@@ -1225,18 +3876,20 @@ class VehicleExpensePage(QWidget):
     # ------------------------------------------------------------------
     def refresh(self, subset=None):
         rows = subset if subset is not None else self.records
+        # Edit/Del act on self.records, so map filtered rows back to their index there
+        positions = {id(rec): i for i, rec in enumerate(self.records)}
         self.table.setRowCount(len(rows))
         grand = 0.0
         for r, rec in enumerate(rows):
             # fill normal columns (0-12)
-            for c in range(13):
-                itm = QTableWidgetItem(rec[c] if c < len(rec) else "")
+            for c, text in enumerate(rec.form_values()):
+                itm = QTableWidgetItem(text)
                 itm.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
                 itm.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
                 self.table.setItem(r, c, itm)
 
             # compute total
-            tot = sum(safe_float(rec[i]) for i in (2,3,5,7,9,10,11))
+            tot = rec.total
             grand += tot
             tot_itm = QTableWidgetItem(show_int_amount(tot))
             tot_itm.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -1244,9 +3897,10 @@ class VehicleExpensePage(QWidget):
             self.table.setItem(r, 13, tot_itm)
 
             # edit / delete buttons
+            idx = positions[id(rec)]
             e_btn = QPushButton("Edit"); d_btn = QPushButton("X"); d_btn.setStyleSheet("color:red;")
-            e_btn.clicked.connect(lambda _=None, i=r: self.edit_record(i))
-            d_btn.clicked.connect(lambda _=None, i=r: self.del_record(i))
+            e_btn.clicked.connect(lambda _=None, i=idx: self.edit_record(i))
+            d_btn.clicked.connect(lambda _=None, i=idx: self.del_record(i))
             self.table.setCellWidget(r, 14, e_btn); self.table.setCellWidget(r, 15, d_btn)
 
         self.total_lbl.setText(f"Grand Total: ₹{show_int_amount(grand)}")
@@ -1270,11 +3924,17 @@ class VehicleExpensePage(QWidget):
         elif choice == "Last Year": start = today.addYears(-1); end = today
         elif choice == "Custom": start, end = self.from_date.date(), self.to_date.date()
 
+        ids = None
+        if start and self.db:
+            ids = self.db.vehicle_expense_ids_between(start.toString("yyyy-MM-dd"),
+                                                      (end or start).toString("yyyy-MM-dd"))
+
         subset = []
         for rec in self.records:
-            rec_date = QDate.fromString(rec[0], "yyyy-MM-dd")
-            if veh and veh not in rec[1].lower(): continue
-            if not self._date_ok(rec_date, start, end): continue
+            if veh and veh not in rec.vehicle_no.lower(): continue
+            if ids is not None:
+                if rec.id not in ids: continue
+            elif not self._date_ok(QDate.fromString(rec.date, "yyyy-MM-dd"), start, end): continue
             subset.append(rec)
         self.refresh(subset)
 
@@ -1283,85 +3943,244 @@ class VehicleExpensePage(QWidget):
         self.from_date.hide(); self.to_date.hide()
         self.refresh()
 
-    # ------------------------------------------------------------------
-    # Excel export
-    # ------------------------------------------------------------------
-    def download_excel(self):
-        if not self.records:
-            QMessageBox.information(self, "No data", "No records to export.")
-            return
-        path, _ = QFileDialog.getSaveFileName(self, "Save Excel", "", "Excel (*.xlsx)")
-        if not path:
-            return
-        if not path.lower().endswith(".xlsx"):
-            path += ".xlsx"
+    # ------------------------------------------------------------------
+    # Excel export
+    # ------------------------------------------------------------------
+    def download_excel(self):
+        if not self.records:
+            QMessageBox.information(self, "No data", "No records to export.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Excel", "", "Excel (*.xlsx)")
+        if not path:
+            return
+        if not path.lower().endswith(".xlsx"):
+            path += ".xlsx"
+
+        try:
+            records = self.db.iter_vehicle_expense_list() if self.db else self.records
+            export_report(VEHICLE_EXPENSE_REPORT, records, path, "xlsx")
+            QMessageBox.information(self, "Saved", f"File saved to\n{path}")
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"Failed to export:\n{e}")
+
+
+# ----------------------------------------------------------------------
+# VEHICLE PROFITABILITY REPORT PAGE
+# ----------------------------------------------------------------------
+
+
+class VehicleReportPage(QWidget):
+    """Revenue, trip expenses, maintenance, loan and net per vehicle per month."""
+
+    HEADERS = ["Month", "Vehicle No", "Trips", "Revenue", "Trip Expenses",
+               "Maintenance", "Loan", "Net"]
+
+    def __init__(self, back_cb=None, db=None):
+        super().__init__()
+        self.back_cb = back_cb
+        self.db = db
+        self.records = []
+        self.initui()
+        if self.db:
+            self.load_from_db()
+
+    def initui(self):
+        vbox = QVBoxLayout(self)
+        vbox.setContentsMargins(20, 20, 20, 20)
+        vbox.setSpacing(15)
+        self.setStyleSheet(MAIN_STYLESHEET)
+
+        header_layout = QHBoxLayout()
+        header_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        title_label = QLabel("Vehicle Profitability")
+        title_label.setFont(QFont("Arial Black", 24))
+        title_label.setStyleSheet("color: #003366; font-weight: bold;")
+        header_layout.addWidget(title_label)
+        vbox.addLayout(header_layout)
+
+        def button(text, color, hover):
+            btn = QPushButton(text)
+            btn.setStyleSheet(f"""
+                QPushButton {{
+                    background-color: {color};
+                    color: white;
+                    font-weight: bold;
+                    font-size: 14px;
+                    padding: 8px 16px;
+                    border-radius: 6px;
+                    min-width: 100px;
+                    min-height: 35px;
+                }}
+                QPushButton:hover {{
+                    background-color: {hover};
+                }}
+            """)
+            return btn
+
+        input_style = """
+            background-color: white;
+            border: 2px solid #87CEEB;
+            border-radius: 5px;
+            padding: 6px;
+            font-size: 13px;
+        """
+
+        tbar = QHBoxLayout()
+        home_btn = button("← Home", "#FF6B35", "#E85A2B")
+        home_btn.clicked.connect(lambda: self.back_cb())
+        tbar.addWidget(home_btn)
+
+        vehicle_label = QLabel("Vehicle:")
+        vehicle_label.setStyleSheet("color: #003366; font-weight: bold; font-size: 14px;")
+        tbar.addWidget(vehicle_label)
+        self.filt_vehicle = QLineEdit()
+        self.filt_vehicle.setPlaceholderText("Vehicle No.")
+        if self.db:
+            attach_value_completer(self.filt_vehicle, self.db, "vehicle")
+        self.filt_vehicle.setStyleSheet(f"QLineEdit {{ {input_style} min-width: 150px; }}")
+        self.filt_vehicle.returnPressed.connect(self.load_from_db)
+        tbar.addWidget(self.filt_vehicle)
+
+        month_label = QLabel("Months:")
+        month_label.setStyleSheet("color: #003366; font-weight: bold; font-size: 14px;")
+        tbar.addWidget(month_label)
+        self.month_combo = QComboBox()
+        self.month_combo.addItems(["All", "Last 3 Months", "Last 6 Months", "Last Year", "Custom"])
+        self.month_combo.setStyleSheet(f"QComboBox {{ {input_style} min-width: 130px; }}")
+        self.month_combo.currentTextChanged.connect(self._month_combo_changed)
+        tbar.addWidget(self.month_combo)
+
+        today = QDate.currentDate()
+        self.from_month = QDateEdit(today.addMonths(-5), calendarPopup=True)
+        self.to_month = QDateEdit(today, calendarPopup=True)
+        self.to_label = QLabel("to")
+        self.to_label.setStyleSheet("color: #003366; font-weight: bold;")
+        for w in (self.from_month, self.to_month):
+            w.setDisplayFormat("MM-yyyy")
+            w.setStyleSheet(f"QDateEdit {{ {input_style} }}")
+        tbar.addWidget(self.from_month)
+        tbar.addWidget(self.to_label)
+        tbar.addWidget(self.to_month)
+        self._month_combo_changed(self.month_combo.currentText())
+
+        self.search_btn = button("SEARCH", "#007BFF", "#0056B3")
+        self.search_btn.clicked.connect(self.load_from_db)
+        tbar.addWidget(self.search_btn)
+
+        self.reset_btn = button("RESET", "#6C757D", "#545B62")
+        self.reset_btn.clicked.connect(self.reset_filters)
+        tbar.addWidget(self.reset_btn)
+
+        tbar.addStretch()
+        vbox.addLayout(tbar)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setStyleSheet("""
+            QTableWidget {
+                background-color: white;
+                gridline-color: #E0E0E0;
+                color: #003366;
+                border: 1px solid #87CEEB;
+                font-size: 13px;
+            }
+            QHeaderView::section {
+                background-color: #87CEEB;
+                color: white;
+                font-weight: bold;
+                font-size: 14px;
+                padding: 8px;
+                border: 1px solid #5DADE2;
+            }
+            QTableWidget::item:selected {
+                background-color: #D4E6F1;
+                color: #003366;
+            }
+        """)
+        h = self.table.horizontalHeader()
+        for i in range(len(self.HEADERS)):
+            h.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
+        vbox.addWidget(self.table)
+
+        self.total_lbl = QLabel()
+        self.total_lbl.setStyleSheet("""
+            font-weight: bold;
+            font-size: 18px;
+            color: #003366;
+            background-color: #E8F4F8;
+            padding: 10px;
+            border-radius: 5px;
+            border: 2px solid #87CEEB;
+        """)
+        vbox.addWidget(self.total_lbl)
+
+    def _month_combo_changed(self, txt):
+        vis = txt == "Custom"
+        self.from_month.setVisible(vis)
+        self.to_label.setVisible(vis)
+        self.to_month.setVisible(vis)
+
+    def _month_range(self):
+        """Inclusive (start, end) 'yyyy-mm' keys for the selected period, or (None, None)."""
+        choice = self.month_combo.currentText()
+        today = QDate.currentDate()
+        start = end = None
+        if choice == "Last 3 Months": start, end = today.addMonths(-2), today
+        elif choice == "Last 6 Months": start, end = today.addMonths(-5), today
+        elif choice == "Last Year": start, end = today.addMonths(-11), today
+        elif choice == "Custom": start, end = self.from_month.date(), self.to_month.date()
+        if start is None:
+            return None, None
+        if start > end:
+            start, end = end, start
+        return start.toString("yyyy-MM"), end.toString("yyyy-MM")
+
+    def load_from_db(self):
+        start, end = self._month_range()
+        self.records = self.db.load_vehicle_rollup(start, end, self.filt_vehicle.text())
+        self.refresh()
+
+    def reset_filters(self):
+        self.filt_vehicle.clear()
+        self.month_combo.setCurrentIndex(0)
+        self.load_from_db()
+
+    def refresh(self):
+        self.table.setRowCount(len(self.records))
+        revenue = expense = maintenance = loan = net = 0.0
+        for r, rec in enumerate(self.records):
+            values = [
+                QDate.fromString(rec.month, "yyyy-MM").toString("MMM yyyy") or rec.month,
+                rec.vehicle_no or "-",
+                str(rec.trips),
+                show_int_amount(rec.revenue),
+                show_int_amount(rec.trip_expense),
+                show_int_amount(rec.maintenance),
+                show_int_amount(rec.loan),
+                show_int_amount(rec.net),
+            ]
+            for c, text in enumerate(values):
+                itm = QTableWidgetItem(text)
+                itm.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                itm.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
+                self.table.setItem(r, c, itm)
+            # Loss-making months stand out in red
+            if rec.net < 0:
+                self.table.item(r, 7).setForeground(Qt.GlobalColor.red)
+            revenue += rec.revenue
+            expense += rec.trip_expense
+            maintenance += rec.maintenance
+            loan += rec.loan
+            net += rec.net
+
+        self.total_lbl.setText(
+            f"Revenue: ₹{show_int_amount(revenue)}    Trip Expenses: ₹{show_int_amount(expense)}    "
+            f"Maintenance: ₹{show_int_amount(maintenance)}    Loan: ₹{show_int_amount(loan)}    "
+            f"Net: ₹{show_int_amount(net)}"
+        )
+
 
-        try:
-            # Calculate column totals
-            total_fc = sum(safe_float(rec[2]) for rec in self.records if len(rec) > 2)
-            total_tyre = sum(safe_float(rec[3]) for rec in self.records if len(rec) > 3)
-            total_tax = sum(safe_float(rec[5]) for rec in self.records if len(rec) > 5)
-            total_spare = sum(safe_float(rec[7]) for rec in self.records if len(rec) > 7)
-            total_loan = sum(safe_float(rec[9]) for rec in self.records if len(rec) > 9)
-            total_insurance = sum(safe_float(rec[10]) for rec in self.records if len(rec) > 10)
-            total_others = sum(safe_float(rec[11]) for rec in self.records if len(rec) > 11)
-            grand_total = total_fc + total_tyre + total_tax + total_spare + total_loan + total_insurance + total_others
-            
-            # openpyxl first
-            if 'openpyxl' in sys.modules:
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Vehicle Expenses"
-                cols = ["Date","Vehicle","FC","Tyre Amt","Tyre Type","Tax","Tax Type",
-                        "Spare","Type","Loan","Insurance","Others","Remarks","Total"]
-                for c, h in enumerate(cols, 1):
-                    cell = ws.cell(1, c, h)
-                    cell.font = Font(bold=True)
-                    cell.alignment = Alignment(horizontal="center")
-                
-                for r, rec in enumerate(self.records, start=2):
-                    val = []
-                    for i in range(13):
-                        val.append(rec[i] if i < len(rec) else "")
-                    val.append(sum(safe_float(rec[i]) for i in (2,3,5,7,9,10,11)))
-                    for c, v in enumerate(val, 1):
-                        ws.cell(r, c, v)
-                
-                # Add totals row
-                total_row = len(self.records) + 2
-                ws.cell(total_row, 1, "TOTAL").font = Font(bold=True)
-                ws.cell(total_row, 3, total_fc)
-                ws.cell(total_row, 4, total_tyre)
-                ws.cell(total_row, 6, total_tax)
-                ws.cell(total_row, 8, total_spare)
-                ws.cell(total_row, 10, total_loan)
-                ws.cell(total_row, 11, total_insurance)
-                ws.cell(total_row, 12, total_others)
-                ws.cell(total_row, 14, grand_total).font = Font(bold=True)
-                
-                wb.save(path)
-            else:
-                # pandas fallback
-                import pandas as pd
-                rows = []
-                for rec in self.records:
-                    val = rec[:13]
-                    val += [sum(safe_float(rec[i]) for i in (2,3,5,7,9,10,11))]
-                    rows.append(val)
-                
-                # Add totals row
-                totals_row = ["TOTAL", "", total_fc, total_tyre, "", total_tax, "", 
-                             total_spare, "", total_loan, total_insurance, total_others, "", grand_total]
-                rows.append(totals_row)
-                
-                df = pd.DataFrame(rows, columns=
-                    ["Date","Vehicle","FC","Tyre Amt","Tyre Type","Tax","Tax Type",
-                     "Spare","Type","Loan","Insurance","Others","Remarks","Total"])
-                df.to_excel(path, index=False)
-            
-            QMessageBox.information(self, "Saved", f"File saved to\n{path}")
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Failed to export:\n{e}")
 # ----------------------------------------------------------------------
 # VEHICLE / DRIVER  PAGE
 # ----------------------------------------------------------------------
@@ -1432,6 +4251,7 @@ class VehicleWidget(QWidget):
         self.on_remove = on_remove
         self.on_details = on_details
         self.db = db_manager
+        self.activity = None  # (trips, last trip date), see DBManager.vehicle_trip_activity
         self.details_data = {
             'vehicle_no': name,
             'registration_date': '',
@@ -1535,25 +4355,14 @@ class VehicleWidget(QWidget):
         self.on_details(self)
     
     def update_name(self, new_name):
-        # If vehicle_no is a primary key or unique, handle update carefully
-        # For now, assume it's just updating the display name and internal data
         old_name = self.name
         self.name = new_name
         self.label.setText(new_name)
         self.details_data['vehicle_no'] = new_name
         if self.db:
-            # This is a simplified update. In a real scenario, you might need to
-            # delete the old record and insert a new one if vehicle_no is a primary key,
-            # or update the vehicle_no field if it's just a unique identifier.
-            # For this example, we'll assume the DB update handles the unique constraint.
-            # A more robust solution would be to pass the old_name to the DB manager
-            # to find and update the record.
-            existing_data = self.db.load_vehicle_driver_details(old_name)
-            if existing_data:
-                self.db.delete_vehicle_driver_details(old_name) # Delete old record
-                self.db.save_vehicle_driver_details(self.details_data) # Save new record with updated name
-            else:
-                self.db.save_vehicle_driver_details(self.details_data) # Save new record if not found
+            # Rename in place so the row keeps its id; only insert if it was never saved
+            if not self.db.rename_vehicle(old_name, new_name):
+                self.db.save_vehicle_driver_details(self.details_data)
         self.update_details_summary()
     
     def update_details_summary(self):
@@ -1565,6 +4374,9 @@ class VehicleWidget(QWidget):
             parts.append(f"Fitness: {d['fitness_upto']}")
         if d.get('tax_upto'):
             parts.append(f"Tax: {d['tax_upto']}")
+        if self.activity:
+            trips, last = self.activity
+            parts.append(f"Trips: {trips} (last {format_date_for_display(last)})")
         
         if parts:
             self.details_summary.setText(" | ".join(parts))
@@ -1579,9 +4391,11 @@ class VehicleDriverPage(QWidget):
         self.setWindowTitle("Driver & Vehicle Management")
         self.setMinimumSize(900, 640)
         self.vehicles = []
+        self._sync_pending = False
         self.init_ui()
         if self.db:
             self.load_vehicles_from_db()
+            watch_changes(self, self.db, self._on_db_change)
     
     def init_ui(self):
         main_layout = QVBoxLayout(self)
@@ -1650,13 +4464,60 @@ class VehicleDriverPage(QWidget):
     def load_vehicles_from_db(self):
         if self.db:
             all_details = self.db.load_all_vehicle_driver_details()
+            activity = self._trip_activity()
             self.vehicles = [] # Clear existing in-memory list
             for detail in all_details:
                 vehicle_widget = VehicleWidget(detail['vehicle_no'], self.edit_vehicle, self.remove_vehicle, self.show_vehicle_details, self.db)
                 vehicle_widget.details_data.update(detail) # Load all details
+                vehicle_widget.activity = activity.get(detail['id'])
+                vehicle_widget.update_details_summary()
                 self.vehicles.append(vehicle_widget)
             self.refresh_grid()
 
+    def _trip_activity(self):
+        """{vehicle id: (trips, last trip date)} for the cards."""
+        return {vehicle_id: (count, last) for vehicle_id, count, last in self.db.vehicle_trip_activity()}
+
+    def _on_db_change(self, event):
+        # Trips carry the per-vehicle trip counts shown on the cards
+        if event.table in ("vehicle_driver_details", "trips") and not self._sync_pending:
+            # Let an add/rename/remove on this page finish first, then compare once
+            self._sync_pending = True
+            QTimer.singleShot(0, self._sync_with_db)
+
+    def _sync_with_db(self):
+        """Bring the vehicle cards in line with the table, keeping existing cards."""
+        self._sync_pending = False
+        details = {d['vehicle_no']: d for d in self.db.load_all_vehicle_driver_details()}
+        activity = self._trip_activity()
+        kept = []
+        for vehicle_widget in self.vehicles:
+            if vehicle_widget.name in details:
+                vehicle_widget.details_data.update(details.pop(vehicle_widget.name))
+                vehicle_widget.activity = activity.get(vehicle_widget.details_data.get('id'))
+                vehicle_widget.update_details_summary()
+                kept.append(vehicle_widget)
+            else:
+                vehicle_widget.setParent(None)
+                vehicle_widget.deleteLater()
+        changed = len(kept) != len(self.vehicles) or details
+        for name, detail in details.items():
+            vehicle_widget = VehicleWidget(name, self.edit_vehicle, self.remove_vehicle, self.show_vehicle_details, self.db)
+            vehicle_widget.details_data.update(detail)
+            vehicle_widget.activity = activity.get(detail['id'])
+            vehicle_widget.update_details_summary()
+            kept.append(vehicle_widget)
+        self.vehicles = kept
+        if changed:
+            self.refresh_grid()
+
+    def show_vehicle(self, vehicle_no):
+        """Scroll the card of one vehicle into view."""
+        vehicle_widget = next((v for v in self.vehicles if v.name == vehicle_no), None)
+        if vehicle_widget:
+            # The grid is laid out on the next event loop pass
+            QTimer.singleShot(0, lambda: self.scroll_area.ensureWidgetVisible(vehicle_widget))
+
     def go_back_home(self):
         if self.back_callback:
             self.back_callback()
@@ -1665,13 +4526,8 @@ class VehicleDriverPage(QWidget):
         vehicle_widget = VehicleWidget(name, self.edit_vehicle, self.remove_vehicle, self.show_vehicle_details, self.db)
         self.vehicles.append(vehicle_widget)
         if self.db:
-            # Save initial vehicle_no to DB
-            initial_data = {'vehicle_no': name}
-            # Fill other fields with defaults if not present in initial_data
-            for key in vehicle_widget.details_data:
-                if key not in initial_data:
-                    initial_data[key] = vehicle_widget.details_data[key]
-            self.db.save_vehicle_driver_details(initial_data)
+            # Save initial vehicle_no to DB along with the widget's blank defaults
+            self.db.save_vehicle_driver_details(vehicle_widget.details_data)
             vehicle_widget.load_details_from_db() # Reload to get any default values/ID
         vehicle_widget.update_details_summary()
         self.refresh_grid()
@@ -2153,8 +5009,15 @@ class VehicleDriverPage(QWidget):
         # Save function
         def on_save():
             try:
+                new_vehicle_no = vehicle_no_edit.text().strip()
+                if new_vehicle_no and new_vehicle_no != vehicle_widget.name:
+                    if any(v is not vehicle_widget and v.name == new_vehicle_no for v in self.vehicles):
+                        QMessageBox.warning(dlg, "Warning", f"Vehicle '{new_vehicle_no}' already exists.")
+                        return
+                    vehicle_widget.update_name(new_vehicle_no)
+
                 # Save all form data
-                vehicle_widget.details_data['vehicle_no'] = vehicle_no_edit.text().strip()
+                vehicle_widget.details_data['vehicle_no'] = vehicle_widget.name
                 vehicle_widget.details_data['registration_date'] = reg_de.date().toString("yyyy-MM-dd")
                 vehicle_widget.details_data['fitness_upto'] = fitness_de.date().toString("yyyy-MM-dd")
                 vehicle_widget.details_data['tax_upto'] = tax_de.date().toString("yyyy-MM-dd")
@@ -2267,6 +5130,7 @@ class OfficeExpensePage(QWidget):
         # Load existing records from database
         if self.db:
             self.load_from_db()
+            watch_changes(self, self.db, self._on_db_change)
 
     def init_ui(self):
         """Initialize the user interface"""
@@ -2419,32 +5283,72 @@ class OfficeExpensePage(QWidget):
             return
         
         try:
-            records = self.db.load_office_expenses()
+            records = self.db.load_office_expense_list()
             for record in records:
-                month_widget = MonthWidget(
-                    record['month'] or f"Month {len(self.month_widgets) + 1}",
-                    self.safe_refresh_totals,  # Use safe wrapper
-                    parent=self
-                )
-                # Store database ID
-                month_widget.db_id = record['id']
-                
-                # Load field values
-                month_widget.fields["Current Bill"].setText(str(record['current_bill'] or 0))
-                month_widget.fields["Manager Salary"].setText(str(record['manager_salary'] or 0))
-                month_widget.fields["Office Expenses"].setText(str(record['office_rent'] or 0))
-                month_widget.fields["Other Expenses"].setText(str(record['others'] or 0))
-                
-                month_widget.collapse()
-                month_widget.disable_editing()
-                self.scroll_layout.insertWidget(0, month_widget)
-                self.month_widgets.insert(0, month_widget)
+                self._add_month_widget(record)
             
             self.refresh_totals()
         except Exception as e:
             print(f"Error in load_from_db: {e}")
             QMessageBox.warning(self, "Database Error", f"Failed to load office expenses: {str(e)}")
 
+    def _add_month_widget(self, record):
+        """Read-only, collapsed MonthWidget for an OfficeMonthRecord, added at the top."""
+        month_widget = MonthWidget(
+            record.month or f"Month {len(self.month_widgets) + 1}",
+            self.safe_refresh_totals,  # Use safe wrapper
+            parent=self
+        )
+        # Store database ID
+        month_widget.db_id = record.id
+        self._show_month_record(month_widget, record)
+        month_widget.collapse()
+        month_widget.disable_editing()
+        self.scroll_layout.insertWidget(0, month_widget)
+        self.month_widgets.insert(0, month_widget)
+        return month_widget
+
+    def _show_month_record(self, month_widget, record):
+        if record.month:
+            month_widget.month_edit.setText(record.month)
+        month_widget.fields["Current Bill"].setText(_amount_text(record.current_bill))
+        month_widget.fields["Manager Salary"].setText(_amount_text(record.manager_salary))
+        month_widget.fields["Office Expenses"].setText(_amount_text(record.office_rent))
+        month_widget.fields["Other Expenses"].setText(_amount_text(record.others))
+
+    def _month_widget(self, db_id):
+        return next((w for w in self.month_widgets
+                     if w.db_id == db_id and w.parent() is not None), None)
+
+    def _on_db_change(self, event):
+        """Trip and vehicle expense changes move the business summary; office
+        changes are applied to the matching month widget."""
+        if event.table in ("trips", "vehicle_expenses"):
+            self.safe_refresh_totals()
+            return
+        if event.table != "office_expenses":
+            return
+        if event.op == "reload":
+            for month_widget in self.month_widgets:
+                month_widget.setParent(None)
+                month_widget.deleteLater()
+            self.month_widgets = []
+            self.load_from_db()
+            return
+        month_widget = self._month_widget(event.row_id)
+        if event.op == "delete":
+            if month_widget:
+                month_widget.hide()
+                month_widget.setParent(None)
+                month_widget.deleteLater()
+        else:
+            record = self.db.load_office_expense_row(event.row_id)
+            if record and month_widget:
+                self._show_month_record(month_widget, record)
+            elif record:
+                self._add_month_widget(record)
+        self.safe_refresh_totals()
+
     def safe_refresh_totals(self):
         """Safe wrapper for refresh_totals to prevent errors during initialization"""
         try:
@@ -2455,6 +5359,11 @@ class OfficeExpensePage(QWidget):
     def prompt_add_month_record(self):
         text, ok = QInputDialog.getText(self, "New Month Record", "Enter name for new month record:")
         if ok and text.strip():
+            if self.db and _office_period(text) is None:
+                QMessageBox.information(
+                    self, "No Month in Name",
+                    f"'{text.strip()}' does not name a month and year, so date-ranged totals "
+                    f"and extracts will count it under {datetime.now():%B %Y}, the month it was saved.")
             self.add_month_record(text.strip())
 
     def add_month_record(self, month_name=None):
@@ -2464,17 +5373,9 @@ class OfficeExpensePage(QWidget):
         # Create new record in database
         if self.db:
             try:
-                # Save to database with zero values initially
+                # Save to database with zero values initially; _on_db_change adds the widget
                 data = (month_name, 0.0, 0.0, 0.0, 0.0)
-                new_id = self.db.save_office_expense(data)
-                
-                # Create widget
-                month_widget = MonthWidget(month_name, self.safe_refresh_totals, parent=self)  # Use safe wrapper
-                month_widget.db_id = new_id
-                month_widget.collapse()
-                self.scroll_layout.insertWidget(0, month_widget)
-                self.month_widgets.insert(0, month_widget)
-                self.refresh_totals()
+                self.db.save_office_expense(data)
             except Exception as e:
                 print(f"Error in add_month_record: {e}")
                 QMessageBox.warning(self, "Database Error", f"Failed to add month record: {str(e)}")
@@ -2528,14 +5429,7 @@ class OfficeExpensePage(QWidget):
                 return 0.0, 0.0
             
             try:
-                trips = self.db.load_trips()
-                total_expense = 0.0
-                total_profit = 0.0
-                
-                for trip in trips:
-                    total_expense += safe_float(trip['expense'] or 0)
-                    total_profit += safe_float(trip['profit'] or 0)
-                
+                total_expense, total_profit = self.db.trip_totals()
                 return total_expense, total_profit
             except Exception as e:
                 print(f"Error fetching trip totals: {e}")
@@ -2547,13 +5441,7 @@ class OfficeExpensePage(QWidget):
                 return 0.0
             
             try:
-                vehicle_expenses = self.db.load_vehicle_expenses()
-                total = 0.0
-                
-                for expense in vehicle_expenses:
-                    total += safe_float(expense['total'] or 0)
-                
-                return total
+                return self.db.vehicle_expense_total()
             except Exception as e:
                 print(f"Error fetching vehicle expenses: {e}")
                 return 0.0
@@ -2882,6 +5770,26 @@ class MonthWidget(QGroupBox):
 # --- Trip Manager Page Classes ---
 
 
+class TripRow:
+    """A trip shown in the TripManagerPage grid: its record plus the widgets displaying it."""
+    __slots__ = ('record', 'entries', 'expand_btn', 'delete_btn')
+
+    def __init__(self, record, entries, expand_btn, delete_btn):
+        self.record = record          # TripRecord
+        self.entries = entries        # QTableWidgetItems for columns 0-8
+        self.expand_btn = expand_btn
+        self.delete_btn = delete_btn
+
+    @property
+    def db_id(self):
+        return self.record.id
+
+    @property
+    def detail_entries(self) -> Dict[str, Any]:
+        """Full detail dict of the trip (loaded by TripManagerPage.expand_clicked)."""
+        return self.record.detail
+
+
 class DateRangeDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -3095,8 +6003,8 @@ class TripDetailDialog(QDialog):
 
             # Update main table driver amount
             try:
-                if self.row and self.row["entries"][5]:
-                    self.row["entries"][5].setText(show_int_amount(driver_amount))
+                if self.row and self.row.entries[5]:
+                    self.row.entries[5].setText(show_int_amount(driver_amount))
             except Exception:
                 pass
 
@@ -3112,10 +6020,10 @@ class TripDetailDialog(QDialog):
         # IMPORTANT: Function to automatically update Load Date when Start Date changes
         def on_start_date_changed(qdate):
             """When Start Date is changed, automatically update Load Date in main table"""
-            if self.row and self.row["entries"][0]:
+            if self.row and self.row.entries[0]:
                 # Convert QDate to display format (dd-MM-yyyy)
                 date_str = qdate.toString("dd-MM-yyyy")
-                self.row["entries"][0].setText(date_str)
+                self.row.entries[0].setText(date_str)
 
         # Create form fields
         for i, field in enumerate(fields):
@@ -3128,7 +6036,7 @@ class TripDetailDialog(QDialog):
                 entry.setDisplayFormat("dd-MM-yyyy")
 
                 # Load existing date value
-                existing_date = self.row["detail_entries"].get(field, "") if self.row else ""
+                existing_date = self.row.detail_entries.get(field, "") if self.row else ""
                 if existing_date:
                     # Try to parse existing date
                     qdate = QDate.fromString(existing_date, "dd-MM-yyyy")
@@ -3148,7 +6056,7 @@ class TripDetailDialog(QDialog):
             else:
                 # Create regular text input
                 entry = QLineEdit()
-                entry.setText(self.row["detail_entries"].get(field, "") if self.row else "")
+                entry.setText(self.row.detail_entries.get(field, "") if self.row else "")
 
                 if field in ("Driver Balance", "KM Travelled"):
                     entry.setReadOnly(True)
@@ -3192,29 +6100,29 @@ class TripDetailDialog(QDialog):
         for field, widget in self.entries.items():
             if isinstance(widget, QDateEdit):
                 # Save date as string
-                self.row["detail_entries"][field] = widget.date().toString("dd-MM-yyyy")
+                self.row.detail_entries[field] = widget.date().toString("yyyy-MM-dd")
             else:
                 # Save text field
-                self.row["detail_entries"][field] = widget.text()
+                self.row.detail_entries[field] = widget.text()
 
         # Update main table calculations
         try:
-            total_val = safe_float(self.row["detail_entries"].get("Total Trip Amount", "0"))
+            total_val = safe_float(self.row.detail_entries.get("Total Trip Amount", "0"))
 
             # Calculate total expenses from detail fields
             expense_fields = ["Pooja", "Diesel", "R.T.O & P.C", "Toll", "Driver Amount", 
                             "Cleaner Amount", "Broker Amount", "Load Amount", "Unload Amount", "Others"]
-            total_expense = sum(safe_float(self.row["detail_entries"].get(f, "0")) for f in expense_fields)
+            total_expense = sum(safe_float(self.row.detail_entries.get(f, "0")) for f in expense_fields)
 
             profit_val = total_val - total_expense
 
             # Update main table columns
-            if self.row["entries"][4]:  # Load Amount column
-                self.row["entries"][4].setText(show_int_amount(total_val))
-            if self.row["entries"][6]:  # Expenses column
-                self.row["entries"][6].setText(show_int_amount(total_expense))
-            if self.row["entries"][7]:  # Profit column
-                self.row["entries"][7].setText(show_int_amount(profit_val))
+            if self.row.entries[4]:  # Load Amount column
+                self.row.entries[4].setText(show_int_amount(total_val))
+            if self.row.entries[6]:  # Expenses column
+                self.row.entries[6].setText(show_int_amount(total_expense))
+            if self.row.entries[7]:  # Profit column
+                self.row.entries[7].setText(show_int_amount(profit_val))
         except Exception:
             pass
 
@@ -3258,10 +6166,63 @@ class DateRangeDialog(QDialog):
             d_from, d_to = d_to, d_from
         return (d_from, d_to)
 
+class ReceivablesDialog(QDialog):
+    """Outstanding trip balances per broker office, aged in 30-day buckets."""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle("Receivables Aging")
+        self.resize(900, 500)
+        layout = QVBoxLayout(self)
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("As of:"))
+        self.as_of = QDateEdit(QDate.currentDate())
+        self.as_of.setCalendarPopup(True)
+        self.as_of.setDisplayFormat("dd-MM-yyyy")
+        self.as_of.dateChanged.connect(self.refresh)
+        top.addWidget(self.as_of)
+        top.addStretch()
+        layout.addLayout(top)
+
+        headers = ["Broker Office", "Trips"] + [f"{label} days" for label, _, _ in db.AGING_BUCKETS] + ["Total"]
+        self.table = QTableWidget(0, len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        self.refresh()
+
+    def refresh(self):
+        records = self.db.receivables_aging(self.as_of.date().toString("yyyy-MM-dd"))
+        self.table.setRowCount(len(records) + 1)
+        grand = [0.0] * 5
+        for r, rec in enumerate(records):
+            amounts = (*rec.buckets, rec.total)
+            self._set_row(r, rec.broker_office or "-", rec.trips, amounts)
+            grand = [g + a for g, a in zip(grand, amounts)]
+        self._set_row(len(records), "TOTAL", sum(rec.trips for rec in records), grand, bold=True)
+
+    def _set_row(self, r, name, trips, amounts, bold=False):
+        for c, text in enumerate([name, str(trips)] + [show_int_amount(a) for a in amounts]):
+            itm = QTableWidgetItem(text)
+            itm.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            if bold:
+                font = itm.font()
+                font.setBold(True)
+                itm.setFont(font)
+            self.table.setItem(r, c, itm)
+
+
 class TripManagerPage(QMainWindow):
     """COMPLETELY FIXED Trip Manager page with proper sqlite3.Row handling."""
 
-    def __init__(self, back_callback=None, db_manager=None):
+    # Header columns that sort the grid -> TRIP_SORT_COLUMNS name
+    SORT_COLUMNS = {0: "date", 2: "vehicle", 3: "broker", 4: "amount", 8: "status"}
+
+    def __init__(self, back_callback=None, db_manager=None, state=None):
         super().__init__()
         self.setWindowTitle("Trip Manager")
         self.setGeometry(100, 100, 1280, 780)
@@ -3270,6 +6231,19 @@ class TripManagerPage(QMainWindow):
         self.rows = []
         self.custom_range = (None, None)
         self.expand_dialog = None
+        # The grid shows the trips matching trip_filters, in trip_sort
+        # (TRIP_SORT_COLUMNS name, descending) order, a page at a time;
+        # _next_key is the sort key to continue after when the user scrolls down.
+        # sort_choice is the order last picked on the header, which becomes
+        # trip_sort when its first page arrives.
+        self.trip_filters = {}
+        self.trip_sort = self.sort_choice = ("date", True)
+        self.date_range = (None, None)
+        self._next_key = None
+        self._exhausted = True
+        # Filter boxes filter as you type; remote queries run off the GUI thread
+        self.filter_query = DebouncedQuery(self._query_filters, self._show_filtered,
+                                           threaded=isinstance(self.db, RemoteDBManager), parent=self)
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -3280,9 +6254,13 @@ class TripManagerPage(QMainWindow):
         self.create_table()
         self.create_summary_box()
 
-        # Load trips from DB if available
+        # Load trips from DB if available (reopened pages load with their saved filters)
         if self.db is not None:
-            self.load_from_db()
+            if state:
+                self.restore_state(state)
+            else:
+                self.load_from_db()
+            watch_changes(self, self.db, self._on_db_change)
 
     def create_top_bar(self):
         top_bar = QHBoxLayout()
@@ -3302,6 +6280,11 @@ class TripManagerPage(QMainWindow):
         self.button_download.clicked.connect(self.show_download_menu)
         top_bar.addWidget(self.button_download)
 
+        self.button_receivables = QPushButton("RECEIVABLES")
+        self.button_receivables.setStyleSheet("background: #8e44ad; color: white; font-weight: bold; font-size: 14px;")
+        self.button_receivables.clicked.connect(self.show_receivables)
+        top_bar.addWidget(self.button_receivables)
+
         self.date_option = QComboBox()
         self.date_option.addItems(
             ["Filter", "Last 1 Day", "Last Month", "Last 3 Months",
@@ -3337,6 +6320,11 @@ class TripManagerPage(QMainWindow):
         self.driver_var.setStyleSheet("background-color: white; color: black; font-size: 14px;")
         top_bar.addWidget(self.driver_var)
 
+        for box, field in ((self.vehicle_var, "vehicle"), (self.brokeroffice_var, "broker"),
+                           (self.driver_var, "driver")):
+            box.textChanged.connect(self.schedule_search)
+            self._add_suggestions(box, field)
+
         self.status_filter = QComboBox()
         self.status_filter.addItems(["All", "Paid", "Unpaid"])
         self.status_filter.setStyleSheet("background-color: white; color: black; font-weight: normal; font-size: 13px; margin-left: 8px;")
@@ -3382,8 +6370,22 @@ class TripManagerPage(QMainWindow):
         excel_action.triggered.connect(self.download_excel)
         menu.addAction(excel_action)
 
+        statements_action = QAction("Broker Statements (PDF)", self)
+        statements_action.triggered.connect(self.download_broker_statements)
+        menu.addAction(statements_action)
+
+        extract_action = QAction("Full Trip Extract (CSV / Parquet)", self)
+        extract_action.triggered.connect(self.download_trip_extract)
+        menu.addAction(extract_action)
+
         menu.exec(self.button_download.mapToGlobal(self.button_download.rect().bottomLeft()))
 
+    def show_receivables(self):
+        if not self.db:
+            QMessageBox.information(self, "Receivables", "Receivables need the database.")
+            return
+        ReceivablesDialog(self.db, self).exec()
+
     def back_to_home(self):
         if self.back_callback:
             self.back_callback()
@@ -3412,6 +6414,21 @@ class TripManagerPage(QMainWindow):
         for i in range(self.table.columnCount()):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
 
+        # Infinite scroll: fetch the next page as the end of the table comes into view
+        self.table.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+        # Header clicks sort in the database (see sort_by_column); Qt's own
+        # sorting would reorder rows under self.rows and the cell widgets
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(0, Qt.SortOrder.DescendingOrder)
+        header.sectionClicked.connect(self.sort_by_column)
+
+        # Editable text columns offer the spellings already in use
+        if self.db:
+            for column, kind in ((1, "location"), (2, "vehicle"), (3, "broker")):
+                self.table.setItemDelegateForColumn(column, ValueCompleterDelegate(self.db, kind, self.table))
+
         self.main_layout.addWidget(self.table)
 
     def create_summary_box(self):
@@ -3443,52 +6460,62 @@ class TripManagerPage(QMainWindow):
 
     # -------------------- DATABASE INTEGRATION METHODS (FIXED FOR sqlite3.Row) --------------------
 
-    def row_to_dict(self, row):
-        """Convert sqlite3.Row to dictionary for easier handling."""
-        if row is None:
-            return {}
-        return dict(row)
-
     def load_from_db(self):
-        """Load all trips from database into the table."""
+        """Show the first page of trips matching the filters; more load on scrolling."""
         if not self.db:
             return
 
-        # Clear existing data
+        try:
+            self._show_first_page(self.db.load_trip_page(self.trip_filters, None, DBManager.TRIP_PAGE_SIZE,
+                                                         *self.trip_sort))
+        except Exception as e:
+            QMessageBox.critical(self, "Database Error", f"Failed to load trips: {str(e)}")
+
+    def _show_first_page(self, page):
+        # Clearing the table moves the scrollbar; don't let that fetch with the old key
+        self._exhausted = True
+        self._next_key = None
         self.table.setRowCount(0)
         self.rows.clear()
-
+        self._append_page(page)
+        self.update_summary()
+
+    def _append_page(self, page):
+        # A trip whose date was edited can come round again in a later page
+        loaded = {row.db_id for row in self.rows}
+        for trip in page:
+            if trip.id not in loaded:
+                self.insert_trip_row_from_db(trip, len(self.rows))
+        if page:
+            self._next_key = DBManager.trip_page_key(page[-1], self.trip_sort[0])
+        self._exhausted = len(page) < DBManager.TRIP_PAGE_SIZE
+
+    def fetch_more(self):
+        """Append the next page of trips."""
+        if not self.db or self._exhausted:
+            return
+        self._exhausted = True  # until this page is in, scrolling doesn't fetch again
         try:
-            # Load trips from DB and convert to dictionaries
-            trips_rows = self.db.load_trips()
-            trips = [self.row_to_dict(trip) for trip in trips_rows]
-
-            for trip in trips:
-                self.insert_trip_row_from_db(trip)
-
-            self.update_summary()
+            self._append_page(self.db.load_trip_page(self.trip_filters, self._next_key,
+                                                     DBManager.TRIP_PAGE_SIZE, *self.trip_sort))
         except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to load trips: {str(e)}")
+            self._exhausted = False
+            print(f"Failed to load more trips: {e}")
 
-    def insert_trip_row_from_db(self, trip_dict):
-        """Insert a single trip row from database dictionary into the table."""
-        row = 0  # Insert at first row instead of last
-        self.table.insertRow(0)
+    def _on_scroll(self, value):
+        bar = self.table.verticalScrollBar()
+        if value >= bar.maximum() - bar.pageStep():
+            self.fetch_more()
 
-        # Parse detail_json if it exists
-        detail_entries = {}
-        detail_json = trip_dict.get('detail_json')
-        if detail_json:
-            try:
-                detail_entries = json.loads(detail_json)
-            except:
-                detail_entries = {}
+    def insert_trip_row_from_db(self, trip, row=0):
+        """Insert a single TripRecord (see DBManager.load_trip_page) at table row `row`."""
+        self.table.insertRow(row)
 
         # Create table items
         items = []
 
         # Column 0: Date
-        date_value = trip_dict.get('date', '')
+        date_value = trip.date
         date_item = QTableWidgetItem(format_date_for_display(date_value))
         date_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
         date_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled )
@@ -3496,7 +6523,7 @@ class TripManagerPage(QMainWindow):
         items.append(date_item)
 
         # Column 1: Location
-        location_value = trip_dict.get('location_from_to', '') or ""
+        location_value = trip.location_from_to
         loc_item = QTableWidgetItem(str(location_value))
         loc_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
         loc_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsEditable)
@@ -3504,7 +6531,7 @@ class TripManagerPage(QMainWindow):
         items.append(loc_item)
 
         # Column 2: Vehicle No
-        vehicle_value = trip_dict.get('vehicle_no', '') or ""
+        vehicle_value = trip.vehicle_no
         veh_item = QTableWidgetItem(str(vehicle_value))
         veh_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
         veh_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsEditable)
@@ -3512,7 +6539,7 @@ class TripManagerPage(QMainWindow):
         items.append(veh_item)
 
         # Column 3: Broker Office
-        broker_value = trip_dict.get('broker_office', '') or ""
+        broker_value = trip.broker_office
         broker_item = QTableWidgetItem(str(broker_value))
         broker_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
         broker_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsEditable)
@@ -3520,7 +6547,7 @@ class TripManagerPage(QMainWindow):
         items.append(broker_item)
 
         # Column 4: Load Amount (Total)
-        total_value = trip_dict.get('total', 0) or 0
+        total_value = trip.total
         load_item = QTableWidgetItem(show_int_amount(total_value))
         load_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         load_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
@@ -3528,7 +6555,7 @@ class TripManagerPage(QMainWindow):
         items.append(load_item)
 
         # Column 5: Driver Amount
-        driver_value = trip_dict.get('driver_amount', 0) or 0 # Use driver_amount from DB
+        driver_value = trip.driver_amount
         driver_item = QTableWidgetItem(show_int_amount(driver_value))
         driver_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         driver_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
@@ -3536,7 +6563,7 @@ class TripManagerPage(QMainWindow):
         items.append(driver_item)
 
         # Column 6: Expenses
-        expense_value = trip_dict.get('expense', 0) or 0
+        expense_value = trip.expense
         expense_item = QTableWidgetItem(show_int_amount(expense_value))
         expense_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         expense_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
@@ -3544,7 +6571,7 @@ class TripManagerPage(QMainWindow):
         items.append(expense_item)
 
         # Column 7: Profit
-        profit_value = trip_dict.get('profit', 0) or 0
+        profit_value = trip.profit
         profit_item = QTableWidgetItem(show_int_amount(profit_value))
         profit_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         profit_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
@@ -3552,7 +6579,7 @@ class TripManagerPage(QMainWindow):
         items.append(profit_item)
 
         # Column 8: Status
-        status_value = trip_dict.get('status', 'Unpaid') or "Unpaid"
+        status_value = trip.status
         status_item = QTableWidgetItem(str(status_value))
         status_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
         status_item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled)
@@ -3571,27 +6598,19 @@ class TripManagerPage(QMainWindow):
         self.table.setCellWidget(row, 10, delete_btn)
 
         # Store row data with DB ID for future reference
-        row_data = {
-            "db_id": trip_dict.get('id'),
-            "entries": items,  # Store QTableWidgetItems
-            "detail_entries": detail_entries,
-            "expand_btn": expand_btn,
-            "delete_btn": delete_btn,
-        }
-        self.rows.insert(0, row_data)  # Insert at first position instead of append
+        self.rows.insert(row, TripRow(trip, items, expand_btn, delete_btn))
 
-        # Update button connections for all existing rows (their indices shifted by 1)
-        for i in range(1, len(self.rows)):
-            if 'expand_btn' in self.rows[i] and 'delete_btn' in self.rows[i]:
-                # Disconnect old connections
-                try:
-                    self.rows[i]['expand_btn'].clicked.disconnect()
-                    self.rows[i]['delete_btn'].clicked.disconnect()
-                except:
-                    pass
-                # Reconnect with updated index
-                self.rows[i]['expand_btn'].clicked.connect(lambda checked=False, r=i: self.expand_clicked(r))
-                self.rows[i]['delete_btn'].clicked.connect(lambda checked=False, r=i: self.delete_clicked(r))
+        # Update button connections for the rows below (their indices shifted by 1)
+        for i in range(row + 1, len(self.rows)):
+            # Disconnect old connections
+            try:
+                self.rows[i].expand_btn.clicked.disconnect()
+                self.rows[i].delete_btn.clicked.disconnect()
+            except:
+                pass
+            # Reconnect with updated index
+            self.rows[i].expand_btn.clicked.connect(lambda checked=False, r=i: self.expand_clicked(r))
+            self.rows[i].delete_btn.clicked.connect(lambda checked=False, r=i: self.delete_clicked(r))
 
     def add_row(self):
         """Add a new trip row and save it to database immediately."""
@@ -3615,13 +6634,8 @@ class TripManagerPage(QMainWindow):
         )
 
         try:
-            new_id = self.db.save_trip(trip_data)
-            # Fetch the newly created record and add it to the table
-            new_trip_row = self.db.conn.execute("SELECT * FROM trips WHERE id=?", (new_id,)).fetchone()
-            if new_trip_row:
-                new_trip_dict = self.row_to_dict(new_trip_row)
-                self.insert_trip_row_from_db(new_trip_dict)
-                self.update_summary()
+            # _on_db_change adds the new row and updates the summary
+            self.db.save_trip(trip_data)
         except Exception as e:
             QMessageBox.critical(self, "Database Error", f"Failed to add new trip: {str(e)}")
 
@@ -3631,15 +6645,15 @@ class TripManagerPage(QMainWindow):
             return
 
         row_data = self.rows[row_index]
+        if row_data.record.detail is None:
+            row_data.record.detail = self.db.load_trip_detail(row_data.db_id) if self.db else {}
         dlg = TripDetailDialog(self, row=row_data)
 
         if dlg.exec():
-            # Update database with new values
-            if self.db and 'db_id' in row_data:
-                self.save_trip_to_db(row_data)
-                # Refresh the row display
+            # Update database with new values; _on_db_change refreshes the row and summary
+            if self.db and not self.save_trip_to_db(row_data):
+                # Not saved: drop the dialog's edits
                 self.refresh_row_from_db(row_index)
-                self.update_summary()
 
     def delete_clicked(self, row_index):
         """Delete a trip row."""
@@ -3655,35 +6669,70 @@ class TripManagerPage(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             row_data = self.rows[row_index]
 
-            # Delete from database
-            if self.db and 'db_id' in row_data:
+            # Delete from database; _on_db_change removes the row
+            if self.db:
                 try:
-                    self.db.delete_trip(row_data['db_id'])
+                    self.db.delete_trip(row_data.db_id)
                 except Exception as e:
                     QMessageBox.critical(self, "Database Error", f"Failed to delete trip: {str(e)}")
-                    return
+                return
 
-            # Remove from table and rows list
-            self.table.removeRow(row_index)
-            del self.rows[row_index]
+            self._remove_row(row_index)
+            self.update_summary()
 
-            # Update row indices for remaining rows
-            for i in range(row_index, len(self.rows)):
-                # Update button connections
-                self.rows[i]['expand_btn'].clicked.disconnect()
-                self.rows[i]['delete_btn'].clicked.disconnect()
-                self.rows[i]['expand_btn'].clicked.connect(lambda checked=False, r=i: self.expand_clicked(r))
-                self.rows[i]['delete_btn'].clicked.connect(lambda checked=False, r=i: self.delete_clicked(r))
+    def _remove_row(self, row_index):
+        # Remove from table and rows list
+        self.table.removeRow(row_index)
+        del self.rows[row_index]
+
+        # Update row indices for remaining rows
+        for i in range(row_index, len(self.rows)):
+            # Update button connections
+            self.rows[i].expand_btn.clicked.disconnect()
+            self.rows[i].delete_btn.clicked.disconnect()
+            self.rows[i].expand_btn.clicked.connect(lambda checked=False, r=i: self.expand_clicked(r))
+            self.rows[i].delete_btn.clicked.connect(lambda checked=False, r=i: self.delete_clicked(r))
+
+    def _on_db_change(self, event):
+        """Apply one committed trip change to the table without reloading it."""
+        if event.table != "trips":
+            return
+        if event.op == "reload":
+            self.load_from_db()
+            return
+        row_index = next((i for i, row in enumerate(self.rows) if row.db_id == event.row_id), None)
+        # Only trips that match the grid's filters are shown
+        trip = None if event.op == "delete" else self.db.load_trip_list_row(event.row_id, self.trip_filters)
+        if row_index is not None and trip is None:
+            # Deleted, or edited so that it no longer matches the filters
+            self._remove_row(row_index)
+        elif row_index is not None:
+            self.refresh_row_from_db(row_index, trip)
+        elif trip:
+            # Place it in sort order; past the last loaded page it arrives with a later page
+            key = self._row_order(trip)
+            if self.trip_sort[1]:
+                pos = next((i for i, row in enumerate(self.rows) if self._row_order(row.record) < key),
+                           len(self.rows))
+            else:
+                pos = next((i for i, row in enumerate(self.rows) if self._row_order(row.record) > key),
+                           len(self.rows))
+            if pos < len(self.rows) or self._exhausted:
+                self.insert_trip_row_from_db(trip, pos)
+        self.update_summary()
 
-            self.update_summary()
+    def _row_order(self, trip):
+        """trip's sort key under trip_sort, text folded like the NOCASE sort columns."""
+        return tuple(v.lower() if isinstance(v, str) else v
+                     for v in DBManager.trip_page_key(trip, self.trip_sort[0]))
 
     def save_trip_to_db(self, row_data):
         """Save trip data to database."""
-        if not self.db or 'db_id' not in row_data:
+        if not self.db or row_data.detail_entries is None:
             return
 
-        entries = row_data['entries']
-        detail_entries = row_data['detail_entries']
+        entries = row_data.entries
+        detail_entries = row_data.detail_entries
 
         # Calculate totals from detail entries
         total_trip = safe_float(detail_entries.get('Total Trip Amount', 0))
@@ -3698,11 +6747,10 @@ class TripManagerPage(QMainWindow):
         # Get basic info from table entries
         date_str = entries[0].text() if entries[0] else ""
         # Convert from display format (dd-mm-yyyy) to storage format (yyyy-mm-dd)
-        try:
-            if date_str:
-                date_obj = datetime.strptime(date_str, "%d-%m-%Y")
-                date_str = date_obj.strftime("%Y-%m-%d")
-        except:
+        date_obj = parse_date_from_display(date_str) if date_str else None
+        if date_obj:
+            date_str = date_obj.isoformat()
+        elif date_str:
             date_str = datetime.now().strftime("%Y-%m-%d")
 
         location = entries[1].text() if entries[1] else ""
@@ -3724,7 +6772,7 @@ class TripManagerPage(QMainWindow):
             status = "UNPAID"
         else:
             QMessageBox.warning(self, "Mismatch", "Check the inputs — total exceeds trip amount.")
-            return()
+            return False
         
         # Update database
         update_data = (
@@ -3741,91 +6789,79 @@ class TripManagerPage(QMainWindow):
         )
 
         try:
-            self.db.update_trip(row_data['db_id'], update_data)
+            self.db.update_trip(row_data.db_id, update_data)
         except Exception as e:
             QMessageBox.critical(self, "Database Error", f"Failed to save trip: {str(e)}")
+            return False
+        return True
 
-    def refresh_row_from_db(self, row_index):
-        """Refresh a single row from database."""
+    def refresh_row_from_db(self, row_index, trip=None):
+        """Refresh a single row from database (or from `trip`, when already loaded)."""
         if not self.db or row_index >= len(self.rows):
             return
 
         row_data = self.rows[row_index]
-        if 'db_id' not in row_data:
-            return
 
-        # Fetch updated data from database
-        trip_row = self.db.conn.execute("SELECT * FROM trips WHERE id=?", (row_data['db_id'],)).fetchone()
-        if not trip_row:
+        # Fetch updated data from database; the full detail is reloaded on the next Expand
+        trip = trip or self.db.load_trip_list_row(row_data.db_id)
+        if not trip:
             return
-
-        trip_dict = self.row_to_dict(trip_row)
+        row_data.record = trip
 
         # Update table items
-        entries = row_data['entries']
+        entries = row_data.entries
 
         if entries[0]:  # Date
-            entries[0].setText(format_date_for_display(trip_dict.get('date', '')))
+            entries[0].setText(format_date_for_display(trip.date))
         if entries[1]:  # Location
-            entries[1].setText(str(trip_dict.get('location_from_to', '') or ""))
+            entries[1].setText(trip.location_from_to)
         if entries[2]:  # Vehicle
-            entries[2].setText(str(trip_dict.get('vehicle_no', '') or ""))
+            entries[2].setText(trip.vehicle_no)
         if entries[3]:  # Broker
-            entries[3].setText(str(trip_dict.get('broker_office', '') or ""))
+            entries[3].setText(trip.broker_office)
         if entries[4]:  # Load Amount
-            entries[4].setText(show_int_amount(trip_dict.get('total', 0) or 0))
+            entries[4].setText(show_int_amount(trip.total))
         if entries[5]:  # Driver Amount
-            entries[5].setText(show_int_amount(trip_dict.get('driver_amount', 0) or 0))
+            entries[5].setText(show_int_amount(trip.driver_amount))
         if entries[6]:  # Expenses
-            entries[6].setText(show_int_amount(trip_dict.get('expense', 0) or 0))
+            entries[6].setText(show_int_amount(trip.expense))
         if entries[7]:  # Profit
-            entries[7].setText(show_int_amount(trip_dict.get('profit', 0) or 0))
+            entries[7].setText(show_int_amount(trip.profit))
         if entries[8]:  # Status
-            entries[8].setText(str(trip_dict.get('status', 'Unpaid') or "Unpaid"))
+            entries[8].setText(trip.status)
 
     # -------------------- OTHER METHODS --------------------
 
+    def show_trip(self, trip_id):
+        """Select and scroll to the row of one trip, loading pages until it is reached."""
+        row_index = next((i for i, row in enumerate(self.rows) if row.db_id == trip_id), None)
+        while row_index is None and not self._exhausted:
+            start = len(self.rows)
+            self.fetch_more()
+            row_index = next((i for i in range(start, len(self.rows)) if self.rows[i].db_id == trip_id), None)
+        if row_index is None:
+            return
+        self.table.selectRow(row_index)
+        self.table.scrollToItem(self.table.item(row_index, 2), QAbstractItemView.ScrollHint.PositionAtCenter)
+
     def update_summary(self):
         """Update summary totals."""
-        total_driver = 0
-        total_profit = 0
-        total_expense = 0
-        total_sum = 0
-        total_unpaid = 0
-
-        for row_data in self.rows:
-            entries = row_data['entries']
-            detail_entries = row_data['detail_entries']
-
-            # Get values from table items
-            load_amount = safe_float(entries[4].text() if entries[4] else "0")
-            driver_amount = safe_float(entries[5].text() if entries[5] else "0")
-            expense_amount = safe_float(entries[6].text() if entries[6] else "0")
-            profit_amount = safe_float(entries[7].text() if entries[7] else "0")
-            status = entries[8].text().lower() if entries[8] else "unpaid"
-
-            total_sum += load_amount
-            total_driver += driver_amount
-            total_expense += expense_amount
-            total_profit += profit_amount
-
-            # Calculate unpaid amount
-            if status != "paid":
-                trip_advance = safe_float(detail_entries.get("Trip Advance", "0"))
-                return_balance = safe_float(detail_entries.get("Return Balance", "0"))
-                broker_amount = safe_float(detail_entries.get("Broker Amount", "0"))
-                unpaid = max(0, (load_amount - trip_advance) - broker_amount - return_balance)
-                total_unpaid += unpaid
+        if self.db:
+            # Totals of the whole trips table, not just the pages loaded so far
+            totals = self.db.trip_summary()
+        else:
+            totals = summarize_trips(row_data.record for row_data in self.rows)
         # Update labels
-        self.total_sum_var.setText(show_int_amount(total_sum))
-        self.total_driver_amount_var.setText(show_int_amount(total_driver))
-        self.total_expense_var.setText(show_int_amount(total_expense))
-        self.total_profit_var.setText(show_int_amount(total_profit))
-        self.total_unpaid_var.setText(show_int_amount(total_unpaid))
+        self.total_sum_var.setText(show_int_amount(totals["total"]))
+        self.total_driver_amount_var.setText(show_int_amount(totals["driver_amount"]))
+        self.total_expense_var.setText(show_int_amount(totals["expense"]))
+        self.total_profit_var.setText(show_int_amount(totals["profit"]))
+        self.total_unpaid_var.setText(show_int_amount(totals["unpaid"]))
 
     def reset(self):
         """Reset filters and reload from database."""
         # Clear filter controls
+        self.date_range = (None, None)
         self.vehicle_var.clear()
         self.brokeroffice_var.clear()
         self.driver_var.clear()
@@ -3833,44 +6869,104 @@ class TripManagerPage(QMainWindow):
         self.status_filter.setCurrentIndex(0)
 
         # Reload from database
-        self.load_from_db()
+        self.search()
+
+    def _current_filters(self):
+        """DBManager.load_trip_page filters for the filter boxes, status and date range."""
+        start_date, end_date = self.date_range
+        status = self.status_filter.currentText()
+        filters = {
+            "vehicle": self.vehicle_var.text().strip(),
+            "broker": self.brokeroffice_var.text().strip(),
+            "driver": self.driver_var.text().strip(),
+            "status": status if status != "All" else None,
+            "start_date": start_date and start_date.isoformat(),
+            "end_date": end_date and end_date.isoformat(),
+        }
+        return {key: value for key, value in filters.items() if value}
+
+    def page_state(self):
+        """Filters and sort to reopen the page with (see MainWindow.save_session)."""
+        start_date, end_date = self.date_range
+        return {
+            "vehicle": self.vehicle_var.text(),
+            "broker": self.brokeroffice_var.text(),
+            "driver": self.driver_var.text(),
+            "status": self.status_filter.currentText(),
+            "date_option": self.date_option.currentText(),
+            "date_range": [start_date and start_date.isoformat(), end_date and end_date.isoformat()],
+            "sort": list(self.sort_choice),
+        }
+
+    def restore_state(self, state):
+        for box, key in ((self.vehicle_var, "vehicle"), (self.brokeroffice_var, "broker"),
+                         (self.driver_var, "driver")):
+            box.setText(state.get(key, ""))
+        # The combos would run their own searches (or ask for a custom range)
+        for combo, key in ((self.status_filter, "status"), (self.date_option, "date_option")):
+            combo.blockSignals(True)
+            combo.setCurrentText(state.get(key, combo.currentText()))
+            combo.blockSignals(False)
+        start_date, end_date = state.get("date_range") or (None, None)
+        if start_date:
+            self.date_range = (datetime.fromisoformat(start_date).date(), datetime.fromisoformat(end_date).date())
+        sort, descending = state.get("sort") or self.sort_choice
+        if sort in self.SORT_COLUMNS.values():
+            self.sort_choice = (sort, descending)
+            column = next(c for c, name in self.SORT_COLUMNS.items() if name == sort)
+            order = Qt.SortOrder.DescendingOrder if descending else Qt.SortOrder.AscendingOrder
+            self.table.horizontalHeader().setSortIndicator(column, order)
+        self.search()
+
+    def schedule_search(self):
+        """Filter again once the user pauses typing in a filter box."""
+        self.filter_query.request(self._current_filters(), self.sort_choice)
 
     def search(self):
         """Apply search filters."""
-        vehicle_filter = self.vehicle_var.text().lower().strip()
-        broker_filter = self.brokeroffice_var.text().lower().strip()
-        driver_filter = self.driver_var.text().lower().strip()
-        status_filter = self.status_filter.currentText()
-
-        for i in range(self.table.rowCount()):
-            show_row = True
-
-            # Vehicle filter
-            if vehicle_filter:
-                vehicle_text = self.table.item(i, 2).text().lower() if self.table.item(i, 2) else ""
-                if vehicle_filter not in vehicle_text:
-                    show_row = False
-
-            # Broker filter
-            if broker_filter:
-                broker_text = self.table.item(i, 3).text().lower() if self.table.item(i, 3) else ""
-                if broker_filter not in broker_text:
-                    show_row = False
-
-            # Status filter
-            if status_filter != "All":
-                status_text = self.table.item(i, 8).text().lower() if self.table.item(i, 8) else "unpaid"
-                if status_filter.lower() != status_text:
-                    show_row = False
-
-            # Driver filter (from detail entries)
-            if driver_filter and i < len(self.rows):
-                detail_entries = self.rows[i]['detail_entries']
-                driver_name = detail_entries.get('Driver Name', '').lower()
-                if driver_filter not in driver_name:
-                    show_row = False
-
-            self.table.setRowHidden(i, not show_row)
+        self.filter_query.run_now(self._current_filters(), self.sort_choice)
+
+    def sort_by_column(self, column):
+        """Header click: sort by that column, or flip the order if it already sorts."""
+        sort = self.SORT_COLUMNS.get(column)
+        if sort is None:
+            column = next(c for c, name in self.SORT_COLUMNS.items() if name == self.sort_choice[0])
+        elif sort == self.sort_choice[0]:
+            self.sort_choice = (sort, not self.sort_choice[1])
+        else:
+            # Newest / largest first; text A to Z
+            self.sort_choice = (sort, sort in ("date", "amount"))
+        order = Qt.SortOrder.DescendingOrder if self.sort_choice[1] else Qt.SortOrder.AscendingOrder
+        self.table.horizontalHeader().setSortIndicator(column, order)
+        if sort is not None:
+            self.search()
+
+    def _query_filters(self, filters, sort):
+        """First page of trips for `filters` in `sort` order (runs on the DebouncedQuery)."""
+        page = self.db.load_trip_page(filters, None, DBManager.TRIP_PAGE_SIZE, *sort) if self.db else []
+        return filters, sort, page
+
+    def _show_filtered(self, result):
+        self.trip_filters, self.trip_sort, page = result
+        self._show_first_page(page)
+
+    def _add_suggestions(self, box, field):
+        """Autocomplete `box` with distinct trip values starting with what was typed."""
+        model = QStringListModel(self)
+        completer = QCompleter(model, box)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        box.setCompleter(completer)
+
+        def show(values):
+            model.setStringList(values)
+            if box.hasFocus() and box.text().strip():
+                completer.complete()
+
+        def suggestions(text):
+            return self.db.trip_filter_suggestions(field, text) if self.db else []
+
+        query = DebouncedQuery(suggestions, show, threaded=self.filter_query.threaded, parent=box)
+        box.textEdited.connect(query.request)
 
     def set_date_option(self, option):
         """Handle date filter option changes."""
@@ -3907,298 +7003,300 @@ class TripManagerPage(QMainWindow):
                 start_date, end_date = self.custom_range
 
         if start_date:
-            for i in range(self.table.rowCount()):
-                date_item = self.table.item(i, 0)
-                if date_item:
-                    row_date = parse_date_from_display(date_item.text())
-                    if row_date:
-                        show_row = start_date <= row_date <= end_date
-                        self.table.setRowHidden(i, not show_row)
+            # Stored dates are yyyy-mm-dd, so the range is answered from the date index
+            self.date_range = (start_date, end_date)
+            self.search()
 
-    def download_pdf(self):
-        """Export currently visible trips to PDF using reportlab."""
-        try:
-            path, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "PDF Files (*.pdf)")
-            if not path:
+    def _visible_trips(self):
+        """Every trip matching the current filters, in grid order, not only the
+        pages loaded into the table."""
+        if not self.db:
+            yield from (row.record for row in self.rows)
+            return
+        after = None
+        while True:
+            page = self.db.load_trip_page(self.trip_filters, after, EXTRACT_CHUNK, *self.trip_sort)
+            yield from page
+            if len(page) < EXTRACT_CHUNK:
                 return
-            if not path.lower().endswith('.pdf'):
-                path += '.pdf'
+            after = DBManager.trip_page_key(page[-1], self.trip_sort[0])
 
-            try:
-                from reportlab.lib.pagesizes import landscape, letter
-                from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-                from reportlab.lib import colors
-                from reportlab.lib.units import inch
-            except ImportError:
+    def _export_visible(self, fmt, caption, file_filter):
+        if not self.rows:
+            QMessageBox.information(self, "No Data", "No trip data to export.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, caption, "", file_filter)
+        if not path:
+            return
+        if not path.lower().endswith('.' + fmt):
+            path += '.' + fmt
+        try:
+            export_report(TRIP_REPORT, self._visible_trips(), path, fmt)
+        except ImportError:
+            if fmt == "pdf":
                 QMessageBox.warning(self, "Missing Library",
                     "ReportLab package is required for PDF export.\n\n"
                     "Install it using: pip install reportlab")
-                return
+            else:
+                QMessageBox.warning(self, "Missing Library",
+                    "Either openpyxl or pandas package is required for Excel export.\n\n"
+                    "Install using: pip install openpyxl\nor: pip install pandas openpyxl")
+            return
+        except Exception as e:
+            kind = "PDF" if fmt == "pdf" else "Excel"
+            QMessageBox.critical(self, "Export Error", f"Failed to export {kind}:\n{str(e)}")
+            return
+        if fmt == "pdf":
+            QMessageBox.information(self, "Success", f"PDF exported successfully to:\n{path}")
+        else:
+            QMessageBox.information(self, "Success", f"Excel file exported successfully to:\n{path}")
 
-            # Collect data from visible table rows with calculated status amounts
-            headers = ["Load Date", "Location From-To", "Vehicle No", "Broker Office",
-                      "Load Amt", "Driver Amt", "Expenses", "Profit", "Status"]
-            data = [headers]
+    def download_pdf(self):
+        """Export currently visible trips to PDF using reportlab."""
+        self._export_visible("pdf", "Save PDF", "PDF Files (*.pdf)")
 
-            # Initialize totals
-            total_load_amt = 0
-            total_driver_amt = 0
-            total_expenses = 0
-            total_profit = 0
-            total_status = 0
+    def download_trip_extract(self):
+        """Every trip with all detail fields as columns, for analysis outside the app."""
+        if not self.db:
+            return
+        path, chosen = QFileDialog.getSaveFileName(
+            self, "Save Trip Extract", "", "CSV Files (*.csv);;Parquet Files (*.parquet)")
+        if not path:
+            return
+        fmt = "parquet" if "parquet" in chosen.lower() or path.lower().endswith(".parquet") else "csv"
+        if not path.lower().endswith("." + fmt):
+            path += "." + fmt
+        try:
+            count = extract_table(self.db, "trips", path, fmt)
+        except ImportError:
+            QMessageBox.warning(self, "Missing Library",
+                "pyarrow package is required for Parquet export.\n\n"
+                "Install it using: pip install pyarrow")
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Export Error", f"Failed to export extract:\n{str(e)}")
+            return
+        QMessageBox.information(self, "Success", f"{count} trip(s) exported to:\n{path}")
 
-            for row in range(self.table.rowCount()):
-                if self.table.isRowHidden(row):
-                    continue
-                row_data = []
-                for col in range(8):  # First 8 columns (excluding status)
-                    item = self.table.item(row, col)
-                    cell_text = item.text() if item else ""
-                    row_data.append(cell_text)
-
-                    # Add to totals for numeric columns
-                    if col == 4:  # Load Amt
-                        total_load_amt += _safefloat(cell_text)
-                    elif col == 5:  # Driver Amt
-                        total_driver_amt += _safefloat(cell_text)
-                    elif col == 6:  # Expenses
-                        total_expenses += _safefloat(cell_text)
-                    elif col == 7:  # Profit
-                        total_profit += _safefloat(cell_text)
-
-                # Calculate status amount instead of just showing paid/unpaid
-                if row < len(self.rows):
-                    row_info = self.rows[row]
-                    entries = row_info['entries']
-                    detail_entries = row_info['detail_entries']
-
-                    status = entries[8].text().lower() if entries[8] else "unpaid"
-                    load_amount = _safefloat(entries[4].text() if entries[4] else "0")
-
-                    if status == "paid":
-                        status_display = "0"
-                        status_amount = 0
-                    else:
-                        # Calculate unpaid amount
-                        trip_advance = _safefloat(detail_entries.get("Trip Advance", "0"))
-                        return_balance = _safefloat(detail_entries.get("Return Balance", "0"))
-                        broker_amount = _safefloat(detail_entries.get("Broker Amount", "0"))
-                        unpaid_amount = max(0, (load_amount - trip_advance) - broker_amount - return_balance)
-                        status_display = str(int(unpaid_amount)) if unpaid_amount == int(unpaid_amount) else f"{unpaid_amount:.2f}"
-                        status_amount = unpaid_amount
-                else:
-                    status_display = "0"
-                    status_amount = 0
+    def download_broker_statements(self):
+        """Write one statement PDF per broker office for a chosen period."""
+        if not self.db:
+            return
+        if importlib.util.find_spec("reportlab") is None:
+            QMessageBox.warning(self, "Missing Library",
+                "ReportLab package is required for PDF export.\n\n"
+                "Install it using: pip install reportlab")
+            return
+        dlg = DateRangeDialog(self)
+        dlg.date_from.setDate(QDate.currentDate().addMonths(-1))
+        if not dlg.exec():
+            return
+        start, end = dlg.get_range()
+        out_dir = QFileDialog.getExistingDirectory(self, "Save Statements To")
+        if not out_dir:
+            return
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            paths = generate_broker_statements(self.db, out_dir, start.isoformat(), end.isoformat())
+        except Exception as e:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.critical(self, "Export Error", f"Failed to write statements:\n{str(e)}")
+            return
+        QApplication.restoreOverrideCursor()
+        if paths:
+            QMessageBox.information(self, "Success", f"{len(paths)} statement(s) saved to:\n{out_dir}")
+        else:
+            QMessageBox.information(self, "No Data", "No trips in the selected period.")
 
-                total_status += status_amount
-                row_data.append(status_display)
-                data.append(row_data)
+    def download_excel(self):
+        """Download trips as Excel with totals."""
+        self._export_visible("xlsx", "Save Excel", "Excel Files (*.xlsx)")
 
-            if len(data) <= 1:  # Only headers
-                QMessageBox.information(self, "No Data", "No trip data to export.")
-                return
 
-            # Add totals row
-            totals_row = [
-                "TOTAL",  # Load Date
-                "",       # Location From-To
-                "",       # Vehicle No
-                "",       # Broker Office
-                str(int(total_load_amt)) if total_load_amt == int(total_load_amt) else f"{total_load_amt:.2f}",  # Load Amt
-                str(int(total_driver_amt)) if total_driver_amt == int(total_driver_amt) else f"{total_driver_amt:.2f}",  # Driver Amt
-                str(int(total_expenses)) if total_expenses == int(total_expenses) else f"{total_expenses:.2f}",  # Expenses
-                str(int(total_profit)) if total_profit == int(total_profit) else f"{total_profit:.2f}",  # Profit
-                str(int(total_status)) if total_status == int(total_status) else f"{total_status:.2f}"   # Status
-            ]
-            data.append(totals_row)
-
-            # Create PDF document
-            doc = SimpleDocTemplate(
-                path,
-                pagesize=landscape(letter),
-                rightMargin=0.5*inch,
-                leftMargin=0.5*inch,
-                topMargin=0.5*inch,
-                bottomMargin=0.5*inch
-            )
+MAINTENANCE_IDLE_SECONDS = 120
+MAINTENANCE_INTERVAL_MINUTES = 60
 
-            # Create table
-            table = Table(data)
-
-            # Style the table
-            style = [
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                # Style the totals row
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, -1), (-1, -1), 11),
-            ]
 
-            table.setStyle(TableStyle(style))
+class IdleMaintenance(QObject):
+    """Runs DBManager.run_maintenance on a background thread once the user has
+    stopped typing and clicking for a while, at most once per
+    MAINTENANCE_INTERVAL_MINUTES."""
 
-            # Build PDF
-            doc.build([table])
+    INPUT_EVENTS = {QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress, QEvent.Type.Wheel}
 
-            QMessageBox.information(self, "Success", f"PDF exported successfully to:\n{path}")
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.last_input = self.last_run = time.monotonic()
+        self.last_error = None
+        self._thread = None
+        QApplication.instance().installEventFilter(self)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check_idle)
+        self.timer.start(30 * 1000)
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.INPUT_EVENTS:
+            self.last_input = time.monotonic()
+        return False
+
+    def check_idle(self):
+        now = time.monotonic()
+        if (now - self.last_input >= MAINTENANCE_IDLE_SECONDS
+                and now - self.last_run >= MAINTENANCE_INTERVAL_MINUTES * 60):
+            self.run()
+
+    def run(self) -> bool:
+        """Start maintenance on a background thread; False if a run is still going."""
+        if self.running():
+            return False
+        self.last_run = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="kts-maintenance", daemon=True)
+        self._thread.start()
+        return True
 
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error", f"Failed to export PDF:\n{str(e)}")
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
 
-    
-    def download_excel(self):
-        """Download trips as Excel with totals."""
+    def wait(self, timeout: float = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # Own connection, so the pages keep querying self.db while this runs
         try:
-            path, _ = QFileDialog.getSaveFileName(self, "Save Excel", "", "Excel Files (*.xlsx)")
-            if not path:
-                return
-            if not path.lower().endswith('.xlsx'):
-                path += '.xlsx'
-
-            # Collect visible rows data with calculated status amounts
-            data = []
-            headers = ["Load Date", "Location From - To", "Vehicle No", "Broker Office",
-                      "Load Amt", "Driver Amt", "Expenses", "Profit", "Status"]
-
-            # Initialize totals
-            total_load_amt = 0
-            total_driver_amt = 0
-            total_expenses = 0
-            total_profit = 0
-            total_status = 0
-
-            for row in range(self.table.rowCount()):
-                if self.table.isRowHidden(row):
-                    continue
+            db = DBManager(self.db.dbpath)
+            try:
+                db.run_maintenance()
+            finally:
+                db.conn.close()
+            self.last_error = None
+        except sqlite3.Error as e:
+            self.last_error = e
+            print(f"Database maintenance failed: {e}", file=sys.stderr)
 
-                row_data = []
-                for col in range(8):  # First 8 columns (excluding status)
-                    item = self.table.item(row, col)
-                    cell_text = item.text() if item else ""
-                    row_data.append(cell_text)
-
-                    # Add to totals for numeric columns
-                    if col == 4:  # Load Amt
-                        total_load_amt += _safefloat(cell_text)
-                    elif col == 5:  # Driver Amt
-                        total_driver_amt += _safefloat(cell_text)
-                    elif col == 6:  # Expenses
-                        total_expenses += _safefloat(cell_text)
-                    elif col == 7:  # Profit
-                        total_profit += _safefloat(cell_text)
-
-                # Calculate status amount
-                if row < len(self.rows):
-                    row_info = self.rows[row]
-                    entries = row_info['entries']
-                    detail_entries = row_info['detail_entries']
-
-                    status = entries[8].text().lower() if entries[8] else "unpaid"
-                    load_amount = _safefloat(entries[4].text() if entries[4] else "0")
-
-                    if status == "paid":
-                        status_amount = 0
-                    else:
-                        trip_advance = _safefloat(detail_entries.get("Trip Advance", "0"))
-                        return_balance = _safefloat(detail_entries.get("Return Balance", "0"))
-                        broker_amount = _safefloat(detail_entries.get("Broker Amount", "0"))
-                        unpaid_amount = max(0, (load_amount - trip_advance) - broker_amount - return_balance)
-                        status_amount = unpaid_amount
-                else:
-                    status_amount = 0
 
-                total_status += status_amount
-                row_data.append(status_amount)
-                data.append(row_data)
+class ChangeWatcher(QObject):
+    """Long-polls a RemoteDBManager's change feed on a background thread and
+    republishes the events on db.changes from the GUI thread."""
 
-            if not data:
-                QMessageBox.information(self, "No Data", "No trip data to export.")
-                return
+    changed = pyqtSignal(list)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.changed.connect(self._deliver)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, name="kts-changes", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
 
-            # Try openpyxl first (preferred for Excel formatting)
+    def _poll(self):
+        since = None
+        while not self._stop.is_set():
             try:
-                from openpyxl import Workbook
-                from openpyxl.styles import Font, Alignment
-
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Trip Data"
-
-                # Add headers with formatting
-                for c, header in enumerate(headers, 1):
-                    cell = ws.cell(1, c, header)
-                    cell.font = Font(bold=True)
-                    cell.alignment = Alignment(horizontal="center")
-
-                # Add data rows
-                for r, row_data in enumerate(data, start=2):
-                    for c, value in enumerate(row_data, 1):
-                        ws.cell(r, c, value)
-
-                # Add totals row
-                totals_row_num = len(data) + 2
-                ws.cell(totals_row_num, 1, "TOTAL").font = Font(bold=True)
-                ws.cell(totals_row_num, 5, total_load_amt).font = Font(bold=True)    # Load Amt
-                ws.cell(totals_row_num, 6, total_driver_amt).font = Font(bold=True)  # Driver Amt
-                ws.cell(totals_row_num, 7, total_expenses).font = Font(bold=True)    # Expenses
-                ws.cell(totals_row_num, 8, total_profit).font = Font(bold=True)      # Profit
-                ws.cell(totals_row_num, 9, total_status).font = Font(bold=True)      # Status
-
-                wb.save(path)
-
-            except ImportError:
-                # Fallback to pandas
-                try:
-                    import pandas as pd
-
-                    # Create DataFrame
-                    df = pd.DataFrame(data, columns=headers)
-
-                    # Add totals row
-                    totals_row = {
-                        "Load Date": "TOTAL",
-                        "Location From - To": "",
-                        "Vehicle No": "",
-                        "Broker Office": "",
-                        "Load Amt": total_load_amt,
-                        "Driver Amt": total_driver_amt,
-                        "Expenses": total_expenses,
-                        "Profit": total_profit,
-                        "Status": total_status
-                    }
-
-                    df = pd.concat([df, pd.DataFrame([totals_row])], ignore_index=True)
-                    df.to_excel(path, index=False, sheet_name="Trip Data")
-
-                except ImportError:
-                    QMessageBox.warning(self, "Missing Library",
-                        "Either openpyxl or pandas package is required for Excel export.\n\n"
-                        "Install using: pip install openpyxl\nor: pip install pandas openpyxl")
-                    return
+                # First call (timeout 0) only learns the current version
+                version, events = self.db.wait_for_changes(since or 0, 0 if since is None else SERVICE_POLL_SECONDS)
+            except Exception as e:
+                print(f"Change feed unavailable: {e}", file=sys.stderr)
+                self._stop.wait(5)
+                continue
+            if since is not None and events and not self._stop.is_set():
+                self.changed.emit(events)
+            since = version
 
-            QMessageBox.information(self, "Success", f"Excel file exported successfully to:\n{path}")
+    def _deliver(self, events):
+        for table, row_id, op in events:
+            self.db.changes.publish(table, row_id, op)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error", f"Failed to export Excel:\n{str(e)}")
 
-    
 class MainWindow(QMainWindow):
-    def __init__(self, db_manager=None):
+    # Page names stored with a session -> the method that opens the page
+    PAGES = {
+        "home": "show_home_page",
+        "trips": "open_trip_manager",
+        "vehicle_expenses": "open_vehicle_expenses",
+        "vehicle_driver": "open_vehicle_driver",
+        "office": "open_office_expenses",
+        "report": "open_vehicle_report",
+    }
+
+    def __init__(self, db_manager=None, session_token=None, resume=None):
+        """`resume` is DBManager.resume_session's result when the app reopens
+        a session: the window starts on its page instead of the home page."""
         super().__init__()
         self.db = db_manager
+        self.session_token = session_token
+        self.page_name = "home"
+        self.backups = None
+        self.maintenance = None
+        self.change_watcher = None
+        if isinstance(self.db, RemoteDBManager):
+            # Maintenance and backups belong to the machine running the service
+            self.change_watcher = ChangeWatcher(self.db, self)
+        elif self.db:
+            self.maintenance = IdleMaintenance(self.db, self)
+        if isinstance(self.db, DBManager) and os.path.isfile(self.db.dbpath):
+            self.backups = BackupService(self.db.dbpath)
+            self.backup_timer = QTimer(self)
+            self.backup_timer.timeout.connect(self.backups.start)
+            self.backup_timer.start(BACKUP_INTERVAL_MINUTES * 60 * 1000)
         self.setWindowTitle("KTS Transport")
         self.showMaximized()
         self.setStyleSheet("background-color: white;")
-        self.show_home_page()
-    
+        if resume:
+            self.open_page(resume["page"], resume["page_state"])
+        else:
+            self.show_home_page()
+
+    def open_page(self, name, state=None):
+        """Open a PAGES page, handing back the state from its page_state()."""
+        opener = getattr(self, self.PAGES.get(name, "show_home_page"))
+        # Only pages with a page_state() have state to take back
+        if state:
+            opener(state)
+        else:
+            opener()
+
+    def save_session(self):
+        """Record the open page and its state so the next launch reopens it."""
+        if not self.session_token:
+            return
+        page = self.centralWidget()
+        state = page.page_state() if hasattr(page, "page_state") else None
+        try:
+            self.db.save_session_page(self.session_token, self.page_name, state)
+        except Exception as e:
+            print(f"Could not save the session: {e}", file=sys.stderr)
+
+    def closeEvent(self, event):
+        """Tidy the database and take a final snapshot (after any scheduled one still running)."""
+        self.save_session()
+        if self.change_watcher:
+            self.change_watcher.stop()
+        # The window goes first; the workers below finish before the process exits
+        self.hide()
+        if self.maintenance:
+            self.maintenance.timer.stop()
+            self.maintenance.wait()
+            self.maintenance.run()
+        if self.backups:
+            self.backup_timer.stop()
+            self.backups.wait()
+            self.backups.start()
+        if self.maintenance:
+            self.maintenance.wait()
+        if self.backups:
+            self.backups.wait()
+            if self.backups.last_error:
+                print(f"Backup on exit failed: {self.backups.last_error}", file=sys.stderr)
+        super().closeEvent(event)
+
     def show_home_page(self):
         """Display the main home page with navigation cards"""
+        self.page_name = "home"
         try:
             central_widget = QWidget()
             self.setCentralWidget(central_widget)
@@ -4233,7 +7331,29 @@ class MainWindow(QMainWindow):
             
             header_layout.addLayout(title_container)
             main_layout.addWidget(header_frame)
-            
+
+            # Global search over trips, vehicle expenses and vehicle/driver details
+            search_layout = QVBoxLayout()
+            search_layout.setSpacing(6)
+            self.global_search = QLineEdit()
+            self.global_search.setPlaceholderText("🔍  Search vehicles, brokers, drivers, places, remarks...")
+            self.global_search.setClearButtonEnabled(True)
+            self.global_search.setStyleSheet("padding: 10px; font-size: 16px; border: 1px solid #b8d4f0; border-radius: 8px;")
+            # Searches as you type; remote queries run off the GUI thread
+            self.search_query = DebouncedQuery(self._search_hits, self._show_search_hits,
+                                               threaded=isinstance(self.db, RemoteDBManager),
+                                               parent=self.global_search)
+            self.global_search.textChanged.connect(self.run_global_search)
+            search_layout.addWidget(self.global_search)
+
+            self.search_results = QListWidget()
+            self.search_results.setStyleSheet("font-size: 14px; border: 1px solid #b8d4f0; border-radius: 8px;")
+            self.search_results.setMaximumHeight(260)
+            self.search_results.itemActivated.connect(self.open_search_hit)
+            self.search_results.hide()
+            search_layout.addWidget(self.search_results)
+            main_layout.addLayout(search_layout)
+
             # Cards container
             cards_container = QWidget()
             cards_layout = QVBoxLayout(cards_container)
@@ -4267,12 +7387,66 @@ class MainWindow(QMainWindow):
             bottom_row.addWidget(trip_card)
             bottom_row.addWidget(office_card)
             cards_layout.addLayout(bottom_row)
+
+            # Reports row
+            report_row = QHBoxLayout()
+            report_row.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            report_card = self.make_card("📊", "Vehicle Profitability", "Monthly Revenue, Expenses and Net per Vehicle",
+                                         clickable=True, click_handler="report")
+            report_card.setMinimumSize(700, 150)
+            report_row.addWidget(report_card)
+            cards_layout.addLayout(report_row)
             
             main_layout.addWidget(cards_container)
         except Exception as e:
             print(f"Error showing home page: {e}")
             QMessageBox.critical(self, "Error", f"Failed to show home page: {str(e)}")
     
+    SEARCH_LABELS = {"trips": "Trip", "vehicle_expenses": "Vehicle expense",
+                     "vehicle_driver_details": "Vehicle & driver"}
+
+    def run_global_search(self, text):
+        """Search once typing pauses; clearing the box hides the results at once."""
+        if text.strip():
+            self.search_query.request(text)
+        else:
+            self.search_query.run_now(text)
+
+    def _search_hits(self, text):
+        try:
+            hits = self.db.search(text) if text.strip() else []
+        except Exception as e:
+            print(f"Search failed: {e}")
+            hits = []
+        return text, hits
+
+    def _show_search_hits(self, result):
+        """List full-text matches for the home page search box, best first."""
+        text, hits = result
+        self.search_results.clear()
+        for hit in hits:
+            item = QListWidgetItem(f"{self.SEARCH_LABELS[hit.table]}  ·  {hit.vehicle_no}  ·  {hit.snippet}")
+            item.setData(Qt.ItemDataRole.UserRole, hit)
+            self.search_results.addItem(item)
+        if text.strip() and not hits:
+            self.search_results.addItem("No matches")
+        self.search_results.setVisible(bool(text.strip()))
+
+    def open_search_hit(self, item):
+        """Open the page holding a search hit and bring its row into view."""
+        hit = item.data(Qt.ItemDataRole.UserRole)
+        if hit is None:
+            return
+        if hit.table == "trips":
+            self.open_trip_manager()
+            self.centralWidget().show_trip(hit.row_id)
+        elif hit.table == "vehicle_expenses":
+            self.open_vehicle_expenses()
+            self.centralWidget().show_record(hit.row_id)
+        else:
+            self.open_vehicle_driver()
+            self.centralWidget().show_vehicle(hit.vehicle_no)
+
     def make_card(self, icon, title, desc, clickable=False, click_handler=None):
         """Create a navigation card with icon, title, and description"""
         try:
@@ -4328,6 +7502,8 @@ class MainWindow(QMainWindow):
                     frame.mousePressEvent = lambda event: self.open_vehicle_driver()
                 elif click_handler == "vehicle":
                     frame.mousePressEvent = lambda event: self.open_vehicle_expenses()
+                elif click_handler == "report":
+                    frame.mousePressEvent = lambda event: self.open_vehicle_report()
             
             return frame
         except Exception as e:
@@ -4336,45 +7512,248 @@ class MainWindow(QMainWindow):
     
     def open_office_expenses(self):
         """Navigate to Office Expenses page"""
+        self.page_name = "office"
         try:
             self.setCentralWidget(OfficeExpensePage(self.show_home_page, self.db))
         except Exception as e:
             print(f"Error opening Office Expenses: {e}")
             QMessageBox.critical(self, "Error", f"Failed to open Office Expenses: {str(e)}")
     
-    def open_trip_manager(self):
+    def open_trip_manager(self, state=None):
         """Navigate to Trip Manager page"""
+        self.page_name = "trips"
         try:
-            self.setCentralWidget(TripManagerPage(self.show_home_page, self.db))
+            self.setCentralWidget(TripManagerPage(self.show_home_page, self.db, state))
         except Exception as e:
             print(f"Error opening Trip Manager: {e}")
             QMessageBox.critical(self, "Error", f"Failed to open Trip Manager: {str(e)}")
     
     def open_vehicle_driver(self):
         """Navigate to Vehicle & Driver Management page"""
+        self.page_name = "vehicle_driver"
         try:
             self.setCentralWidget(VehicleDriverPage(self.show_home_page, self.db))
         except Exception as e:
             print(f"Error opening Vehicle Driver: {e}")
             QMessageBox.critical(self, "Error", f"Failed to open Vehicle Driver: {str(e)}")
     
-    def open_vehicle_expenses(self):
+    def open_vehicle_expenses(self, state=None):
         """Navigate to Vehicle Expenses page"""
+        self.page_name = "vehicle_expenses"
         try:
             print("Opening Vehicle Expenses page...")
-            expense_page = VehicleExpensePage(self.show_home_page, self.db)
+            expense_page = VehicleExpensePage(self.show_home_page, self.db, state)
             self.setCentralWidget(expense_page)
             print("Vehicle Expenses page opened successfully")
         except Exception as e:
             print(f"Error opening Vehicle Expenses: {e}")
             QMessageBox.critical(self, "Error", f"Failed to open Vehicle Expenses: {str(e)}")
 
+    def open_vehicle_report(self):
+        """Navigate to Vehicle Profitability report page"""
+        self.page_name = "report"
+        try:
+            self.setCentralWidget(VehicleReportPage(self.show_home_page, self.db))
+        except Exception as e:
+            print(f"Error opening Vehicle Profitability: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to open Vehicle Profitability: {str(e)}")
+
+# ----------------------------------------------------------------------
+# Command-line interface
+# ----------------------------------------------------------------------
+# `python kts.py <command> ...` (or `kts.exe <command>` for the packaged build)
+# runs without a QApplication or login, so reports can be scheduled.
+
+EXPORTERS = {
+    "trips": export_trips,
+    "vehicle-expenses": export_vehicle_expenses,
+    "office-expenses": export_office_expenses,
+}
+
+
+def _cli_date(text: str) -> str:
+    parsed = parse_date_from_display(text)
+    if not parsed:
+        import argparse
+        raise argparse.ArgumentTypeError(f"not a date (use dd-mm-yyyy or yyyy-mm-dd): {text}")
+    return parsed.isoformat()
+
+
+def build_cli_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog="kts", description="KTS Transport reports and maintenance.")
+    parser.add_argument("--db", help="database file (default: ktsdatabase.db next to the program)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="export trips or expenses to xlsx/pdf/csv")
+    p.add_argument("table", choices=sorted(EXPORTERS))
+    p.add_argument("-o", "--output", required=True, help="output file; format taken from the extension")
+    p.add_argument("--format", choices=EXPORT_FORMATS, help="override the output format")
+    p.add_argument("--from", dest="start", type=_cli_date, help="first date (inclusive)")
+    p.add_argument("--to", dest="end", type=_cli_date, help="last date (inclusive)")
+
+    p = sub.add_parser("extract", help="full table extract to csv/parquet/arrow (detail fields as columns)")
+    p.add_argument("table", choices=sorted(DBManager.EXTRACT_TABLES))
+    p.add_argument("-o", "--output", required=True, help="output file; format taken from the extension")
+    p.add_argument("--format", choices=EXTRACT_FORMATS, help="override the output format")
+    p.add_argument("--from", dest="start", type=_cli_date, help="first date (inclusive)")
+    p.add_argument("--to", dest="end", type=_cli_date, help="last date (inclusive)")
+
+    p = sub.add_parser("summary", help="print trip, expense and receivables totals")
+    p.add_argument("--from", dest="start", type=_cli_date, help="first date (month granularity)")
+    p.add_argument("--to", dest="end", type=_cli_date, help="last date (month granularity)")
+    p.add_argument("--vehicle", help="vehicle number contains")
+
+    p = sub.add_parser("statements", help="write one statement PDF per broker office")
+    p.add_argument("-o", "--output", required=True, help="output folder")
+    p.add_argument("--from", dest="start", type=_cli_date)
+    p.add_argument("--to", dest="end", type=_cli_date)
+    p.add_argument("--outstanding", action="store_true", help="only trips with a balance due")
+
+    p = sub.add_parser("search", help="full-text search over trips, vehicle expenses and drivers")
+    p.add_argument("text", nargs="+", help="words to find (each matches as a prefix)")
+    p.add_argument("--limit", type=int, default=50)
+
+    p = sub.add_parser("backup", help="snapshot the database (into backups/ unless a file is given)")
+    p.add_argument("output", nargs="?", help="backup file to write instead of a rotated snapshot")
+    p.add_argument("--keep", type=int, default=BACKUP_KEEP, help="snapshots to keep (default %(default)s)")
+    p.add_argument("--list", action="store_true", help="list existing snapshots and exit")
+
+    p = sub.add_parser("restore", help="replace the database with a snapshot (close the app first)")
+    p.add_argument("backup", nargs="?", help="snapshot file (default: the newest in backups/)")
+
+    sub.add_parser("vacuum", help="checkpoint the WAL and rebuild the database file")
+    sub.add_parser("maintain", help="checkpoint the WAL, refresh statistics and free unused pages")
+    sub.add_parser("check", help="run SQLite integrity and foreign key checks")
+
+    p = sub.add_parser("serve", help="share the database with other terminals over HTTP")
+    p.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the office network)")
+    p.add_argument("--port", type=int, default=SERVICE_PORT)
+    p.add_argument("--pool", type=int, default=SERVICE_POOL_SIZE, help="database connections")
+    p.add_argument("--token", default=os.environ.get(SERVICE_TOKEN_ENV),
+                   help=f"shared secret clients must send (default: ${SERVICE_TOKEN_ENV})")
+    return parser
+
+
+def run_cli(argv: List[str]) -> int:
+    """Run one CLI command; returns the process exit code."""
+    args = build_cli_parser().parse_args(argv)
+    if args.command == "restore":
+        # Must not open (and migrate) the database that is about to be replaced
+        return _cli_restore(args)
+    dbpath = args.db or DBManager.default_path()
+    if not os.path.isfile(dbpath):
+        # Opening it would create an empty database with the default login
+        print(f"Error: no database at {dbpath}", file=sys.stderr)
+        return 1
+    db = DBManager(dbpath)
+    try:
+        if args.command == "export":
+            count = EXPORTERS[args.table](db, args.output, args.format, args.start, args.end)
+            print(f"Exported {count} {args.table} row(s) to {args.output}")
+        elif args.command == "extract":
+            count = extract_table(db, args.table, args.output, args.format, args.start, args.end)
+            print(f"Extracted {count} {args.table} row(s) to {args.output}")
+        elif args.command == "summary":
+            start = args.start and args.start[:7]
+            end = args.end and args.end[:7]
+            print("Trips")
+            for key, value in db.trip_summary(start, end, args.vehicle).items():
+                print(f"  {key:<14}{show_int_amount(value):>14}")
+            print("Vehicle expenses")
+            for key, value in db.vehicle_expense_summary(start, end, args.vehicle).items():
+                print(f"  {key:<14}{show_int_amount(value):>14}")
+            print("Office expenses (all months)")
+            for key, value in db.office_expense_totals().items():
+                print(f"  {key:<14}{show_int_amount(value):>14}")
+            print("Receivables aging")
+            for rec in db.receivables_aging():
+                buckets = "".join(f"{show_int_amount(b):>12}" for b in rec.buckets)
+                print(f"  {rec.broker_office or '-':<24}{buckets}{show_int_amount(rec.total):>14}")
+        elif args.command == "statements":
+            paths = generate_broker_statements(db, args.output, args.start, args.end, args.outstanding)
+            print(f"Wrote {len(paths)} statement(s) to {args.output}")
+        elif args.command == "search":
+            for hit in db.search(" ".join(args.text), args.limit):
+                print(f"{hit.table:<24}{hit.row_id:>8}  {hit.vehicle_no:<14}{hit.snippet}")
+        elif args.command == "backup":
+            service = BackupService(db.dbpath, keep=args.keep)
+            if args.list:
+                for path in service.list_backups():
+                    print(path)
+            elif args.output:
+                db.backup_to(args.output)
+                print(f"Backed up {db.dbpath} to {args.output}")
+            else:
+                print(f"Backed up {db.dbpath} to {service.backup_now()}")
+        elif args.command == "vacuum":
+            db.vacuum()
+            print("Vacuum complete")
+        elif args.command == "maintain":
+            stats = db.run_maintenance()
+            print(f"Checkpointed {stats['wal_bytes'] // 1024} KiB of WAL, "
+                  f"{stats['freed_pages']} free page(s) released")
+        elif args.command == "serve":
+            service = DataService(db.dbpath, args.host, args.port, args.pool, args.token)
+            print(f"Serving {db.dbpath} at {service.address} (Ctrl+C to stop)")
+            try:
+                service.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                service.shutdown()
+        elif args.command == "check":
+            problems = db.integrity_check()
+            for problem in problems:
+                print(problem)
+            if problems:
+                return 1
+            print("ok")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.conn.close()
+
+
+def _cli_restore(args) -> int:
+    dbpath = args.db or DBManager.default_path()
+    backup = args.backup
+    if backup is None:
+        snapshots = BackupService(dbpath).list_backups()
+        if not snapshots:
+            print("Error: no snapshots found", file=sys.stderr)
+            return 1
+        backup = snapshots[0]
+    try:
+        saved = BackupService.restore(backup, dbpath)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Restored {dbpath} from {backup}")
+    if saved:
+        print(f"Previous database kept as {saved}")
+    return 0
+
+
+def _cli_commands() -> tuple:
+    """Names of the subcommands registered in build_cli_parser."""
+    sub = next(action for action in build_cli_parser()._actions if action.dest == "command")
+    return tuple(sub.choices)
+
+
+CLI_COMMANDS = _cli_commands()
+
+
 # ----------------------------------------------------------------------
 # Application Entry Point
 # ----------------------------------------------------------------------
 
 def main():
     """Main application entry point"""
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS + ("-h", "--help", "--db"):
+        sys.exit(run_cli(sys.argv[1:]))
     try:
         app = QApplication(sys.argv)
         
@@ -4386,19 +7765,38 @@ def main():
         app.setApplicationVersion("1.0")
         app.setOrganizationName("KTS Transport Company")
         
-        # Initialize DB Manager
-        db_manager = DBManager()
-
-        # Show Login Dialog first
-        login_dialog = LoginDialog(db_manager)
-        if login_dialog.exec() == QDialog.DialogCode.Accepted:
-            # If login is successful, create and show the main window
-            window = MainWindow(db_manager)
-            window.showMaximized()
-            sys.exit(app.exec())
+        # Initialize DB Manager (or the client for a shared data service)
+        if len(sys.argv) > 2 and sys.argv[1] == "--server":
+            db_manager = RemoteDBManager(sys.argv[2])
         else:
-            # If login is cancelled or fails, exit the application
-            sys.exit(0)
+            db_manager = DBManager()
+
+        # An unexpired session from earlier today skips the login and
+        # reopens the last page
+        sessions = SessionStore()
+        token = sessions.load(db_manager.dbpath)
+        resume = None
+        if token:
+            try:
+                resume = db_manager.resume_session(token)
+            except Exception as e:
+                print(f"Could not resume the session: {e}")
+
+        if resume is None:
+            # Show Login Dialog first
+            login_dialog = LoginDialog(db_manager)
+            if login_dialog.exec() != QDialog.DialogCode.Accepted:
+                # If login is cancelled or fails, exit the application
+                sys.exit(0)
+            token, expires_at = db_manager.create_session(login_dialog.username)
+            try:
+                sessions.save(db_manager.dbpath, token, expires_at)
+            except OSError as e:
+                print(f"Could not save the session: {e}")
+
+        window = MainWindow(db_manager, token, resume)
+        window.showMaximized()
+        sys.exit(app.exec())
         
     except Exception as e:
         print(f"Application startup error: {e}")